@@ -2,7 +2,9 @@
 # in HTN or other planning systems. Actions can be applied to a state if their preconditions
 # are met, and they modify the state according to their effects.
 
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
+
+_MISSING = object()
 
 
 class Action:
@@ -40,3 +42,46 @@ class Action:
             state[k] = state.get(k, 0) + v
 
         return state
+
+    def read_keys(self):
+        """
+        Lists the state keys this action reads. Effects add to the current value, so they are read as well.
+
+        :return: The keys of the action's preconditions and effects, or None if they are not dictionaries.
+        """
+        if not isinstance(self.preconditions, dict) or not isinstance(self.effects, dict):
+            return None
+        return list(dict.fromkeys(list(self.preconditions) + list(self.effects)))
+
+    def written_keys(self):
+        """
+        Lists the state keys this action modifies, used to update incremental indexes after it is applied.
+
+        :return: The keys of the action's effects.
+        """
+        return self.effects.keys()
+
+    def record_undo(self, state: Dict[str, int]) -> List[Tuple[str, int]]:
+        """
+        Records what is needed to undo this action's effects, i.e. the current value of every key it modifies.
+        Must be called right before `apply`.
+
+        :param state: The state the action is about to be applied to.
+        :return: An undo record to pass to `undo`.
+        """
+        return [(k, state.get(k, _MISSING)) for k in self.effects]
+
+    def undo(self, state: Dict[str, int], record: List[Tuple[str, int]]):
+        """
+        Reverts the effects of this action using the record taken by `record_undo` before it was applied.
+
+        :param state: The state the action was applied to.
+        :param record: The undo record returned by `record_undo`.
+        """
+        for k, v in record:
+            if v is _MISSING:
+                state.pop(k, None)
+            else:
+                state[k] = v
+
+        return state
@@ -0,0 +1,99 @@
+# This file defines the Agenda class, which holds the nodes the HTN planner still has to process.
+# The front of the agenda is the next node to expand. Decomposing a goal pushes its subgoals back
+# onto the front, so both popping the next node and inserting subgoals run in constant time per node.
+# When change tracking is enabled, the agenda also records which nodes were inserted and removed since
+# the last call to `take_changes`, which lets critics work on deltas instead of the whole agenda.
+from collections import deque
+
+
+class Agenda:
+    def __init__(self, nodes=None, track_changes=False):
+        """
+        Initializes the agenda with an optional sequence of nodes, the first one being processed first.
+        :param nodes: An optional iterable of plan nodes.
+        :param track_changes: Whether to record inserted and removed nodes for `take_changes`.
+        """
+        self._nodes = deque(nodes) if nodes is not None else deque()
+        self._discarded = set()
+        self._track_changes = track_changes
+        self._inserted = [list(self._nodes)] if track_changes else []
+        self._removed = []
+
+    def pop(self):
+        """
+        Removes and returns the node at the front of the agenda, skipping discarded nodes.
+        :return: The next node to process.
+        """
+        node = self._nodes.popleft()
+        while self._discarded and id(node) in self._discarded:
+            self._discarded.remove(id(node))
+            node = self._nodes.popleft()
+
+        if self._track_changes:
+            self._removed.append(node)
+        return node
+
+    def push_front(self, nodes):
+        """
+        Inserts nodes at the front of the agenda, keeping their relative order.
+        :param nodes: A list of nodes; nodes[0] becomes the next node to process.
+        """
+        self._nodes.extendleft(reversed(nodes))
+        if self._track_changes:
+            self._inserted.append(nodes)
+
+    def discard(self, node):
+        """
+        Removes a node from the agenda in constant time. The node is skipped when it reaches the front.
+        Discarded nodes are not reported by `take_changes`; whoever discards a node is responsible for it.
+        :param node: A node currently in the agenda.
+        """
+        self._discarded.add(id(node))
+
+    def is_discarded(self, node):
+        return id(node) in self._discarded
+
+    def replace(self, nodes):
+        """
+        Replaces the whole content of the agenda, e.g. with the plan returned by a critic.
+        With change tracking, nodes that disappeared are reported as removed and new nodes as inserted.
+        :param nodes: The new list of nodes, in processing order.
+        """
+        nodes = list(nodes)
+        if self._track_changes:
+            old_ids = {id(node) for node in self}
+            new_ids = {id(node) for node in nodes}
+            self._removed.extend(node for node in self if id(node) not in new_ids)
+            self._inserted.append([node for node in nodes if id(node) not in old_ids])
+
+        self._nodes = deque(nodes)
+        self._discarded = set()
+
+    def take_changes(self):
+        """
+        Returns the nodes inserted and removed since the last call, and starts a new change window.
+        Nodes both inserted and removed within the window are not reported.
+        :return: A tuple (inserted, removed); inserted nodes are listed in agenda order.
+        """
+        inserted_batches, removed = self._inserted, self._removed
+        self._inserted, self._removed = [], []
+
+        if len(inserted_batches) == 1 and not removed:
+            return list(inserted_batches[0]), []
+
+        inserted_ids = {id(node) for batch in inserted_batches for node in batch}
+        removed_ids = {id(node) for node in removed}
+        inserted = [node for batch in reversed(inserted_batches) for node in batch if id(node) not in removed_ids]
+        removed = [node for node in removed if id(node) not in inserted_ids]
+        return inserted, removed
+
+    def __len__(self):
+        return len(self._nodes) - len(self._discarded)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        if not self._discarded:
+            return iter(self._nodes)
+        return (node for node in self._nodes if id(node) not in self._discarded)
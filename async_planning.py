@@ -0,0 +1,129 @@
+# This file defines the asyncio front-end of the planner, for services planning many requests on one event loop.
+# HTNPlanner.plan is a blocking CPU loop, so a large request would stall every other coroutine. AsyncPlanner runs
+# each request either cooperatively on the loop, through HTNPlanner.iter_plan, handing control back to the loop
+# every `yield_every` node expansions, or on a thread pool executor, where the loop only awaits the result.
+# Expansions are counted rather than committed actions, so a deep decomposition or a slow method condition
+# committing no action does not stall the loop either.
+# Requests take a slot of a concurrency limit, may have a timeout, and stop planning when they are cancelled.
+#
+# Interleaved requests must not share a planner's critics, which keep indexes of the agenda. Each running request
+# therefore uses its own shallow copy of the planner, with copied critics; copies are kept in a free list and
+# reused by later requests.
+import asyncio
+import copy
+import threading
+
+from instrumentation import CRITIC_TIMERS, PLANNER_TIMERS
+
+
+def _plan_until_cancelled(planner, goals, state, cancel):
+    # Runs on an executor thread; `cancel` is set by the loop when the request is cancelled or times out.
+    return list(planner.iter_plan(goals, state, cancel=cancel))
+
+
+class AsyncPlanner:
+    def __init__(self, planner, max_concurrency=8, yield_every=16, executor=None):
+        """
+        :param planner: The HTNPlanner holding the domain.
+        :param max_concurrency: Maximum number of requests planned at once; further requests wait for a slot.
+        :param yield_every: In cooperative mode, number of node expansions between two yields to the loop.
+        :param executor: Optional concurrent.futures.ThreadPoolExecutor to plan on instead of the loop. Process
+                         pools are not supported, since the state is updated in place; use plan_many for them.
+        """
+        if max_concurrency < 1:
+            raise ValueError("The concurrency limit must allow at least one request.")
+        if yield_every < 1:
+            raise ValueError("yield_every must be at least 1.")
+
+        self.planner = planner
+        self.max_concurrency = max_concurrency
+        self.yield_every = yield_every
+        self.executor = executor
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._free_planners = []
+
+    def _slots(self):
+        # Semaphores belong to the loop they are first used on, so one is created per running loop.
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _take_planner(self):
+        if self._free_planners:
+            return self._free_planners.pop()
+
+        planner = copy.copy(self.planner)
+        # Instrumentation wrappers are bound to the original planner; copies run the plain methods.
+        for attribute in PLANNER_TIMERS:
+            planner.__dict__.pop(attribute, None)
+        planner.instrumentation = None
+        planner.async_planner = None
+        planner.critics = copy.deepcopy(self.planner.critics)
+        for critic in planner.critics:
+            for attribute in CRITIC_TIMERS:
+                vars(critic).pop(attribute, None)
+        if self.executor is not None and planner.decomposition_cache is not None:
+            # The LRU bookkeeping of the cache is not thread-safe, so executor threads get their own.
+            planner.decomposition_cache = copy.deepcopy(planner.decomposition_cache)
+        return planner
+
+    async def aplan(self, goals, state, timeout=None):
+        """
+        Plans like HTNPlanner.plan without blocking the event loop.
+        :param goals: The goals to plan for.
+        :param state: The initial state, updated in place. A cancelled or timed-out request leaves it as planned
+                      so far.
+        :param timeout: Optional number of seconds after which the request fails with asyncio.TimeoutError. The
+                        time spent waiting for a slot counts.
+        :return: The list of executed action nodes.
+        """
+        return await asyncio.wait_for(self._plan(goals, state), timeout)
+
+    async def _plan(self, goals, state):
+        async with self._slots():
+            planner = self._take_planner()
+            if self.executor is None:
+                try:
+                    return await self._plan_cooperatively(planner, goals, state)
+                finally:
+                    self._free_planners.append(planner)
+
+            plan = await self._plan_in_executor(planner, goals, state)
+            self._free_planners.append(planner)
+            return plan
+
+    async def _plan_cooperatively(self, planner, goals, state):
+        plan = []
+        expansions = 0
+        # Nodes expanded without committing an action are yielded as None.
+        steps = planner.iter_plan(goals, state, yield_expansions=True)
+        try:
+            for node in steps:
+                if node is not None:
+                    plan.append(node)
+                expansions += 1
+                if expansions % self.yield_every == 0:
+                    await asyncio.sleep(0)
+        finally:
+            # On cancellation the generator is closed, which finalises the state.
+            steps.close()
+        return plan
+
+    async def _plan_in_executor(self, planner, goals, state):
+        cancel = threading.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, _plan_until_cancelled, planner, goals, state, cancel)
+        except asyncio.CancelledError:
+            # The thread stops at its next node. Its planner copy may still be running, so it is not reused.
+            cancel.set()
+            raise
+
+    def __getstate__(self):
+        # The semaphore and the planner copies belong to a running process; executors cannot be pickled.
+        attributes = dict(self.__dict__)
+        attributes.update({'_semaphore': None, '_semaphore_loop': None, '_free_planners': [], 'executor': None})
+        return attributes
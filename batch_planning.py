@@ -0,0 +1,79 @@
+# This file defines batch planning: many independent problems planned with the same domain on a process pool.
+# The planner (methods, actions, critics) is shipped to each worker once, through the pool initializer, and
+# only the problems travel with the tasks. Problems are sent in chunks and results stream back as chunks
+# finish, either in completion order or in input order.
+import copy
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+# The outcome of one problem: its position in the input, the plan and final state, or the planning error.
+PlanResult = namedtuple('PlanResult', ['index', 'plan', 'state', 'error'])
+
+_worker_planner = None
+
+
+def _init_worker(planner):
+    global _worker_planner
+    _worker_planner = planner
+
+
+def plan_problem(planner, index, goals, state):
+    """
+    Plans a single problem on a copy of its state.
+    :return: A PlanResult; planning errors (ValueError) are returned rather than raised.
+    """
+    state = copy.deepcopy(state)
+    try:
+        plan = planner.plan(goals, state)
+    except ValueError as error:
+        return PlanResult(index, None, state, error)
+    return PlanResult(index, plan, state, None)
+
+
+def _plan_chunk(chunk):
+    return [plan_problem(_worker_planner, index, goals, state) for index, goals, state in chunk]
+
+
+def plan_many(planner, problems, workers=None, ordered=False, chunk_size=16):
+    """
+    Plans independent problems in parallel and yields their results as they finish.
+    :param planner: The HTNPlanner holding the domain. With a start method other than fork it must be picklable.
+    :param problems: An iterable of (goals, state) pairs; it is consumed lazily.
+    :param workers: Number of worker processes; 0 or 1 plans the problems in this process.
+    :param ordered: If True, results are yielded in input order, otherwise in completion order.
+    :param chunk_size: Number of problems sent to a worker per task.
+    :return: A generator of PlanResult. Returned plans hold copies of the domain's actions.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    problems = ((index, goals, state) for index, (goals, state) in enumerate(problems))
+
+    if workers <= 1:
+        for index, goals, state in problems:
+            yield plan_problem(planner, index, goals, state)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(planner,)) as executor:
+        running = []
+        exhausted = False
+        while running or not exhausted:
+            # Keep a bounded window of chunks in flight so arbitrarily long problem streams use bounded memory.
+            while not exhausted and len(running) < 2 * workers:
+                chunk = list(islice(problems, chunk_size))
+                if chunk:
+                    running.append(executor.submit(_plan_chunk, chunk))
+                else:
+                    exhausted = True
+            if not running:
+                break
+
+            if ordered:
+                done = [running.pop(0)]
+            else:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                done = [future for future in running if future in finished]
+                running = [future for future in running if future not in finished]
+
+            for future in done:
+                yield from future.result()
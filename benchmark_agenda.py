@@ -0,0 +1,58 @@
+# This file benchmarks the planner's agenda. A single method decomposes a task into N primitive
+# actions, so the agenda grows to N nodes before being drained one node at a time. With a
+# constant-time agenda the time per node stays flat as N grows.
+import argparse
+import time
+
+from action import Action
+from htn_planner import HTNPlanner
+from method import Method
+from ordering_type import OrderingType
+
+
+def build_wide_planner(size):
+    """
+    Builds a planner whose only task decomposes into `size` primitive actions.
+    :param size: The number of actions the task decomposes into.
+    :return: The planner and the goals to plan for.
+    """
+    step = Action("Step", {}, {"steps": 1}, duration=1)
+    wide_method = Method(
+        task_name="Wide Task",
+        subtasks=[step] * size,
+        condition=lambda state: True,
+        ordering=OrderingType.ORDERED
+    )
+
+    planner = HTNPlanner(
+        methods={"Wide Task": [wide_method]},
+        actions={"Step": step},
+        critics=[],
+        is_goal_satisfied=lambda goals, state: False
+    )
+    return planner, ["Wide Task"]
+
+
+def run(sizes, repeats):
+    print(f"{'agenda size':>12} {'seconds':>10} {'ns/node':>10}")
+    for size in sizes:
+        best = None
+        for _ in range(repeats):
+            planner, goals = build_wide_planner(size)
+            state = {"steps": 0}
+            start = time.perf_counter()
+            plan = planner.plan(goals, state)
+            elapsed = time.perf_counter() - start
+            assert len(plan) == size and state["steps"] == size
+            best = elapsed if best is None else min(best, elapsed)
+
+        print(f"{size:>12} {best:>10.4f} {best / size * 1e9:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agenda Benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run(args.sizes, args.repeats)
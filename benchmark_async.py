@@ -0,0 +1,78 @@
+# This file load-tests the asyncio front-end: many concurrent block-world requests are planned through one
+# AsyncPlanner, cooperatively on the event loop or on a thread pool, and the script reports the p50/p99 request
+# latency, the throughput and the longest stall of the event loop, measured by a ticker coroutine that should
+# wake up every millisecond.
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_planning import AsyncPlanner
+from generators import blocks_problem
+
+TICK = 0.001
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def ticker(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def timed_request(front_end, problem, timeout):
+    start = time.perf_counter()
+    try:
+        await front_end.aplan(problem.goals, problem.state, timeout=timeout)
+    except asyncio.TimeoutError:
+        return None
+    return time.perf_counter() - start
+
+
+async def load_test(requests, blocks, concurrency, yield_every, mode, timeout):
+    problems = [blocks_problem(blocks, seed=seed) for seed in range(requests)]
+    executor = ThreadPoolExecutor(max_workers=concurrency) if mode == "thread" else None
+    front_end = AsyncPlanner(problems[0].planner, max_concurrency=concurrency, yield_every=yield_every,
+                             executor=executor)
+
+    stop = asyncio.Event()
+    lags = []
+    ticking = asyncio.create_task(ticker(stop, lags))
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed_request(front_end, problem, timeout) for problem in problems))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticking
+    if executor is not None:
+        executor.shutdown()
+
+    completed = [latency for latency in latencies if latency is not None]
+    solved = sum(problem.is_solved(problem.state) for problem in problems)
+    print(f"{mode}: {len(completed)}/{requests} requests completed, {solved} solved, in {elapsed:.3f} s "
+          f"({len(completed) / elapsed:.1f} requests/s)")
+    if completed:
+        print(f"  latency p50 {percentile(completed, 0.5) * 1000:.1f} ms, "
+              f"p99 {percentile(completed, 0.99) * 1000:.1f} ms")
+    if lags:
+        print(f"  event loop lag max {max(lags) * 1000:.1f} ms, p99 {percentile(lags, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio Planner Load Test")
+    parser.add_argument("--requests", type=int, default=200, help="Number of concurrent requests")
+    parser.add_argument("--blocks", type=int, default=200, help="Number of blocks per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of requests planned at once")
+    parser.add_argument("--yield-every", type=int, default=16,
+                        help="Node expansions between two yields to the event loop in cooperative mode")
+    parser.add_argument("--mode", choices=["cooperative", "thread", "both"], default="both")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+
+    for run_mode in (["cooperative", "thread"] if args.mode == "both" else [args.mode]):
+        asyncio.run(load_test(args.requests, args.blocks, args.concurrency, args.yield_every, run_mode,
+                              args.timeout))
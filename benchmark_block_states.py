@@ -0,0 +1,68 @@
+# This file compares generating block-world successor states from persistent structures against
+# deep-copying plain dictionaries and lists, keeping every generated state alive as a search frontier would.
+import argparse
+import copy
+import random
+import time
+import tracemalloc
+
+from main_blocks import ClearAction, PutOnAction, block_successor, make_block_state
+
+
+def deepcopy_successor(state, action):
+    # The effects of the blocks actions replace persistent structures, so the baseline mutates its deep copy directly.
+    state = copy.deepcopy(state)
+    if isinstance(action, ClearAction):
+        state['CLEAR'].append(action.obj)
+        state['ON'].pop(action.obj)
+    else:
+        state['ON'][action.obj1] = action.obj2
+        state['CLEAR'].remove(action.obj1)
+    return state
+
+
+def random_walk(initial_state, successor, steps, seed):
+    """
+    Applies `steps` random PUTON/CLEAR actions, each one to a randomly chosen earlier state.
+    :return: The list of all generated states.
+    """
+    rng = random.Random(seed)
+    blocks = list(initial_state['CLEAR'])
+    states = [initial_state]
+    while len(states) <= steps:
+        state = rng.choice(states)
+        obj1, obj2 = rng.sample(blocks, 2)
+        if obj1 in state['ON']:
+            action = ClearAction(obj1, state['ON'][obj1])
+        elif obj1 in state['CLEAR'] and obj2 in state['CLEAR']:
+            action = PutOnAction(obj1, obj2)
+        else:
+            continue
+        states.append(successor(state, action))
+    return states
+
+
+def measure(initial_state, successor, steps, seed):
+    tracemalloc.start()
+    start = time.perf_counter()
+    states = random_walk(initial_state, successor, steps, seed)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(states), elapsed, memory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Block State Benchmark")
+    parser.add_argument("--blocks", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    blocks = [f"B{index}" for index in range(args.blocks)]
+    print(f"{'state':>12} {'states':>8} {'time (s)':>9} {'MiB':>9}")
+    for label, initial_state, successor in (
+            ("deepcopy", {'CLEAR': list(blocks), 'ON': {}}, deepcopy_successor),
+            ("persistent", make_block_state(clear=blocks, on={}), block_successor)):
+        count, elapsed, memory = measure(initial_state, successor, args.steps, args.seed)
+        print(f"{label:>12} {count:>8} {elapsed:>9.3f} {memory / 2 ** 20:>9.1f}")
@@ -0,0 +1,56 @@
+# This file benchmarks the critic pipeline on block-world towers of N blocks. Every block starts on the
+# table and the goals ON(B0, B1), ..., ON(Bn-2, Bn-1) are put on the agenda at once, so the critics run
+# after each of the ~2N expanded nodes over an agenda holding up to N nodes. Batch critics rescan the
+# whole agenda on every pass; incremental critics only see the inserted and removed nodes.
+import argparse
+import time
+
+from critics import ResolveConflictsCritic, EliminateRedundantPreconditionsCritic, UseExistingObjectsCritic
+from htn_planner import HTNPlanner
+from main_blocks import PutOnMethod, compile_block_goal, make_block_state
+
+
+def build_tower_problem(size, incremental):
+    """
+    Builds a planner and a problem stacking `size` blocks into a single tower.
+    :param size: The number of blocks.
+    :param incremental: Whether the critics run incrementally or in batch mode.
+    :return: The planner, the goals and the initial state.
+    """
+    blocks = [f'B{i}' for i in range(size)]
+    goals = [f'ON({blocks[i]}, {blocks[i + 1]})' for i in range(size - 1)]
+    methods = {f'ON({blocks[i]}, {blocks[i + 1]})': [PutOnMethod(blocks[i], blocks[i + 1])] for i in range(size - 1)}
+
+    critics = [ResolveConflictsCritic(), EliminateRedundantPreconditionsCritic(), UseExistingObjectsCritic()]
+    for critic in critics:
+        critic.incremental = incremental
+
+    planner = HTNPlanner(methods, {}, critics, goal_compiler=compile_block_goal)
+    initial_state = make_block_state(clear=blocks, on={})
+    return planner, goals, initial_state
+
+
+def time_plan(size, incremental):
+    planner, goals, state = build_tower_problem(size, incremental)
+    start = time.perf_counter()
+    plan = planner.plan(goals, state)
+    elapsed = time.perf_counter() - start
+    assert len(plan) == size - 1
+    return elapsed
+
+
+def run(sizes, batch_max):
+    print(f"{'blocks':>8} {'incremental (s)':>16} {'batch (s)':>12}")
+    for size in sizes:
+        incremental = time_plan(size, incremental=True)
+        batch = f"{time_plan(size, incremental=False):>12.3f}" if size <= batch_max else f"{'skipped':>12}"
+        print(f"{size:>8} {incremental:>16.3f} {batch}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Critics Benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000])
+    parser.add_argument("--batch-max", type=int, default=2000, help="Largest size also run with batch critics")
+    args = parser.parse_args()
+
+    run(args.sizes, args.batch_max)
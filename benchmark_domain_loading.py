@@ -0,0 +1,52 @@
+# This file times loading a large generated domain: building it in Python, compiling it from its JSON file, and
+# loading it from the compiled cache written by the first load of the file.
+import argparse
+import os
+import tempfile
+import time
+
+from domain_format import cache_path, dump_domain, load_domain
+from generators import hierarchy_problem
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main(depth, branching):
+    problem, build_seconds = timed(hierarchy_problem, depth, branching)
+    planner = problem.planner
+    print(f"Domain: {len(planner.actions)} actions, {sum(map(len, planner.methods.values()))} methods")
+    print(f"Built in Python:        {build_seconds * 1000:9.1f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "hierarchy.json")
+        dump_domain(planner.actions, planner.methods, path)
+        print(f"Domain file:            {os.path.getsize(path) / 1e6:9.1f} MB")
+
+        _, json_seconds = timed(load_domain, path, cache=False)
+        print(f"Compiled from JSON:     {json_seconds * 1000:9.1f} ms")
+
+        _, first_seconds = timed(load_domain, path)
+        with open(path, 'rb') as file:
+            compiled_path = cache_path(path, file.read())
+        print(f"First load (+ cache):   {first_seconds * 1000:9.1f} ms "
+              f"({os.path.getsize(compiled_path) / 1e6:.1f} MB cache)")
+
+        domain, cached_seconds = timed(load_domain, path)
+        print(f"Loaded from the cache:  {cached_seconds * 1000:9.1f} ms")
+
+    state = {}
+    plan = type(planner)(domain.methods, domain.actions, [], planner.is_goal_satisfied).plan(problem.goals, state)
+    print(f"Plan from the cached domain: {len(plan)} actions, solved: {problem.is_solved(state)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Domain Loading Benchmark")
+    parser.add_argument("--depth", type=int, default=6, help="Levels of compound tasks of the generated domain")
+    parser.add_argument("--branching", type=int, default=5, help="Subtasks per method of the generated domain")
+    args = parser.parse_args()
+
+    main(args.depth, args.branching)
@@ -0,0 +1,59 @@
+# This file compares loading a blocks problem with methods grounded for every ordered pair of blocks against
+# the lifted MethodLibrary, which only grounds the tasks the planner reaches, and times planning a tower.
+import argparse
+import time
+import tracemalloc
+
+from critics import EliminateRedundantPreconditionsCritic, ResolveConflictsCritic, UseExistingObjectsCritic
+from htn_planner import HTNPlanner
+from main_blocks import (ClearMethod, PutOnMethod, block_methods, block_stacking_is_goal_satisfied,
+                         compile_block_goal, make_block_state)
+
+
+def ground_methods(blocks):
+    methods = {}
+    for obj1 in blocks:
+        methods[f'CLEAR({obj1})'] = [ClearMethod(obj1)]
+        for obj2 in blocks:
+            if obj1 != obj2:
+                methods[f'ON({obj1}, {obj2})'] = [PutOnMethod(obj1, obj2)]
+    return methods
+
+
+def measure_load(build, blocks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    methods = build(blocks) if build is ground_methods else build()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return methods, elapsed, memory
+
+
+def plan_tower(methods, blocks):
+    critics = [ResolveConflictsCritic(), EliminateRedundantPreconditionsCritic(), UseExistingObjectsCritic()]
+    planner = HTNPlanner(methods, {}, critics, block_stacking_is_goal_satisfied, goal_compiler=compile_block_goal)
+    goals = [f'ON({blocks[index]}, {blocks[index + 1]})' for index in range(len(blocks) - 1)]
+
+    start = time.perf_counter()
+    plan = planner.plan(goals, make_block_state(clear=blocks, on={}))
+    return len(plan), time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lifted Methods Benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000, 10000])
+    parser.add_argument("--max-ground", type=int, default=1000,
+                        help="Largest problem for which the grounded methods are built")
+    args = parser.parse_args()
+
+    print(f"{'blocks':>8} {'methods':>9} {'load (s)':>9} {'MiB':>8} {'plan (s)':>9} {'actions':>8}")
+    for size in args.sizes:
+        blocks = [f"B{index}" for index in range(size)]
+        for label, build in (("ground", ground_methods), ("lifted", block_methods)):
+            if label == "ground" and size > args.max_ground:
+                print(f"{size:>8} {label:>9}   skipped")
+                continue
+            methods, load_time, memory = measure_load(build, blocks)
+            actions, plan_time = plan_tower(methods, blocks)
+            print(f"{size:>8} {label:>9} {load_time:>9.3f} {memory / 2 ** 20:>8.1f} {plan_time:>9.3f} {actions:>8}")
@@ -0,0 +1,75 @@
+# This file measures method selection through the decision index of method_index.py. A "Work" task has one method
+# per operating mode, each with the condition [("mode", "==", i), ("ready", ">=", 1)], and the goals decompose it
+# many times, switching to the next mode every few steps and cycling back to the first. The plain planner tries
+# the methods' conditions in order until one holds; the indexed planner reads "mode" once and only tries the
+# methods of that mode, and the applicability cache reuses its choice while no action writes "mode" or "ready".
+import argparse
+import time
+from functools import partial
+
+from action import Action
+from conditions import FluentCondition
+from generators import never_satisfied
+from htn_planner import HTNPlanner
+from method import Method
+from ordering_type import OrderingType
+
+
+def mode_is(mode, state):
+    return state.get("mode", 0) == mode and state.get("ready", 0) >= 1
+
+
+def work_domain(modes, declarative):
+    actions = {"Next Mode": Action("Next Mode", {}, {"mode": 1}, duration=1),
+               "First Mode": Action("First Mode", {}, {"mode": 1 - modes}, duration=1)}
+    methods = {"Work": []}
+    for mode in range(modes):
+        action = Action(f"Work in Mode {mode}", {"ready": 1}, {"work done": 1}, duration=1)
+        actions[action.name] = action
+        if declarative:
+            condition = FluentCondition([("mode", "==", mode), ("ready", ">=", 1)])
+        else:
+            condition = partial(mode_is, mode)
+        methods["Work"].append(Method("Work", [action], condition, OrderingType.ORDERED, reads=["mode", "ready"]))
+    return methods, actions
+
+
+def run(modes, steps, switch_every, repeats):
+    goals = []
+    mode = 0
+    for step in range(steps):
+        if step and step % switch_every == 0:
+            mode = (mode + 1) % modes
+            goals.append("Next Mode" if mode else "First Mode")
+        goals.append("Work")
+
+    results = {}
+    for label, declarative, indexed in (("callables, linear scan", False, False),
+                                        ("FluentConditions, linear scan", True, False),
+                                        ("FluentConditions, indexed", True, True)):
+        methods, actions = work_domain(modes, declarative)
+        planner = HTNPlanner(methods, actions, [], never_satisfied, indexed_methods=indexed)
+        times = []
+        for _ in range(repeats):
+            state = {"ready": 1}
+            start = time.perf_counter()
+            plan = planner.plan(goals, state)
+            times.append(time.perf_counter() - start)
+        results[label] = [node.action.name for node in plan]
+        print(f"{label:32} {min(times) * 1000:9.2f} ms ({len(plan)} actions)")
+
+    if len({tuple(plan) for plan in results.values()}) != 1:
+        raise AssertionError("The planners produced different plans.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexed Method Dispatch Benchmark")
+    parser.add_argument("--modes", type=int, nargs="+", default=[10, 100, 500], help="Methods of the Work task")
+    parser.add_argument("--steps", type=int, default=5000, help="Number of Work goals")
+    parser.add_argument("--switch-every", type=int, default=10, help="Work goals between mode switches")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    for mode_count in args.modes:
+        print(f"{mode_count} methods, {args.steps} steps:")
+        run(mode_count, args.steps, args.switch_every, args.repeats)
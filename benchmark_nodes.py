@@ -0,0 +1,62 @@
+# This file compares the memory use and dispatch throughput of PlanNode agenda entries against the
+# dictionary nodes ({'type': ..., 'action': ...}) the planner used before.
+import argparse
+import time
+import tracemalloc
+
+from action import Action
+from plan_node import NodeType, PlanNode
+
+
+def build_dict_nodes(count, action):
+    return [{'type': NodeType.ACTION, 'action': action} for _ in range(count)]
+
+
+def build_plan_nodes(count, action):
+    return [PlanNode.action_node(action) for _ in range(count)]
+
+
+def dispatch_dict_nodes(nodes):
+    actions = 0
+    for node in nodes:
+        if node['type'] == NodeType.ACTION and node['action'] is not None:
+            actions += 1
+    return actions
+
+
+def dispatch_plan_nodes(nodes):
+    actions = 0
+    for node in nodes:
+        if node.kind == NodeType.ACTION and node.action is not None:
+            actions += 1
+    return actions
+
+
+def measure(build, dispatch, count, action):
+    tracemalloc.start()
+    nodes = build(count, action)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del nodes
+
+    start = time.perf_counter()
+    nodes = build(count, action)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert dispatch(nodes) == count
+    dispatch_time = time.perf_counter() - start
+    return memory, build_time, dispatch_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan Node Benchmark")
+    parser.add_argument("--count", type=int, default=1000000)
+    args = parser.parse_args()
+
+    step = Action("Step", {}, {"steps": 1}, duration=1)
+    print(f"{'nodes':>12} {'bytes/node':>11} {'build (s)':>10} {'dispatch (s)':>13}")
+    for label, build, dispatch in (("dict", build_dict_nodes, dispatch_dict_nodes),
+                                   ("PlanNode", build_plan_nodes, dispatch_plan_nodes)):
+        memory, build_time, dispatch_time = measure(build, dispatch, args.count, step)
+        print(f"{label:>12} {memory / args.count:>11.1f} {build_time:>10.3f} {dispatch_time:>13.3f}")
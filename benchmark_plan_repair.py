@@ -0,0 +1,102 @@
+# This file compares repairing a plan with planning the root goals again, on generated camping-style hierarchies.
+# Every task whose subtasks are actions gets a detour: its actions need the task's route to be open, and a second
+# method, used when the route is closed, decomposes it into other actions. Half-way through the plan, the route
+# of a task that has not started closes, so its first action can no longer run; plan repair plans that task and
+# the later subtasks of its parent again, replanning plans everything.
+import argparse
+import random
+import time
+
+from action import Action
+from conditions import FluentCondition
+from decomposition_tree import DecompositionTree
+from generators import hierarchy_problem
+from method import Method
+from plan_repair import first_failure
+
+
+def add_detours(problem):
+    # Returns the initial state, with the route of every task ending in actions open.
+    planner = problem.planner
+    state = {}
+    for task, methods in planner.methods.items():
+        method = methods[-1]
+        if not all(isinstance(subtask, Action) for subtask in method.subtasks):
+            continue
+
+        route = f"{task} open"
+        state[route] = 1
+        subtasks = []
+        for action in method.subtasks:
+            subtasks.append(Action(action.name, dict(action.preconditions, **{route: 1}), action.effects,
+                                   duration=action.duration))
+            planner.actions[action.name] = subtasks[-1]
+        # Detour actions have the same effects, so they satisfy the preconditions of the ones they replace.
+        detour = [Action(f"{action.name} detour", action.preconditions, action.effects,
+                         duration=action.duration + 1) for action in method.subtasks]
+        detour_dependencies = [(f"{before} detour", f"{after} detour") for before, after in method.dependencies]
+        for action in detour:
+            planner.actions[action.name] = action
+        planner.methods[task] = [
+            Method(task, subtasks, FluentCondition([(route, '==', 1)]), method.ordering,
+                   dependencies=method.dependencies or None),
+            Method(task, detour, FluentCondition([(route, '==', 0)]), method.ordering,
+                   dependencies=detour_dependencies or None),
+        ]
+    return state
+
+
+def disturbance_point(plan, tree):
+    # The first action past the middle of the plan that starts a task, whose route then closes.
+    for index in range(len(plan) // 2, len(plan)):
+        task = tree.parent(plan[index])
+        if tree.children(task)[0] is plan[index]:
+            return index, {f"{task.goal} open": 0}
+    raise ValueError("The second half of the plan starts no task.")
+
+
+def run(depth, branching, seed, repeats):
+    problem = hierarchy_problem(depth, branching, seed=seed)
+    planner = problem.planner
+    initial_state = add_detours(problem)
+    repair_times = []
+    replan_times = []
+    for repeat in range(repeats):
+        random.seed(repeat)
+        tree = DecompositionTree()
+        plan = planner.plan(problem.goals, dict(initial_state), tree=tree)
+        executed, delta = disturbance_point(plan, tree)
+        state = dict(initial_state)
+        for node in plan[:executed]:
+            state = node.action.apply(state)
+
+        observed = dict(state, **delta)
+        start = time.perf_counter()
+        planner.plan(problem.goals, dict(observed))
+        replan_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = planner.repair_plan(problem.goals, plan, tree, executed, state, delta, copy_state=dict)
+        repair_times.append(time.perf_counter() - start)
+
+        if result.full_replan or first_failure(result.plan[executed:], dict(observed)) is not None:
+            raise AssertionError("The plan was not repaired.")
+        if {node.action.name for node in plan[:executed]} & {node.action.name for node in result.plan[executed:]}:
+            raise AssertionError("The repaired plan runs executed actions again.")
+
+    print(f"{depth}x{branching}: {len(plan)} actions, repaired {result.task.goal} with {result.replanned} new "
+          f"actions; repair {min(repair_times) * 1000:.2f} ms, full replanning {min(replan_times) * 1000:.2f} ms "
+          f"({min(replan_times) / min(repair_times):.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan Repair Benchmark")
+    parser.add_argument("--shapes", nargs="+", default=["3x4", "4x5", "5x5", "6x5"],
+                        help="DEPTHxBRANCHING shapes of the generated hierarchies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    for shape in args.shapes:
+        shape_depth, shape_branching = (int(value) for value in shape.split('x'))
+        run(shape_depth, shape_branching, args.seed, args.repeats)
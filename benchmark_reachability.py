@@ -0,0 +1,56 @@
+# This file measures the effect of pruning a domain with the static reachability analysis before planning. The
+# generated hierarchies give every task methods that can never succeed, tried before the real one: the
+# backtracking planner only finds out at their last action, after decomposing all their subtasks, while the
+# analysis removes them up front. The plain planner commits to them and returns a plan that cannot be executed.
+import argparse
+import time
+
+from generators import hierarchy_problem
+from plan_repair import first_failure
+from reachability import format_report
+
+
+def backtracking_run(problem):
+    state = {}
+    start = time.perf_counter()
+    problem.planner.plan_backtracking(problem.goals, state)
+    return problem.planner.nodes_expanded, time.perf_counter() - start, problem.is_solved(state)
+
+
+def executable(problem):
+    plan = problem.planner.plan(problem.goals, {})
+    return first_failure(plan, {}) is None
+
+
+def run(depth, branching, dead_ends, seed, verbose):
+    problem = hierarchy_problem(depth, branching, seed=seed, dead_ends=dead_ends, ordering_mix={'ordered': 1.0})
+    nodes, seconds, solved = backtracking_run(problem)
+    plain_executable = executable(problem)
+
+    start = time.perf_counter()
+    report = problem.planner.prune_domain({}, problem.goals)
+    analysis_seconds = time.perf_counter() - start
+    pruned_nodes, pruned_seconds, pruned_solved = backtracking_run(problem)
+
+    print(f"{depth}x{branching}, {dead_ends} dead ends per task: analysis {analysis_seconds * 1000:.1f} ms removed "
+          f"{len(report.removed_methods)} methods")
+    print(f"  backtracking: {nodes} nodes in {seconds * 1000:.1f} ms (solved: {solved}) -> "
+          f"{pruned_nodes} nodes in {pruned_seconds * 1000:.1f} ms (solved: {pruned_solved}), "
+          f"{nodes / pruned_nodes:.1f}x fewer nodes")
+    print(f"  plain planner plan executable: {plain_executable} -> {executable(problem)}")
+    if verbose:
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reachability Pruning Benchmark")
+    parser.add_argument("--shapes", nargs="+", default=["3x3", "4x3", "4x4", "5x3"],
+                        help="DEPTHxBRANCHING shapes of the generated hierarchies")
+    parser.add_argument("--dead-ends", type=int, default=1, help="Methods per task that can never succeed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Print the pruning report")
+    args = parser.parse_args()
+
+    for shape in args.shapes:
+        shape_depth, shape_branching = (int(value) for value in shape.split('x'))
+        run(shape_depth, shape_branching, args.dead_ends, args.seed, args.verbose)
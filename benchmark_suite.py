@@ -0,0 +1,124 @@
+# This file is the reproducible benchmark suite of the planner. It plans seeded block-world instances and
+# synthetic hierarchies (see generators.py) and writes one JSON record per case with the planning time, the
+# nodes taken off the agenda per second, the peak memory traced by tracemalloc and the plan length, so results
+# can be stored and compared between versions. Node counts and peak memory are measured in separate runs, since
+# instrumentation and tracemalloc would distort the timings.
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from generators import blocks_problem, hierarchy_problem
+
+DEFAULT_BLOCKS = [100, 1000, 10000]
+DEFAULT_HIERARCHIES = ["3x3", "4x4", "5x5"]
+
+
+def _run(problem_factory, seed, instrument=False, trace_memory=False):
+    # Every run plans a freshly generated problem: planning changes the state and warms the planner's caches.
+    problem = problem_factory()
+    random.seed(seed)
+    instrumentation = problem.planner.enable_instrumentation() if instrument else None
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    plan = problem.planner.plan(problem.goals, problem.state)
+    elapsed = time.perf_counter() - start
+    peak_bytes = None
+    if trace_memory:
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if instrumentation is not None:
+        problem.planner.disable_instrumentation()
+    return problem, plan, elapsed, instrumentation, peak_bytes
+
+
+def measure(problem_factory, seed, repeats):
+    """
+    Benchmarks one case.
+    :param problem_factory: Callable generating the Problem.
+    :param seed: Seed of the global random generator, used by unordered methods.
+    :param repeats: Number of timed runs; the fastest is reported.
+    :return: The case's record.
+    """
+    record = {}
+    try:
+        timings = []
+        for _ in range(repeats):
+            problem, plan, elapsed, _, _ = _run(problem_factory, seed)
+            timings.append(elapsed)
+
+        _, _, _, instrumentation, _ = _run(problem_factory, seed, instrument=True)
+        nodes = sum(instrumentation.node_counts.values())
+        _, _, _, _, peak_bytes = _run(problem_factory, seed, trace_memory=True)
+    except ValueError as error:
+        record.update({'solved': False, 'error': str(error)})
+        return record
+
+    seconds = min(timings)
+    record.update({
+        'params': problem.params,
+        'solved': problem.is_solved(problem.state),
+        'plan_length': len(plan),
+        'nodes': nodes,
+        'seconds': seconds,
+        'seconds_all': timings,
+        'nodes_per_second': nodes / seconds if seconds else None,
+        'peak_bytes': peak_bytes,
+        'max_agenda_length': instrumentation.max_agenda_length,
+    })
+    return record
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': sys.version.split()[0], 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'commit': commit}
+
+
+def cases(blocks, hierarchies, ordering_mix, seeds):
+    for seed in seeds:
+        for size in blocks:
+            yield f"blocks-{size}-s{seed}", seed, lambda size=size, seed=seed: blocks_problem(size, seed=seed)
+        for shape in hierarchies:
+            depth, branching = (int(value) for value in shape.split('x'))
+            yield (f"hierarchy-{shape}-s{seed}", seed,
+                   lambda depth=depth, branching=branching, seed=seed:
+                   hierarchy_problem(depth, branching, seed=seed, ordering_mix=ordering_mix))
+
+
+def run(blocks, hierarchies, ordering_mix, seeds, repeats, label, output):
+    env = environment()
+    for name, seed, problem_factory in cases(blocks, hierarchies, ordering_mix, seeds):
+        record = {'case': name, 'label': label, **measure(problem_factory, seed, repeats), 'environment': env}
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planner Benchmark Suite")
+    parser.add_argument("--blocks", type=int, nargs="*", default=DEFAULT_BLOCKS,
+                        help="Numbers of blocks of the block-world cases")
+    parser.add_argument("--hierarchies", nargs="*", default=DEFAULT_HIERARCHIES,
+                        help="DEPTHxBRANCHING shapes of the synthetic hierarchy cases")
+    parser.add_argument("--ordering-mix", default="ordered=0.5,unordered=0.25,partial=0.25",
+                        help="Weights of the method ordering types in the hierarchies")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--label", default=None, help="Free-form label stored with every record")
+    parser.add_argument("--output", default=None, help="JSON lines file to append the records to (default stdout)")
+    args = parser.parse_args()
+
+    mix = {name: float(weight) for name, weight in (item.split('=') for item in args.ordering_mix.split(','))}
+    if args.output is None:
+        run(args.blocks, args.hierarchies, mix, args.seeds, args.repeats, args.label, sys.stdout)
+    else:
+        with open(args.output, 'a') as output_file:
+            run(args.blocks, args.hierarchies, mix, args.seeds, args.repeats, args.label, output_file)
@@ -0,0 +1,60 @@
+# This file measures the throughput of the plan validator on plans of a generated camping-style hierarchy. The
+# plan the planner produces is validated together with broken copies of it: copies with two steps swapped, which
+# usually run an action before the one providing its precondition, and copies starting from a perturbed initial
+# state. Every plan is validated step by step and in NumPy batches, and both give the same results.
+import argparse
+import random
+import time
+
+from generators import hierarchy_problem
+from plan_validation import PlanValidator
+
+
+def problems(plan, count, seed):
+    rng = random.Random(seed)
+    result = []
+    for index in range(count):
+        steps = list(plan)
+        state = {}
+        if index % 3 == 1:
+            first, second = rng.randrange(len(steps)), rng.randrange(len(steps))
+            steps[first], steps[second] = steps[second], steps[first]
+        elif index % 3 == 2:
+            state[f"{rng.choice(steps).name} done"] = -1
+        result.append((steps, state))
+    return result
+
+
+def timed(validator, plans, final_states):
+    start = time.perf_counter()
+    results = list(validator.validate_many(plans, final_states=final_states))
+    return results, time.perf_counter() - start
+
+
+def main(depth, branching, count, seed, final_states):
+    problem = hierarchy_problem(depth, branching, seed=seed)
+    plan = [node.action for node in problem.planner.plan(problem.goals, {})]
+    plans = problems(plan, count, seed)
+    print(f"{count} plans of {len(plan)} actions over {len(problem.planner.actions)} actions")
+
+    generic, generic_seconds = timed(PlanValidator(vectorise=False), plans, final_states)
+    vectorised, vectorised_seconds = timed(PlanValidator(), plans, final_states)
+    if generic != vectorised:
+        raise AssertionError("The vectorised validator disagrees with the step-by-step one.")
+
+    print(f"Valid plans:   {sum(result.valid for result in generic)}/{count}")
+    print(f"Step by step:  {generic_seconds:8.3f} s ({count / generic_seconds:10.0f} plans/s)")
+    print(f"Vectorised:    {vectorised_seconds:8.3f} s ({count / vectorised_seconds:10.0f} plans/s, "
+          f"{generic_seconds / vectorised_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan Validation Benchmark")
+    parser.add_argument("--depth", type=int, default=2, help="Levels of compound tasks of the generated domain")
+    parser.add_argument("--branching", type=int, default=4, help="Subtasks per method of the generated domain")
+    parser.add_argument("--plans", type=int, default=50000, help="Number of plans to validate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--final-states", action="store_true", help="Also build the final state of every plan")
+    args = parser.parse_args()
+
+    main(args.depth, args.branching, args.plans, args.seed, args.final_states)
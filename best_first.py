@@ -0,0 +1,269 @@
+# This file defines the best-first search mode of the HTN planner. Instead of committing to the first applicable
+# method of every task, the planner keeps a priority queue of partial task networks: each entry is a remaining
+# agenda, the state reached so far and the actions executed to reach it, and the queue is ordered by
+# f = g + h, g being the summed duration of the executed actions and h a lower bound on the duration of the
+# remaining agenda. Expanding an entry executes its leading actions and branches over every applicable method of
+# the next task. With an admissible heuristic the first complete network taken off the queue is a shortest plan.
+#
+# The heuristic bounds the duration of running the whole agenda. When networks stop as soon as the goals are
+# satisfied, a plan may end before its agenda does and cost less than g + h, so the incumbent only prunes networks
+# on g in that mode and the heuristic merely orders the queue; with `until_satisfied=False` every agenda runs to
+# its end and networks are pruned on g + h.
+#
+# The search is anytime: it stops after `max_expansions` expansions or at `deadline`, and then returns the best
+# complete plan found so far, or failing that the furthest-reaching partial plan.
+import copy
+import heapq
+import time
+from collections import namedtuple
+from itertools import count
+
+from method import Method
+from plan_node import NodeType, PlanNode
+
+# The outcome of a search: the plan and its final state, its summed duration, whether the plan reaches the goals
+# (complete), whether it is proven to be the shortest (optimal), and the number of expansions performed.
+SearchResult = namedtuple('SearchResult', ['plan', 'state', 'cost', 'complete', 'optimal', 'expansions'])
+
+
+def action_cost(action):
+    return action.duration or 0
+
+
+class MinimumDurationHeuristic:
+    def __init__(self, methods, actions):
+        """
+        Lower bound on the duration of running a task to completion: the duration of a primitive task, or the
+        smallest summed lower bound of the subtasks over the methods of a compound task. Methods that build their
+        subtasks in `decompose` rather than listing them, unknown tasks and recursive tasks count as 0. The bound
+        is admissible for searches that run every agenda to its end; a search stopping once the goals are satisfied
+        may need less than the sum over its agenda (see best_first_search). Bounds are computed once per task.
+        :param methods: The planner's methods.
+        :param actions: The planner's actions.
+        """
+        self.methods = methods
+        self.actions = actions
+        self._bounds = {}
+
+    def __call__(self, task):
+        bound = self._bounds.get(task)
+        if bound is None:
+            bound = self._compute(task)
+        return bound
+
+    def _compute(self, task):
+        # Iterative post-order over the task hierarchy; a task already on the stack (recursion) is bounded by 0.
+        stack = [(task, False)]
+        on_stack = set()
+        while stack:
+            current, children_done = stack.pop()
+            if current in self._bounds:
+                continue
+
+            subtasks = self._subtasks(current)
+            if not children_done:
+                on_stack.add(current)
+                stack.append((current, True))
+                for subtask_list in subtasks:
+                    for subtask in subtask_list:
+                        if isinstance(subtask, str) and subtask not in self._bounds and subtask not in on_stack:
+                            stack.append((subtask, False))
+                continue
+
+            on_stack.discard(current)
+            if current in self.actions:
+                self._bounds[current] = action_cost(self.actions[current])
+            elif subtasks:
+                self._bounds[current] = min(sum(self._subtask_bound(subtask) for subtask in subtask_list)
+                                            for subtask_list in subtasks)
+            else:
+                self._bounds[current] = 0
+
+        return self._bounds[task]
+
+    def _subtasks(self, task):
+        if task in self.actions or task not in self.methods:
+            return []
+
+        subtasks = []
+        for method in self.methods[task]:
+            if type(method).decompose is not Method.decompose:
+                subtasks.append(())
+            else:
+                subtasks.append(method.subtasks)
+        return subtasks
+
+    def _subtask_bound(self, subtask):
+        if isinstance(subtask, str):
+            return self._bounds.get(subtask, 0)
+        return action_cost(subtask)
+
+
+def zero_heuristic(task):
+    return 0
+
+
+class _Agenda:
+    # A persistent linked stack of plan nodes that also carries the heuristic sum of the nodes it holds.
+    __slots__ = ('node', 'rest', 'estimate')
+
+    def __init__(self, node, rest, estimate):
+        self.node = node
+        self.rest = rest
+        self.estimate = estimate
+
+
+def _push(nodes, agenda, heuristic):
+    for node in reversed(nodes):
+        if node.kind == NodeType.ACTION:
+            node_estimate = action_cost(node.action)
+        elif node.kind == NodeType.GOAL:
+            node_estimate = heuristic(node.goal)
+        else:
+            node_estimate = 0
+        agenda = _Agenda(node, agenda, node_estimate + (agenda.estimate if agenda is not None else 0))
+    return agenda
+
+
+def _plan_list(executed):
+    plan = []
+    while executed is not None:
+        node, executed = executed
+        plan.append(node)
+    plan.reverse()
+    return plan
+
+
+def best_first_search(planner, goals, state, heuristic=None, max_expansions=None, deadline=None,
+                      copy_state=copy.deepcopy, until_satisfied=True):
+    """
+    Searches the decompositions of the goals best-first on summed action duration plus heuristic.
+    Critics and the decomposition cache are not used in this mode.
+    :param planner: The HTNPlanner providing the methods, actions and goal test.
+    :param goals: The goals to plan for.
+    :param state: The initial state; it is not modified, each branch works on its own copy.
+    :param heuristic: Callable returning a lower bound on the duration of a task name; defaults to
+                      MinimumDurationHeuristic over the planner's domain. An inadmissible heuristic still returns
+                      plans, but they are no longer guaranteed to be the shortest.
+    :param max_expansions: Optional maximum number of expansions.
+    :param deadline: Optional wall-clock deadline, as a time.monotonic() timestamp.
+    :param copy_state: Copies a state before a branch executes actions on it; domains with persistent state
+                       structures can pass a cheaper copy (e.g. `dict`).
+    :param until_satisfied: Whether a network stops as soon as the goals are satisfied; otherwise a plan is
+                            complete once its whole agenda has run. Either way the result is optimal when the
+                            search space is exhausted within the budgets, but only without goal checks does the
+                            heuristic prune, which makes proving optimality much cheaper.
+    :return: A SearchResult. If a budget runs out before a complete plan is found, the plan is the prefix of the
+             furthest-reaching partial network, with complete=False.
+    :raises ValueError: If the whole search space dead-ends.
+    """
+    if heuristic is None:
+        heuristic = MinimumDurationHeuristic(planner.methods, planner.actions)
+
+    initial_state = state
+    root_state = planner.prepare_state(copy_state(state))
+    compiled_goals = None
+    if planner.is_goal_satisfied is None:
+        # Compiled goals are tracked incrementally along one state; here they are reset on the state checked.
+        compiled_goals = planner.compile_goals(goals, root_state)
+
+    def goals_satisfied(current_state):
+        if not until_satisfied:
+            return False
+        if compiled_goals is not None:
+            compiled_goals.reset(current_state)
+        return planner.goals_satisfied(goals, current_state, compiled_goals)
+
+    root_agenda = _push([planner.create_goal_node(goal) for goal in goals], None, heuristic)
+
+    tie_breaker = count()
+    # Entries are (f, -depth, tie, g, agenda, state, executed, owns_state); deeper entries win ties, which
+    # reaches complete plans sooner when the heuristic is exact.
+    queue = [(root_agenda.estimate if root_agenda else 0, 0, next(tie_breaker), 0, root_agenda, root_state, None,
+              True)]
+    incumbent = None
+    best_partial = None
+    expansions = 0
+    exhausted = False
+
+    while queue:
+        if (max_expansions is not None and expansions >= max_expansions) or \
+                (deadline is not None and time.monotonic() >= deadline):
+            exhausted = True
+            break
+
+        f, negative_depth, _, g, agenda, current_state, executed, owns_state = heapq.heappop(queue)
+        if incumbent is not None and f >= incumbent[0]:
+            if not until_satisfied:
+                # Nothing left in the queue can beat the incumbent.
+                queue.clear()
+                break
+            if g >= incumbent[0]:
+                continue
+        expansions += 1
+
+        # Execute the leading actions, on a private copy of the state, until the next compound task.
+        dead_end = False
+        while agenda is not None and not goals_satisfied(current_state):
+            node = agenda.node
+            if node.kind == NodeType.GOAL and node.goal not in planner.actions:
+                break
+            agenda = agenda.rest
+
+            if node.kind == NodeType.GOAL:
+                node = PlanNode.action_node(planner.actions[node.goal])
+            elif node.kind != NodeType.ACTION:
+                continue
+
+            if not owns_state:
+                current_state, owns_state = copy_state(current_state), True
+            if not planner.is_action_applicable(node.action, current_state):
+                dead_end = True
+                break
+            current_state = planner.execute_action(node, current_state)
+            executed = (node, executed)
+            g += action_cost(node.action)
+            negative_depth -= 1
+
+        if dead_end:
+            continue
+
+        # The fallback partial plan is the furthest-reaching live network, the lowest f breaking ties.
+        progress = (negative_depth, g + (agenda.estimate if agenda is not None else 0))
+        if best_partial is None or progress < best_partial[0]:
+            best_partial = (progress, g, current_state, executed)
+
+        if agenda is None or goals_satisfied(current_state):
+            if incumbent is None or g < incumbent[0]:
+                incumbent = (g, current_state, executed)
+            continue
+
+        # Branch over every applicable method of the next compound task. Children share the state until one of
+        # them executes an action.
+        node = agenda.node
+        rest = agenda.rest
+        for method in planner.candidate_methods(node.goal, current_state):
+            if not method.is_applicable(current_state):
+                continue
+            subgoals = planner.as_plan_nodes(method.decompose(node.goal, current_state))
+            child_agenda = _push(subgoals, rest, heuristic)
+            child_f = g + (child_agenda.estimate if child_agenda is not None else 0)
+            if incumbent is not None and not until_satisfied and child_f >= incumbent[0]:
+                continue
+            heapq.heappush(queue, (child_f, negative_depth - 1, next(tie_breaker), g, child_agenda, current_state,
+                                   executed, False))
+
+    if incumbent is not None:
+        cost, final_state, executed = incumbent
+        complete = True
+    elif exhausted and best_partial is not None:
+        _, cost, final_state, executed = best_partial
+        complete = False
+    else:
+        raise ValueError("No plan found: every decomposition of the goals dead-ends.")
+    # The search space was fully explored (or pruned by the incumbent) only when no budget ran out.
+    optimal = complete and not exhausted
+
+    if planner.compiled_domain is not None:
+        final_state = planner.finish_state(final_state, copy.deepcopy(initial_state))
+    return SearchResult(_plan_list(executed), final_state, cost, complete, optimal, expansions)
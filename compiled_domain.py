@@ -0,0 +1,306 @@
+# This file defines the compiled domain mode. All fluent names used by the registered actions are interned
+# once into integer indices, states are stored as a compact integer vector, and each action's preconditions
+# and effects become index/value arrays. Checking applicability is then a single vectorised comparison and
+# applying an action a single vectorised add. NumPy is used when it is installed; otherwise the vectors are
+# `array('q')` instances and the comparisons run as plain loops over the index arrays. Like a dictionary state, a
+# compiled state only holds the fluents it was created with or that were written since; a bitmask over the vector
+# columns records which ones are present.
+# The domain can also pack the preconditions of all actions into a dense (actions x fluents) matrix, which
+# answers "which actions are applicable" for one state, or for many states at once, in one comparison.
+import copy
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from action import Action
+
+
+class CompiledAction:
+    def __init__(self, action, fluent_index):
+        """
+        Compiles the numeric preconditions and effects of an action into index/value arrays.
+        :param action: The action to compile; its preconditions and effects must be dictionaries.
+        :param fluent_index: The mapping from fluent names to vector indices.
+        """
+        self.action = action
+        self.precondition_indices = _int_vector(fluent_index[k] for k in action.preconditions)
+        self.precondition_values = _int_vector(action.preconditions.values())
+        self.effect_indices = _int_vector(fluent_index[k] for k in action.effects)
+        self.effect_values = _int_vector(action.effects.values())
+        # Applying the action makes the fluents it has an effect on present, as Action.apply does.
+        self.effect_mask = sum(1 << fluent_index[k] for k in set(action.effects))
+
+    def is_applicable(self, vector):
+        if np is not None:
+            return bool((vector[self.precondition_indices] >= self.precondition_values).all())
+        return all(vector[i] >= v for i, v in zip(self.precondition_indices, self.precondition_values))
+
+    def apply(self, vector):
+        if np is not None:
+            vector[self.effect_indices] += self.effect_values
+        else:
+            for i, v in zip(self.effect_indices, self.effect_values):
+                vector[i] += v
+
+    def record_undo(self, vector):
+        if np is not None:
+            return vector[self.effect_indices]
+        return [vector[i] for i in self.effect_indices]
+
+    def undo(self, vector, record):
+        if np is not None:
+            vector[self.effect_indices] = record
+        else:
+            for i, v in zip(self.effect_indices, record):
+                vector[i] = v
+
+
+class CompiledState:
+    def __init__(self, domain, vector, extra=None, present=0):
+        """
+        A dictionary-like view over a state vector, so method conditions and goal checks written against
+        dictionary states keep working. Fluents no action uses are kept in a regular dictionary.
+        :param domain: The CompiledDomain the vector belongs to.
+        :param vector: The state vector, indexed by `domain.fluent_index`. Absent fluents hold 0.
+        :param extra: Values of fluents that are not interned.
+        :param present: Bitmask of the vector columns whose fluent is present in the state.
+        """
+        self.domain = domain
+        self.vector = vector
+        self.extra = extra if extra is not None else {}
+        self.present = present
+
+    def __getitem__(self, fluent):
+        index = self.domain.fluent_index.get(fluent)
+        if index is None:
+            return self.extra[fluent]
+        if not self.present >> index & 1:
+            raise KeyError(fluent)
+        return int(self.vector[index])
+
+    def get(self, fluent, default=None):
+        index = self.domain.fluent_index.get(fluent)
+        if index is None:
+            return self.extra.get(fluent, default)
+        if not self.present >> index & 1:
+            return default
+        return int(self.vector[index])
+
+    def __setitem__(self, fluent, value):
+        index = self.domain.fluent_index.get(fluent)
+        if index is None:
+            self.extra[fluent] = value
+        else:
+            self.vector[index] = value
+            self.present |= 1 << index
+
+    def pop(self, fluent, default=None):
+        index = self.domain.fluent_index.get(fluent)
+        if index is None:
+            return self.extra.pop(fluent, default)
+        if not self.present >> index & 1:
+            return default
+        value = int(self.vector[index])
+        self.vector[index] = 0
+        self.present &= ~(1 << index)
+        return value
+
+    def __contains__(self, fluent):
+        index = self.domain.fluent_index.get(fluent)
+        if index is None:
+            return fluent in self.extra
+        return bool(self.present >> index & 1)
+
+    def keys(self):
+        present = self.present
+        fluents = [fluent for index, fluent in enumerate(self.domain.fluents) if present >> index & 1]
+        return fluents + list(self.extra)
+
+    def items(self):
+        return [(fluent, self[fluent]) for fluent in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __copy__(self):
+        # Copies of a state share its CompiledDomain and get their own vector and extra fluents, so planners that
+        # copy states per branch do not mutate each other's states.
+        return CompiledState(self.domain, copy.copy(self.vector), dict(self.extra), self.present)
+
+    def __deepcopy__(self, memo):
+        return CompiledState(self.domain, copy.copy(self.vector), copy.deepcopy(self.extra, memo), self.present)
+
+
+class CompiledDomain:
+    def __init__(self, actions):
+        """
+        Interns the fluents of the given actions and compiles each of them.
+        :param actions: The actions of the domain; their preconditions and effects must be dictionaries.
+        """
+        self.fluents = []
+        self.fluent_index = {}
+        self.compiled_actions = {}
+        self.actions = []
+        self._precondition_matrix = None
+
+        for action in actions:
+            if id(action) in self.compiled_actions:
+                continue
+            if not isinstance(action.preconditions, dict) or not isinstance(action.effects, dict):
+                raise ValueError(f"Action {action.name} cannot be compiled: preconditions and effects must be dictionaries.")
+
+            for fluent in list(action.preconditions) + list(action.effects):
+                if fluent not in self.fluent_index:
+                    self.fluent_index[fluent] = len(self.fluents)
+                    self.fluents.append(fluent)
+            self.compiled_actions[id(action)] = action
+            self.actions.append(action)
+
+        for key, action in self.compiled_actions.items():
+            self.compiled_actions[key] = CompiledAction(action, self.fluent_index)
+
+    @classmethod
+    def from_planner_domain(cls, methods, actions):
+        """
+        Collects the actions registered in the planner and the actions used as method subtasks.
+        :param methods: The planner's methods dictionary.
+        :param actions: The planner's actions dictionary.
+        :return: The compiled domain.
+        """
+        return cls(domain_actions(methods, actions))
+
+    def compile_state(self, state):
+        """
+        Converts a dictionary state into a compiled state.
+        :param state: The state as a dictionary of fluent values.
+        :return: The equivalent CompiledState.
+        """
+        vector = _int_vector([0] * len(self.fluents))
+        extra = {}
+        present = 0
+        for fluent, value in state.items():
+            index = self.fluent_index.get(fluent)
+            if index is None:
+                extra[fluent] = value
+            else:
+                vector[index] = value
+                present |= 1 << index
+        return CompiledState(self, vector, extra, present)
+
+    def write_back(self, compiled_state, state):
+        """
+        Copies a compiled state back into a dictionary state, as if the actions had been applied to it directly:
+        present fluents are written and interned fluents absent from the compiled state are removed.
+        :param compiled_state: The compiled state.
+        :param state: The dictionary to update.
+        """
+        present = compiled_state.present
+        for fluent, index in self.fluent_index.items():
+            if present >> index & 1:
+                state[fluent] = int(compiled_state.vector[index])
+            else:
+                state.pop(fluent, None)
+        state.update(compiled_state.extra)
+        return state
+
+    def compiled(self, action):
+        compiled_action = self.compiled_actions.get(id(action))
+        if compiled_action is None:
+            raise ValueError(f"Action {action.name} is not part of the compiled domain.")
+        return compiled_action
+
+    def is_applicable(self, action, compiled_state):
+        return self.compiled(action).is_applicable(compiled_state.vector)
+
+    def apply(self, action, compiled_state):
+        compiled_action = self.compiled(action)
+        compiled_action.apply(compiled_state.vector)
+        compiled_state.present |= compiled_action.effect_mask
+        return compiled_state
+
+    def record_undo(self, action, compiled_state):
+        return self.compiled(action).record_undo(compiled_state.vector), compiled_state.present
+
+    def undo(self, action, compiled_state, record):
+        values, present = record
+        self.compiled(action).undo(compiled_state.vector, values)
+        compiled_state.present = present
+        return compiled_state
+
+    def precondition_matrix(self):
+        """
+        Packs the preconditions of all actions into a dense matrix, built on first use. Row i holds the minimum
+        value of every fluent for `self.actions[i]`; fluents the action does not constrain hold the smallest integer.
+        Requires NumPy.
+        :return: An (actions x fluents) int64 matrix.
+        """
+        if np is None:
+            raise ImportError("The precondition matrix requires NumPy.")
+
+        if self._precondition_matrix is None:
+            matrix = np.full((len(self.actions), len(self.fluents)), np.iinfo(np.int64).min, dtype=np.int64)
+            for row, action in enumerate(self.actions):
+                compiled_action = self.compiled_actions[id(action)]
+                matrix[row, compiled_action.precondition_indices] = compiled_action.precondition_values
+            self._precondition_matrix = matrix
+        return self._precondition_matrix
+
+    def applicable_actions(self, state):
+        """
+        Lists every action of the domain applicable in the given state.
+        :param state: A dictionary state or a CompiledState.
+        :return: The applicable actions, in `self.actions` order.
+        """
+        mask = self.applicability([state])[0]
+        return [action for action, applicable in zip(self.actions, mask) if applicable]
+
+    def applicability(self, states, chunk_size=1 << 24):
+        """
+        Tests every action against every state.
+        :param states: A list of dictionary states or CompiledStates.
+        :param chunk_size: Upper bound on the number of (state, action, fluent) comparisons done at once,
+                           which bounds the memory of the intermediate boolean array.
+        :return: A (states x actions) boolean matrix, a NumPy array or a list of lists without NumPy.
+        """
+        vectors = [state.vector if isinstance(state, CompiledState) else self.compile_state(state).vector
+                   for state in states]
+
+        if np is None:
+            compiled_actions = [self.compiled_actions[id(action)] for action in self.actions]
+            return [[compiled_action.is_applicable(vector) for compiled_action in compiled_actions]
+                    for vector in vectors]
+
+        matrix = self.precondition_matrix()
+        state_matrix = np.array(vectors, dtype=np.int64).reshape(len(vectors), len(self.fluents))
+        result = np.empty((len(vectors), len(self.actions)), dtype=bool)
+        step = max(1, chunk_size // max(1, matrix.size))
+        for start in range(0, len(vectors), step):
+            chunk = state_matrix[start:start + step]
+            result[start:start + step] = (chunk[:, None, :] >= matrix[None, :, :]).all(axis=2)
+        return result
+
+
+def domain_actions(methods, actions):
+    """
+    Lists the actions of a planner domain: the registered actions, then the actions used as method subtasks,
+    each once, in order. This is the action set of the compiled domain.
+    :param methods: The planner's methods by task.
+    :param actions: The planner's actions by name.
+    :return: The list of actions.
+    """
+    collected = {id(action): action for action in actions.values()}
+    for task_methods in methods.values():
+        for method in task_methods:
+            for subtask in method.subtasks:
+                if isinstance(subtask, Action):
+                    collected.setdefault(id(subtask), subtask)
+    return list(collected.values())
+
+
+def _int_vector(values):
+    if np is not None:
+        return np.fromiter(values, dtype=np.int64)
+    return array('q', values)
@@ -0,0 +1,48 @@
+# This file defines declarative method conditions: a conjunction of comparisons between a fluent's value and a
+# constant, such as [("packed_tent", "==", 0)]. Unlike a lambda, a FluentCondition can be stored in a domain file
+# and pickled, and it knows which fluents it reads, so methods using one can declare their read keys for free.
+import operator
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+class FluentCondition:
+    def __init__(self, comparisons):
+        """
+        :param comparisons: An iterable of (fluent, operator, value) triples, the operator being one of OPERATORS.
+                            Missing fluents read as 0. The condition holds when every comparison holds; an empty
+                            condition always holds.
+        """
+        self.comparisons = tuple((fluent, op, value) for fluent, op, value in comparisons)
+        for fluent, op, value in self.comparisons:
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown comparison operator {op!r} in the condition on {fluent}")
+        self._checks = tuple((fluent, OPERATORS[op], value) for fluent, op, value in self.comparisons)
+
+    def __call__(self, state):
+        for fluent, compare, value in self._checks:
+            if not compare(state.get(fluent, 0), value):
+                return False
+        return True
+
+    def fluents(self):
+        """
+        :return: The fluents the condition reads, in order of first use.
+        """
+        return list(dict.fromkeys(fluent for fluent, _, _ in self.comparisons))
+
+    def __eq__(self, other):
+        return isinstance(other, FluentCondition) and self.comparisons == other.comparisons
+
+    def __hash__(self):
+        return hash(self.comparisons)
+
+    def __repr__(self):
+        return f"FluentCondition({list(self.comparisons)!r})"
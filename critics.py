@@ -1,8 +1,94 @@
 # This file defines critic classes that analyze and modify a plan in HTN planning, resolving conflicts, eliminating redundant preconditions, and reusing existing objects.
+# Critics can run in batch mode (`analyze` over the whole remaining plan) or incrementally: the planner then only
+# reports the nodes inserted into and removed from the agenda since the last pass, and critics keep their own indexes.
 from htn_planner import NodeType
 
 
-class ResolveConflictsCritic:
+def _object_pair(node):
+    if node['type'] == NodeType.ACTION and hasattr(node['action'], 'obj1') and hasattr(node['action'], 'obj2'):
+        return node['action'].obj1, node['action'].obj2
+    return None
+
+
+class Critic:
+    # Set to True by critics implementing `nodes_inserted` and `nodes_removed`; other critics are run through `analyze`.
+    incremental = False
+
+    def analyze(self, plan):
+        """
+        Analyzes the whole remaining plan.
+        :param plan: The plan to be analyzed, consisting of plan nodes.
+        :return: The new plan.
+        """
+        return plan
+
+    def reset(self):
+        """
+        Clears the critic's indexes before a new planning run.
+        """
+
+    def nodes_inserted(self, nodes, plan):
+        """
+        Called with the nodes inserted into the agenda since the last pass, in agenda order.
+        :param nodes: The inserted nodes.
+        :param plan: The agenda, which already contains the inserted nodes.
+        :return: The nodes (inserted or already indexed) to remove from the agenda.
+        """
+        return []
+
+    def nodes_removed(self, nodes):
+        """
+        Called with the nodes removed from the agenda since the last pass. Nodes the critic never indexed must be ignored.
+        :param nodes: The removed nodes.
+        """
+
+
+class _DuplicateActionsCritic(Critic):
+    # Incremental form of the duplicate removal shared by ResolveConflictsCritic and EliminateRedundantPreconditionsCritic.
+    incremental = True
+
+    def __init__(self):
+        self._node_by_pair = {}
+        self._pair_by_node = {}
+
+    def reset(self):
+        self._node_by_pair = {}
+        self._pair_by_node = {}
+
+    def nodes_inserted(self, nodes, plan):
+        # Inserted nodes are at the front of the agenda, so the first inserted node with a given pair is the one
+        # `analyze` would keep: a node already indexed for that pair comes after it and is dropped.
+        discarded = []
+        inserted_pairs = set()
+
+        for node in nodes:
+            pair = _object_pair(node)
+            if pair is None:
+                continue
+
+            if pair in inserted_pairs:
+                discarded.append(node)
+                continue
+
+            inserted_pairs.add(pair)
+            existing = self._node_by_pair.get(pair)
+            if existing is not None:
+                del self._pair_by_node[id(existing)]
+                discarded.append(existing)
+
+            self._node_by_pair[pair] = node
+            self._pair_by_node[id(node)] = pair
+
+        return discarded
+
+    def nodes_removed(self, nodes):
+        for node in nodes:
+            pair = self._pair_by_node.pop(id(node), None)
+            if pair is not None:
+                del self._node_by_pair[pair]
+
+
+class ResolveConflictsCritic(_DuplicateActionsCritic):
     def analyze(self, plan):
         """
         Analyzes the given plan to resolve conflicts by removing duplicate actions on the same objects.
@@ -24,7 +110,7 @@ class ResolveConflictsCritic:
         return new_plan
 
 
-class EliminateRedundantPreconditionsCritic:
+class EliminateRedundantPreconditionsCritic(_DuplicateActionsCritic):
     def analyze(self, plan):
         """
         Analyzes the given plan and eliminates redundant actions based on repeated preconditions on the same objects.
@@ -46,7 +132,13 @@ class EliminateRedundantPreconditionsCritic:
         return new_plan
 
 
-class UseExistingObjectsCritic:
+class UseExistingObjectsCritic(Critic):
+    incremental = True
+
+    def __init__(self):
+        self._object_nodes = {}
+        self._pair_by_node = {}
+
     def analyze(self, plan):
         """
         Analyzes the given plan to reuse existing objects in actions where applicable.
@@ -60,6 +152,59 @@ class UseExistingObjectsCritic:
                     node['action'].obj1, node['action'].obj2 = self.reuse_existing_object(obj1, obj2, plan)
         return plan
 
+    def reset(self):
+        self._object_nodes = {}
+        self._pair_by_node = {}
+
+    def nodes_inserted(self, nodes, plan):
+        """
+        Indexes the inserted nodes by the objects they use, then reuses existing objects for them.
+        The existence check is a lookup in the object-to-nodes index instead of a scan of the plan.
+        """
+        for node in nodes:
+            pair = _object_pair(node)
+            if pair is not None:
+                self._index(node, pair)
+
+        for node in nodes:
+            pair = _object_pair(node)
+            if pair is not None and self.is_existing_object(*pair):
+                reused = self.reuse_existing_object(pair[0], pair[1], plan)
+                if reused != pair:
+                    self._unindex(node)
+                    node['action'].obj1, node['action'].obj2 = reused
+                    self._index(node, reused)
+
+        return []
+
+    def nodes_removed(self, nodes):
+        for node in nodes:
+            self._unindex(node)
+
+    def _index(self, node, pair):
+        self._pair_by_node[id(node)] = pair
+        for obj in set(pair):
+            self._object_nodes.setdefault(obj, set()).add(id(node))
+
+    def _unindex(self, node):
+        pair = self._pair_by_node.pop(id(node), None)
+        if pair is None:
+            return
+
+        for obj in set(pair):
+            self._object_nodes[obj].discard(id(node))
+            if not self._object_nodes[obj]:
+                del self._object_nodes[obj]
+
+    def is_existing_object(self, obj1, obj2):
+        """
+        Checks if the given objects are used by any indexed action node, in constant time.
+        :param obj1: The first object to check.
+        :param obj2: The second object to check.
+        :return: True if the objects are found in the agenda, False otherwise.
+        """
+        return obj1 in self._object_nodes or obj2 in self._object_nodes
+
     def is_existing_object_in_plan(self, obj1, obj2, plan):
         """
         Checks if the given objects are already part of any action in the plan.
@@ -0,0 +1,173 @@
+# This file defines an opt-in LRU cache of task decompositions. A compound task always decomposes into the
+# same actions when the fluents its methods and actions read have the same values, so the planner can
+# replay the cached action sequence instead of decomposing the task again.
+#
+# State keys are either fluent names (numeric states, `state.get(key, 0)`) or (structure, item) pairs for
+# nested states like the blocks domain: ('ON', 'A') reads `state['ON'].get('A')` and ('CLEAR', 'A') reads
+# whether 'A' is in `state['CLEAR']`. These are the same keys actions return from `written_keys`.
+import sys
+from collections import OrderedDict
+
+from persistent import PersistentMap, PersistentSet
+
+
+def read_state_value(state, key):
+    """
+    Reads the value of a state key.
+    :param state: The current state of the world.
+    :param key: A fluent name, or a (structure, item) pair.
+    :return: The value: a number for fluents, the mapped value or a membership flag for pairs.
+    """
+    if isinstance(key, tuple):
+        structure = state[key[0]]
+        if isinstance(structure, (dict, PersistentMap)):
+            return structure.get(key[1])
+        return key[1] in structure
+    return state.get(key, 0)
+
+
+def write_state_value(state, key, value):
+    """
+    Sets the value of a state key, the inverse of `read_state_value`.
+    :param state: The state to modify.
+    :param key: A fluent name, or a (structure, item) pair.
+    :param value: The value to write; None removes a mapping, a flag adds or removes a member.
+    """
+    if not isinstance(key, tuple):
+        state[key] = value
+        return
+
+    structure = state[key[0]]
+    if isinstance(structure, PersistentMap):
+        if value is not None:
+            state[key[0]] = structure.set(key[1], value)
+        elif key[1] in structure:
+            state[key[0]] = structure.delete(key[1])
+    elif isinstance(structure, PersistentSet):
+        state[key[0]] = structure.add(key[1]) if value else structure.discard(key[1])
+    elif isinstance(structure, dict):
+        if value is None:
+            structure.pop(key[1], None)
+        else:
+            structure[key[1]] = value
+    elif value and key[1] not in structure:
+        if isinstance(structure, set):
+            structure.add(key[1])
+        else:
+            structure.append(key[1])
+    elif not value and key[1] in structure:
+        structure.remove(key[1])
+
+
+class CacheEntry:
+    __slots__ = ('actions', 'size')
+
+    def __init__(self, actions, size):
+        self.actions = actions
+        self.size = size
+
+
+class DecompositionCache:
+    def __init__(self, max_entries=4096, max_bytes=None):
+        """
+        Initializes an empty cache.
+        :param max_entries: Maximum number of cached decompositions.
+        :param max_bytes: Optional cap on the estimated memory used by the entries.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._task_keys = {}
+        self.size_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'uncacheable': 0}
+
+    def relevant_keys(self, task, methods, actions):
+        """
+        Computes, once per task, the state keys read by the task's methods and by every action it can reach.
+        :return: A tuple of keys, or None when something the task reaches does not declare what it reads
+                 (the task is then never cached).
+        """
+        if task not in self._task_keys:
+            keys = self._collect_keys(task, methods, actions, set())
+            self._task_keys[task] = tuple(keys) if keys is not None else None
+        return self._task_keys[task]
+
+    def _collect_keys(self, task, methods, actions, visiting):
+        if task in actions:
+            return actions[task].read_keys()
+        if task in visiting or task not in methods:
+            return None
+
+        visiting.add(task)
+        keys = {}
+        for method in methods[task]:
+            method_keys = method.read_keys() if hasattr(method, 'read_keys') else None
+            if method_keys is None:
+                return None
+            keys.update(dict.fromkeys(method_keys))
+
+            for subtask in method.subtasks:
+                if isinstance(subtask, str):
+                    subtask_keys = self._collect_keys(subtask, methods, actions, visiting)
+                else:
+                    subtask_keys = subtask.read_keys()
+                if subtask_keys is None:
+                    return None
+                keys.update(dict.fromkeys(subtask_keys))
+        visiting.discard(task)
+
+        return keys
+
+    def key_for(self, task, state, methods, actions):
+        """
+        Builds the cache key of a task in a state: the task and the projection of the state on its relevant keys.
+        :return: The cache key, or None if the task cannot be cached.
+        """
+        keys = self.relevant_keys(task, methods, actions)
+        if keys is None:
+            self.stats['uncacheable'] += 1
+            return None
+        return task, tuple(read_state_value(state, key) for key in keys)
+
+    def lookup(self, cache_key):
+        """
+        :return: The CacheEntry stored for the key, or None on a miss.
+        """
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        self._entries.move_to_end(cache_key)
+        self.stats['hits'] += 1
+        return entry
+
+    def store(self, cache_key, actions):
+        """
+        Stores the actions a task decomposed into.
+        :param cache_key: The key returned by `key_for` before the task was decomposed.
+        :param actions: The actions executed for the task, in order.
+        """
+        actions = tuple(actions)
+        size = sys.getsizeof(cache_key) + sys.getsizeof(cache_key[1]) + sys.getsizeof(actions)
+        if cache_key in self._entries:
+            self.size_bytes -= self._entries.pop(cache_key).size
+        self._entries[cache_key] = CacheEntry(actions, size)
+        self.size_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 (self.max_bytes is not None and self.size_bytes > self.max_bytes)):
+            _, entry = self._entries.popitem(last=False)
+            self.size_bytes -= entry.size
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        # The relevant keys are dropped as well, so the cache follows changes of the domain (see prune_domain).
+        self._entries.clear()
+        self._task_keys.clear()
+        self.size_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
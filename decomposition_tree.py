@@ -0,0 +1,130 @@
+# This file defines the decomposition tree recorded while planning: for every task the planner decomposed, the
+# method it chose and the nodes it decomposed into. The sequential plan loses this structure; the tree keeps it,
+# so later stages can recover which actions a task produced and the ordering constraints its methods declared,
+# and plan repair can re-decompose a single task and graft the new decomposition in place of the old one.
+from ordering_type import OrderingType
+from plan_node import NodeType
+
+
+def node_name(node):
+    """
+    :return: The action name of an action node, otherwise the task name (None for bookkeeping nodes), as used in
+             method dependencies.
+    """
+    return node.action.name if node.kind == NodeType.ACTION else node.goal
+
+
+class DecompositionTree:
+    def __init__(self):
+        self.roots = []
+        self._children = {}
+        self._methods = {}
+        self._parents = {}
+        # Nodes are indexed by id(); keeping them referenced here prevents the ids from being reused.
+        self._nodes = {}
+
+    def add_roots(self, nodes):
+        self.roots.extend(nodes)
+        for node in nodes:
+            self._nodes[id(node)] = node
+
+    def record(self, node, method, children):
+        """
+        Records the decomposition of a goal node.
+        :param node: The goal node.
+        :param method: The method used, or None when the goal is a primitive task.
+        :param children: The nodes it decomposed into, in agenda order.
+        """
+        self._nodes[id(node)] = node
+        self._methods[id(node)] = method
+        self._children[id(node)] = list(children)
+        for child in children:
+            self._nodes[id(child)] = child
+            self._parents[id(child)] = node
+
+    def children(self, node):
+        return self._children.get(id(node), [])
+
+    def method(self, node):
+        return self._methods.get(id(node))
+
+    def parent(self, node):
+        """
+        :return: The goal node the node was decomposed from, or None for roots and unknown nodes.
+        """
+        return self._parents.get(id(node))
+
+    def graft(self, node, subtree, first=0):
+        """
+        Replaces the children of a node from position `first` on with the roots of another tree and their recorded
+        decompositions, forgetting the descendants of the children replaced.
+        :param node: A goal node of this tree.
+        :param subtree: The tree whose roots, in order, are the new children, e.g. the replaced tasks planned again.
+        :param first: The position of the first child replaced; the children before it are kept.
+        """
+        children = self._children.get(id(node), [])
+        for child in children[first:]:
+            self._forget(child)
+
+        for node_id, grandchildren in subtree._children.items():
+            self._children[node_id] = grandchildren
+            self._methods[node_id] = subtree._methods[node_id]
+            for grandchild in grandchildren:
+                self._parents[id(grandchild)] = subtree._nodes[node_id]
+        self._nodes.update(subtree._nodes)
+        self.record(node, self._methods.get(id(node)), children[:first] + subtree.roots)
+
+    def _forget(self, node):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            stack.extend(self._children.pop(id(current), ()))
+            self._methods.pop(id(current), None)
+            self._parents.pop(id(current), None)
+            self._nodes.pop(id(current), None)
+
+    def clear(self):
+        self.roots = []
+        self._children.clear()
+        self._methods.clear()
+        self._parents.clear()
+        self._nodes.clear()
+
+    def actions_under(self, node):
+        """
+        :return: The action nodes the node decomposed into, in agenda order.
+        """
+        actions = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.kind == NodeType.ACTION:
+                actions.append(current)
+            stack.extend(reversed(self._children.get(id(current), ())))
+        return actions
+
+    def ordering_constraints(self, strict=False):
+        """
+        Lists the orderings declared by the methods used: the dependencies of partially ordered methods, and with
+        `strict` the subtask sequence of ordered methods as well.
+        :return: A list of (before, after) pairs of lists of action nodes; every action of `before` must finish
+                 before any action of `after` starts.
+        """
+        constraints = []
+        for node_id, children in self._children.items():
+            method = self._methods[node_id]
+            if method is None:
+                continue
+
+            if method.ordering == OrderingType.PARTIALLY_ORDERED:
+                by_name = {}
+                for child in children:
+                    by_name.setdefault(node_name(child), []).append(child)
+                for before, after in method.dependencies:
+                    for before_node in by_name.get(before, ()):
+                        for after_node in by_name.get(after, ()):
+                            constraints.append((self.actions_under(before_node), self.actions_under(after_node)))
+            elif strict and method.ordering == OrderingType.ORDERED:
+                for before_node, after_node in zip(children, children[1:]):
+                    constraints.append((self.actions_under(before_node), self.actions_under(after_node)))
+        return constraints
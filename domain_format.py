@@ -0,0 +1,195 @@
+# This file defines the declarative domain format: numeric actions and methods described as JSON (or YAML, when
+# PyYAML is installed) instead of Python code, so domains can be stored, shared with worker processes and loaded
+# quickly. A domain file looks like
+#
+#   {"actions": [{"name": "Pack Tent", "preconditions": {}, "effects": {"packed_tent": 1}, "duration": 1}, ...],
+#    "methods": [{"task": "Pack Items", "subtasks": ["Pack Tent", "Pack Food"], "ordering": "ordered",
+#                 "condition": [["packed_tent", "==", 0]], "dependencies": []}, ...]}
+#
+# Subtasks naming an action become that Action, other names are compound tasks; a task's methods are tried in
+# file order. Conditions are FluentConditions, and a method's read keys default to the fluents of its condition.
+#
+# Loading compiles the file into the planner's structures (Method resolves its ordering and prebuilds its subgoal
+# nodes) and pickles the result into a cache file named after a hash of the file's content, so later loads of an
+# unchanged file only unpickle it.
+import gc
+import hashlib
+import json
+import os
+import pickle
+from collections import namedtuple
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from action import Action
+from conditions import FluentCondition
+from method import Method
+from ordering_type import OrderingType
+
+# Bumped whenever the compiled structures change, so caches written by older versions are not reused.
+FORMAT_VERSION = 1
+
+CACHE_SUFFIX = ".domain.pickle"
+
+# A loaded domain: the actions by name and the methods by task, as HTNPlanner takes them.
+Domain = namedtuple('Domain', ['actions', 'methods'])
+
+
+def domain_from_dict(data):
+    """
+    Compiles a parsed domain description.
+    :param data: A dictionary with "actions" and "methods" lists, in the format described above.
+    :return: A Domain.
+    """
+    actions = {}
+    for entry in data.get('actions', []):
+        name = entry['name']
+        if name in actions:
+            raise ValueError(f"Action {name} is defined twice")
+        actions[name] = Action(name, dict(entry.get('preconditions', {})), dict(entry.get('effects', {})),
+                               duration=entry.get('duration'))
+
+    methods = {}
+    for entry in data.get('methods', []):
+        task = entry['task']
+        condition = FluentCondition(entry.get('condition', []))
+        try:
+            ordering = OrderingType(entry.get('ordering', OrderingType.ORDERED.value))
+        except ValueError:
+            raise ValueError(f"Unknown ordering type {entry['ordering']!r} in a method of {task}") from None
+        subtasks = [actions.get(subtask, subtask) for subtask in entry['subtasks']]
+        dependencies = [tuple(dependency) for dependency in entry.get('dependencies', [])]
+        methods.setdefault(task, []).append(Method(task, subtasks, condition, ordering,
+                                                   dependencies=dependencies or None, reads=entry.get('reads')))
+    return Domain(actions, methods)
+
+
+def domain_to_dict(actions, methods):
+    """
+    Describes a domain in the declarative format. Only numeric actions and methods whose conditions are
+    FluentConditions can be described.
+    :param actions: The actions by name.
+    :param methods: The methods by task.
+    :return: A dictionary that json.dump can write.
+    """
+    action_entries = []
+    for name, action in actions.items():
+        if not isinstance(action.preconditions, dict) or not isinstance(action.effects, dict):
+            raise ValueError(f"Action {name} cannot be described: preconditions and effects must be dictionaries.")
+        entry = {'name': name, 'preconditions': action.preconditions, 'effects': action.effects}
+        if action.duration is not None:
+            entry['duration'] = action.duration
+        action_entries.append(entry)
+
+    method_entries = []
+    for task, task_methods in methods.items():
+        for method in task_methods:
+            if not isinstance(method.condition, FluentCondition):
+                raise ValueError(f"A method of {task} cannot be described: its condition is not a FluentCondition.")
+            entry = {'task': task,
+                     'subtasks': [subtask.name if isinstance(subtask, Action) else subtask
+                                  for subtask in method.subtasks],
+                     'ordering': method.ordering.value,
+                     'condition': [list(comparison) for comparison in method.condition.comparisons]}
+            if method.dependencies:
+                entry['dependencies'] = [list(dependency) for dependency in method.dependencies]
+            if method.reads is not None and list(method.reads) != method.condition.fluents():
+                entry['reads'] = list(method.reads)
+            method_entries.append(entry)
+
+    return {'actions': action_entries, 'methods': method_entries}
+
+
+def dump_domain(actions, methods, path):
+    """
+    Writes a domain to a JSON file, or to a YAML file when the path ends in .yaml or .yml.
+    """
+    data = domain_to_dict(actions, methods)
+    with open(path, 'w') as file:
+        if _is_yaml(path):
+            _require_yaml()
+            yaml.safe_dump(data, file, sort_keys=False)
+        else:
+            json.dump(data, file, indent=2)
+
+
+def _is_yaml(path):
+    return path.endswith(('.yaml', '.yml'))
+
+
+def _require_yaml():
+    if yaml is None:
+        raise ImportError("YAML domain files require PyYAML.")
+
+
+def _parse(content, path):
+    if _is_yaml(path):
+        _require_yaml()
+        return yaml.safe_load(content)
+    return json.loads(content)
+
+
+def cache_path(path, content, cache_dir=None):
+    """
+    :return: The cache file of a domain file with the given content; by default in a __pycache__ directory next
+             to the file.
+    """
+    digest = hashlib.sha256(content + f"/{FORMAT_VERSION}".encode()).hexdigest()[:20]
+    directory = cache_dir if cache_dir is not None else os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                                     '__pycache__')
+    return os.path.join(directory, f"{os.path.basename(path)}.{digest}{CACHE_SUFFIX}")
+
+
+def load_domain(path, cache=True, cache_dir=None):
+    """
+    Loads a domain file, from its compiled cache when the file has not changed since the cache was written.
+    :param path: The JSON or YAML domain file.
+    :param cache: Whether to read and write the compiled cache.
+    :param cache_dir: Optional directory of the cache files.
+    :return: A Domain.
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+    if not cache:
+        return domain_from_dict(_parse(content, path))
+
+    compiled_path = cache_path(path, content, cache_dir)
+    # Unpickling creates many objects at once; pausing the collector meanwhile makes loading several times faster.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        with open(compiled_path, 'rb') as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # A missing, truncated or outdated cache is rebuilt.
+        pass
+    finally:
+        if collecting:
+            gc.enable()
+
+    domain = domain_from_dict(_parse(content, path))
+    _write_cache(compiled_path, domain)
+    return domain
+
+
+def _write_cache(compiled_path, domain):
+    directory, name = os.path.split(compiled_path)
+    prefix = name[:-len(CACHE_SUFFIX)].rsplit('.', 1)[0] + '.'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Written under a temporary name and renamed, so concurrent loaders never read a partial cache.
+        temporary_path = f"{compiled_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as file:
+            pickle.dump(domain, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, compiled_path)
+
+        # Caches of earlier versions of the same file are no longer needed.
+        for other in os.listdir(directory):
+            if other.startswith(prefix) and other.endswith(CACHE_SUFFIX) and other != name:
+                os.remove(os.path.join(directory, other))
+    except OSError:
+        # Caching is an optimisation; a read-only location only costs the compilation on every load.
+        pass
@@ -0,0 +1,151 @@
+# This file defines seeded generators of benchmark problems: random block-world instances of any size, and
+# synthetic camping-style hierarchies of configurable depth, branching factor and mix of ordering types.
+# The same parameters and seed always produce the same problem, so timings can be compared across versions.
+import random
+from collections import namedtuple
+from functools import partial
+
+from action import Action
+from conditions import FluentCondition
+from critics import EliminateRedundantPreconditionsCritic, ResolveConflictsCritic, UseExistingObjectsCritic
+from htn_planner import HTNPlanner
+from main_blocks import block_methods, block_stacking_is_goal_satisfied, compile_block_goal, make_block_state
+from method import Method
+from ordering_type import OrderingType
+
+# A generated problem: a planner built for it, the goals and the initial state, the generator parameters, and a
+# callable telling whether a final state solves the problem.
+Problem = namedtuple('Problem', ['planner', 'goals', 'state', 'params', 'is_solved'])
+
+
+def random_towers(blocks, max_height, rng):
+    """
+    Stacks the blocks into random towers.
+    :return: A list of towers, each a list of blocks from the bottom up.
+    """
+    blocks = list(blocks)
+    rng.shuffle(blocks)
+    towers = []
+    while blocks:
+        height = rng.randint(1, max_height)
+        towers.append(blocks[:height])
+        blocks = blocks[height:]
+    return towers
+
+
+def blocks_problem(blocks, seed=0, max_height=4, goal_height=4):
+    """
+    Generates a random block-world instance. The initial state stacks the blocks into random towers. The goals
+    build random towers from the blocks that are initially on top of a tower, each tower resting on another
+    block; these are the goals the blocks methods can achieve, since they only clear the block that receives
+    another one.
+    :param blocks: The number of blocks.
+    :param seed: The random seed.
+    :param max_height: The maximum height of the initial towers.
+    :param goal_height: The maximum number of blocks stacked on the base of a goal tower.
+    :return: A Problem.
+    """
+    rng = random.Random(seed)
+    names = [f"B{index}" for index in range(blocks)]
+    towers = random_towers(names, max_height, rng)
+
+    # The state maps each block to the block on top of it, and lists the blocks with nothing on top.
+    on = {tower[index]: tower[index + 1] for tower in towers for index in range(len(tower) - 1)}
+    clear = [tower[-1] for tower in towers]
+
+    tops = list(clear)
+    rng.shuffle(tops)
+    bases = [name for name in names if name not in clear]
+    rng.shuffle(bases)
+
+    goals = []
+    while tops and bases:
+        height = rng.randint(1, goal_height)
+        tower = [bases.pop()] + tops[:height]
+        tops = tops[height:]
+        goals.extend(f"ON({tower[index]}, {tower[index + 1]})" for index in range(len(tower) - 1))
+
+    critics = [ResolveConflictsCritic(), EliminateRedundantPreconditionsCritic(), UseExistingObjectsCritic()]
+    planner = HTNPlanner(block_methods(), {}, critics, block_stacking_is_goal_satisfied,
+                         goal_compiler=compile_block_goal)
+    params = {'domain': 'blocks', 'blocks': blocks, 'seed': seed, 'max_height': max_height,
+              'goal_height': goal_height}
+    return Problem(planner, goals, make_block_state(clear=clear, on=on), params,
+                   partial(block_stacking_is_goal_satisfied, goals))
+
+
+def never_satisfied(goals, state):
+    # The synthetic hierarchies run until the agenda is empty.
+    return False
+
+
+def all_done(fluents, state):
+    return all(state.get(fluent, 0) > 0 for fluent in fluents)
+
+
+def _ordering_types(ordering_mix):
+    types = {'ordered': OrderingType.ORDERED, 'unordered': OrderingType.UNORDERED,
+             'partial': OrderingType.PARTIALLY_ORDERED}
+    return [types[name] for name in ordering_mix], list(ordering_mix.values())
+
+
+def hierarchy_problem(depth=3, branching=3, seed=0, ordering_mix=None, max_duration=3, dead_ends=0):
+    """
+    Generates a camping-style task hierarchy: a root task decomposed by one method into `branching` subtasks,
+    recursively, down to `depth` levels of compound tasks whose leaves are actions. Each action is guarded by
+    the effect of the previous action in its method, as in the camping example, and each method's ordering type
+    is drawn from `ordering_mix`; partially ordered methods get random dependencies along the subtask order.
+    :param depth: The number of levels of compound tasks.
+    :param branching: The number of subtasks per method.
+    :param seed: The random seed.
+    :param ordering_mix: Weights of the ordering types, keyed by 'ordered', 'unordered' and 'partial'.
+    :param max_duration: The maximum action duration.
+    :param dead_ends: Number of methods tried before the real one of every task that can never succeed: they
+                      decompose into the same subtasks followed by an action needing a fluent no action sets.
+    :return: A Problem whose plan has branching ** depth actions.
+    """
+    rng = random.Random(seed)
+    ordering_mix = ordering_mix or {'ordered': 0.5, 'unordered': 0.25, 'partial': 0.25}
+    ordering_types, weights = _ordering_types(ordering_mix)
+
+    methods = {}
+    actions = {}
+    pending = [("Task", 1)]
+    while pending:
+        task, level = pending.pop()
+        ordering = rng.choices(ordering_types, weights)[0]
+        subtasks = []
+        for index in range(branching):
+            name = f"{task}.{index}"
+            if level < depth:
+                subtasks.append(name)
+                pending.append((name, level + 1))
+            else:
+                # Within ordered methods, each action needs the fluent set by the previous one.
+                preconditions = {}
+                if ordering == OrderingType.ORDERED and subtasks:
+                    preconditions = {f"{subtasks[-1].name} done": 1}
+                action = Action(name, preconditions, {f"{name} done": 1}, duration=rng.randint(1, max_duration))
+                actions[name] = action
+                subtasks.append(action)
+
+        dependencies = None
+        if ordering == OrderingType.PARTIALLY_ORDERED:
+            names = [subtask if isinstance(subtask, str) else subtask.name for subtask in subtasks]
+            dependencies = [(names[index], names[index + 1]) for index in range(len(names) - 1) if rng.random() < 0.5]
+
+        condition = FluentCondition([(f"{task} done", '==', 0)])
+        methods[task] = []
+        for index in range(dead_ends):
+            name = f"{task}.dead_end{index}"
+            dead_end = Action(name, {f"{task} impossible": 1}, {f"{name} done": 1}, duration=1)
+            actions[dead_end.name] = dead_end
+            methods[task].append(Method(task, subtasks + [dead_end], condition, ordering,
+                                        dependencies=dependencies))
+        methods[task].append(Method(task, subtasks, condition, ordering, dependencies=dependencies))
+
+    planner = HTNPlanner(methods, actions, [], never_satisfied)
+    params = {'domain': 'hierarchy', 'depth': depth, 'branching': branching, 'seed': seed,
+              'ordering_mix': dict(ordering_mix), 'max_duration': max_duration, 'dead_ends': dead_ends}
+    done_fluents = [f"{name} done" for name in actions if '.dead_end' not in name]
+    return Problem(planner, ["Task"], {}, params, partial(all_done, done_fluents))
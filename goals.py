@@ -0,0 +1,93 @@
+# This file defines compiled goal predicates for HTN planning. A goal compiler turns each goal into a
+# structured predicate once, before planning, and the CompiledGoals index keeps track of which predicates
+# are unsatisfied. Predicates are indexed by the state keys they read, so after an action only the
+# predicates reading one of the keys it wrote are re-evaluated.
+
+
+class GoalPredicate:
+    def __init__(self, reads):
+        """
+        Initializes a goal predicate.
+        :param reads: The state keys the predicate depends on (e.g., fluent names).
+        """
+        self.reads = tuple(reads)
+
+    def holds(self, state):
+        """
+        Checks whether the predicate is true in the given state.
+        :param state: The current state of the world.
+        :return: True if the predicate holds, False otherwise.
+        """
+        raise NotImplementedError
+
+
+class FluentAtLeast(GoalPredicate):
+    def __init__(self, fluent, value=1):
+        """
+        Goal predicate for numeric states, true when `state[fluent] >= value`.
+        :param fluent: The name of the fluent to check.
+        :param value: The minimum value the fluent must reach.
+        """
+        super().__init__([fluent])
+        self.fluent = fluent
+        self.value = value
+
+    def holds(self, state):
+        return state.get(self.fluent, 0) >= self.value
+
+
+class CompiledGoals:
+    def __init__(self, predicates):
+        """
+        Builds the index from state keys to the predicates reading them.
+        :param predicates: The goal predicates that must all hold for the goals to be satisfied.
+        """
+        self.predicates = list(predicates)
+        self._readers = {}
+        for index, predicate in enumerate(self.predicates):
+            for key in predicate.reads:
+                self._readers.setdefault(key, []).append(index)
+
+        self._unsatisfied = set(range(len(self.predicates)))
+
+    @classmethod
+    def compile(cls, goals, goal_compiler):
+        """
+        Compiles a list of goals with a domain-specific goal compiler.
+        :param goals: The goals given to the planner.
+        :param goal_compiler: A function mapping a goal to a GoalPredicate, or to None if the goal
+                              does not constrain the state (it is then ignored).
+        :return: The compiled goals.
+        """
+        predicates = (goal_compiler(goal) for goal in goals)
+        return cls(predicate for predicate in predicates if predicate is not None)
+
+    def reset(self, state):
+        """
+        Evaluates every predicate against the state.
+        :param state: The current state of the world.
+        """
+        self._unsatisfied = {index for index, predicate in enumerate(self.predicates) if not predicate.holds(state)}
+
+    def update(self, state, keys):
+        """
+        Re-evaluates only the predicates that read one of the given keys.
+        :param state: The state after the change.
+        :param keys: The state keys that were written, or None if unknown (every predicate is re-evaluated).
+        """
+        if keys is None:
+            self.reset(state)
+            return
+
+        for key in keys:
+            for index in self._readers.get(key, ()):
+                if self.predicates[index].holds(state):
+                    self._unsatisfied.discard(index)
+                else:
+                    self._unsatisfied.add(index)
+
+    def is_satisfied(self):
+        """
+        :return: True if every predicate currently holds.
+        """
+        return not self._unsatisfied
@@ -1,78 +1,519 @@
-class NodeType:
-    SPLIT = "SPLIT"
-    JOIN = "JOIN"
-    GOAL = "GOAL"
-    ACTION = "ACTION"
-    PHANTOM = "PHANTOM"
+from agenda import Agenda
+from async_planning import AsyncPlanner
+from batch_planning import plan_many
+from best_first import best_first_search
+from compiled_domain import CompiledDomain, domain_actions
+from decomposition_cache import write_state_value
+from goals import CompiledGoals
+from instrumentation import Instrumentation
+from method_index import ApplicabilityCache, MethodIndex
+from order_search import explore_orderings
+from plan_node import NodeType, PlanNode
+from plan_repair import repair_plan
+from reachability import analyze_domain
 
 
 class HTNPlanner:
-    def __init__(self, methods, actions, critics, is_goal_satisfied):
+    def __init__(self, methods, actions, critics, is_goal_satisfied=None, goal_compiler=None, compiled=False,
+                 decomposition_cache=None, indexed_methods=False):
         self.methods = methods
         self.actions = actions
         self.critics = critics
         self.is_goal_satisfied = is_goal_satisfied
+        self.goal_compiler = goal_compiler
+        # In compiled mode, fluents are interned once here and states are handled as integer vectors.
+        self.compiled_domain = CompiledDomain.from_planner_domain(methods, actions) if compiled else None
+        # Set while exploring orderings, to pick the linearisation of unordered and partially ordered methods.
+        self.ordering_choices = None
+        # Optional DecompositionCache replaying the decomposition of a task seen in the same relevant state.
+        self.decomposition_cache = decomposition_cache
+        # With indexed methods, a task's method is selected through the decision index of its FluentConditions,
+        # and during iter_plan the choice is cached until a key the task's methods read is written.
+        self.method_index = MethodIndex(methods) if indexed_methods else None
+        # Set by enable_instrumentation; None keeps the hot path free of instrumentation.
+        self.instrumentation = None
+        # Created by the first aplan() call; see configure_async to change its limits.
+        self.async_planner = None
+        self.nodes_expanded = 0
+        self.backtracks = 0
 
-    def plan(self, goals, state):
-        plan = []
-        for goal in goals:
-            plan.append(self.create_goal_node(goal))
+    def plan(self, goals, state, tree=None):
+        """
+        Plans by decomposing the goals left to right, committing to the first applicable method of every task.
+        :param goals: The goals to plan for.
+        :param state: The initial state, updated in place.
+        :param tree: Optional DecompositionTree in which the decompositions made are recorded.
+        :return: The list of executed action nodes.
+        """
+        return list(self.iter_plan(goals, state, tree=tree))
 
+    def iter_plan(self, goals, state, tree=None, cancel=None, until_satisfied=True, yield_expansions=False):
+        """
+        Plans like `plan`, but as a generator yielding each action node as soon as it is committed, so execution
+        can start before the rest of the goals are decomposed. The executed actions are not kept (unless the
+        decomposition cache needs them), so memory does not grow with the length of the plan.
+
+        Execution feedback can be sent into the generator: `send(updates)` with a dictionary mapping state keys
+        (fluents or (structure, item) pairs) to their observed values writes them into the planning state before
+        the next decomposition, so method conditions see them. Planning stops early when the generator is closed
+        or when `cancel` is set; the state is finalised either way.
+
+        With a decomposition cache, a task found in the cache is not decomposed: its cached actions are pushed onto
+        the agenda and executed one at a time like any other action, so the goals are checked and the critics run
+        between them. The cache only records which actions a task produced, not its decomposition, so it is not
+        used by runs recording a tree.
+        :param goals: The goals to plan for.
+        :param state: The initial state, updated in place.
+        :param tree: Optional DecompositionTree in which the decompositions made are recorded. The decomposition
+                     cache is bypassed when one is given.
+        :param cancel: Optional object with an is_set() method, such as a threading.Event, checked before each node.
+        :param until_satisfied: Whether to stop once the goals are satisfied; otherwise every task is decomposed,
+                                as when the goals are the tasks of a subtree being planned again.
+        :param yield_expansions: Whether to also yield None after every node taken off the agenda that commits no
+                                 action, so that a caller interleaving other work regains control on every node
+                                 expansion. Updates can be sent in reply to None as well.
+        :return: A generator of action nodes.
+        """
+        initial_state = state
+        state = self.prepare_state(state)
+        root_nodes = [self.create_goal_node(goal) for goal in goals]
+        if tree is not None:
+            tree.add_roots(root_nodes)
+        applicability_cache = ApplicabilityCache(self.method_index) if self.method_index is not None else None
+        plan = Agenda(root_nodes, track_changes=bool(self.critics))
+        compiled_goals = self.compile_goals(goals, state) if until_satisfied else None
+        for critic in self.critics:
+            if hasattr(critic, 'reset'):
+                critic.reset()
+
+        # Executed actions are only kept for the decomposition cache, which stores them at the JOIN nodes.
+        use_cache = self.decomposition_cache is not None and tree is None
+        executed = [] if use_cache else None
+        # External updates invalidate the decompositions in progress; see the JOIN nodes.
+        updates_received = 0
+        instrumentation = self.instrumentation
+
+        try:
+            while plan:
+                if cancel is not None and cancel.is_set():
+                    return
+
+                node = plan.pop()
+                if instrumentation is not None:
+                    instrumentation.node_popped(node, len(plan))
+
+                if until_satisfied and self.goals_satisfied(goals, state, compiled_goals):
+                    break
+
+                if node.kind == NodeType.GOAL:
+                    cache_key = self.decomposition_cache_key(node.goal, state) if use_cache else None
+                    entry = self.decomposition_cache.lookup(cache_key) if cache_key is not None else None
+                    if entry is not None:
+                        plan.push_front([PlanNode.action_node(action) for action in entry.actions])
+                    else:
+                        subgoals = self.decompose_goal(node, state, tree, applicability_cache)
+                        if not subgoals:
+                            raise ValueError(f"No method or action found to decompose goal: {node.goal}")
+                        if cache_key is not None:
+                            # The JOIN node is reached once the whole decomposition has been executed.
+                            subgoals.append(PlanNode(NodeType.JOIN, data={'cache_key': cache_key,
+                                                                          'plan_start': len(executed),
+                                                                          'updates_received': updates_received}))
+                        plan.push_front(subgoals)
+
+                elif node.kind == NodeType.ACTION:
+                    state = self.execute_action(node, state)
+                    if executed is not None:
+                        executed.append(node)
+                    if compiled_goals is not None:
+                        compiled_goals.update(state, node.action.written_keys())
+                    if applicability_cache is not None:
+                        applicability_cache.invalidate(node.action.written_keys())
+                    updates = yield node
+                    if updates:
+                        state = self.apply_state_updates(state, updates, compiled_goals, applicability_cache)
+                        updates_received += 1
+
+                elif node.kind == NodeType.JOIN and 'cache_key' in node:
+                    # A decomposition during which the state was changed externally is not cached.
+                    if node['updates_received'] == updates_received:
+                        actions = [action_node.action for action_node in executed[node['plan_start']:]]
+                        self.decomposition_cache.store(node['cache_key'], actions)
+
+                if yield_expansions and node.kind != NodeType.ACTION:
+                    updates = yield None
+                    if updates:
+                        state = self.apply_state_updates(state, updates, compiled_goals, applicability_cache)
+                        updates_received += 1
+
+                self.apply_critics(plan)
+        finally:
+            self.finish_state(state, initial_state)
+
+    async def aplan(self, goals, state, timeout=None):
+        """
+        Plans like `plan` from asyncio code without blocking the event loop. Requests are planned cooperatively on
+        the loop, yielding to it regularly, and at most 8 run at once unless configure_async says otherwise.
+        :param goals: The goals to plan for.
+        :param state: The initial state, updated in place; a request cancelled or timed out leaves it partially
+                      planned.
+        :param timeout: Optional number of seconds after which asyncio.TimeoutError is raised.
+        :return: The list of executed action nodes.
+        """
+        if self.async_planner is None:
+            self.async_planner = AsyncPlanner(self)
+        return await self.async_planner.aplan(goals, state, timeout=timeout)
+
+    def configure_async(self, max_concurrency=8, yield_every=16, executor=None):
+        """
+        Sets the concurrency limit and planning mode of `aplan`; see async_planning.AsyncPlanner.
+        :return: The AsyncPlanner.
+        """
+        self.async_planner = AsyncPlanner(self, max_concurrency=max_concurrency, yield_every=yield_every,
+                                          executor=executor)
+        return self.async_planner
+
+    def apply_state_updates(self, state, updates, compiled_goals=None, applicability_cache=None):
+        """
+        Writes externally observed values into the planning state.
+        :param updates: A dictionary mapping fluents or (structure, item) pairs to their values.
+        :param compiled_goals: Optional CompiledGoals of the run, updated for the keys written.
+        :param applicability_cache: Optional ApplicabilityCache of the run, invalidated for the keys written.
+        :return: The state.
+        """
+        for key, value in updates.items():
+            write_state_value(state, key, value)
+        if compiled_goals is not None:
+            compiled_goals.update(state, updates.keys())
+        if applicability_cache is not None:
+            applicability_cache.invalidate(updates.keys())
+        return state
+
+    def plan_backtracking(self, goals, state):
+        """
+        Depth-first planning that backtracks over the methods of a goal when a branch dead-ends.
+        Each expanded goal leaves a choice point over `self.methods[goal]`. State changes are undone
+        through an undo log recorded from the executed actions instead of copying the state, and the
+        agenda is a linked stack of (node, rest) pairs so a choice point can keep its agenda for free.
+        Critics are not applied in this mode. `nodes_expanded` counts the nodes taken off the agenda and
+        `backtracks` the dead ends (inapplicable actions or exhausted goals); both are reset on every call.
+        """
+        self.nodes_expanded = 0
+        self.backtracks = 0
+        initial_state = state
+        state = self.prepare_state(state)
+
+        agenda = None
+        for goal in reversed(goals):
+            agenda = (self.create_goal_node(goal), agenda)
+        # The agenda is a linked stack, so its length is tracked alongside it for the instrumentation.
+        agenda_length = len(goals)
+
+        compiled_goals = self.compile_goals(goals, state)
         final_plan = []
+        undo_log = []
+        choice_points = []
 
-        while plan:
-            node = plan.pop(0)
+        instrumentation = self.instrumentation
 
-            if self.is_goal_satisfied(goals, state):
-                break
+        while agenda is not None and not self.goals_satisfied(goals, state, compiled_goals):
+            node, agenda = agenda
+            agenda_length -= 1
+            self.nodes_expanded += 1
+            if instrumentation is not None:
+                instrumentation.node_popped(node, agenda_length)
 
-            if node['type'] == NodeType.GOAL:
-                subgoals = self.decompose_goal(node, state)
-                if subgoals:
-                    plan = subgoals + plan
+            if node.kind == NodeType.GOAL:
+                choice_points.append([node, agenda, 0, len(undo_log), len(final_plan), agenda_length])
+                agenda, agenda_length = self._next_choice(choice_points, undo_log, final_plan, state,
+                                                          compiled_goals)
+
+            elif node.kind == NodeType.ACTION:
+                action = node.action
+                if self.is_action_applicable(action, state):
+                    undo_log.append((action, self.record_undo(action, state)))
+                    state = self.execute_action(node, state)
+                    final_plan.append(node)
+                    if compiled_goals is not None:
+                        compiled_goals.update(state, action.written_keys())
                 else:
-                    raise ValueError(f"No method or action found to decompose goal: {node['goal']}")
+                    self.backtracks += 1
+                    agenda, agenda_length = self._next_choice(choice_points, undo_log, final_plan, state,
+                                                              compiled_goals)
 
-            elif node['type'] == NodeType.ACTION:
-                state = self.execute_action(node, state)
-                final_plan.append(node)
+        self.finish_state(state, initial_state)
+        return final_plan
 
-            self.apply_critics(plan)
+    def _next_choice(self, choice_points, undo_log, final_plan, state, compiled_goals):
+        # Resumes the most recent choice point that still has an untried decomposition, undoing every
+        # action executed since it was created, and returns the agenda to continue from and its length.
+        while choice_points:
+            choice_point = choice_points[-1]
+            goal_node, agenda, method_index, undo_length, plan_length, agenda_length = choice_point
 
-        return final_plan
+            while len(undo_log) > undo_length:
+                action, record = undo_log.pop()
+                self.undo_action(action, state, record)
+                if compiled_goals is not None:
+                    compiled_goals.update(state, action.written_keys())
+            del final_plan[plan_length:]
 
-    def decompose_goal(self, goal_node, state):
-        if goal_node['goal'] in self.actions:
-            action = self.actions[goal_node['goal']]
-            return [{'type': NodeType.ACTION, 'action': action}]
+            expansion = self.expand_choice(goal_node, method_index, state)
+            if expansion is not None:
+                choice_point[2], subgoals = expansion
+                for subgoal in reversed(subgoals):
+                    agenda = (subgoal, agenda)
+                return agenda, agenda_length + len(subgoals)
 
-        methods = self.methods.get(goal_node['goal'], [])
-        subgoals = []
+            choice_points.pop()
+            self.backtracks += 1
 
-        for method in methods:
-            if method.is_applicable(state):
-                subgoals.extend(method.decompose(goal_node['goal'], state))
-                break
+        raise ValueError("No plan found: every decomposition of the goals dead-ends.")
+
+    def expand_choice(self, goal_node, method_index, state):
+        # Decomposes a goal of the backtracking planner with its first applicable decomposition from position
+        # `method_index` on. Returns the position to resume from when backtracking and the subgoals, or None.
+        goal = goal_node.goal
+        if goal in self.actions:
+            return (1, [PlanNode.action_node(self.actions[goal])]) if method_index == 0 else None
+
+        if self.method_index is not None:
+            dispatch = self.method_index.dispatch(goal)
+            methods, positions = dispatch.methods, dispatch.candidates(state)
+        else:
+            methods = self.methods.get(goal, [])
+            positions = range(len(methods))
+        for index in positions:
+            method = methods[index]
+            if index < method_index or not method.is_applicable(state):
+                continue
+
+            subgoals = self.as_plan_nodes(method.decompose(goal, state))
+            if subgoals:
+                return index + 1, subgoals
+        return None
+
+    def enable_instrumentation(self, trace=False):
+        """
+        Starts timing the planner's hot calls and its critics and counting the nodes taken off the agenda.
+        Instrumentation wraps methods on the planner and critic instances; disable it before pickling the
+        planner (plan_many, plan_orderings).
+        :param trace: Whether to keep a trace event per timed call, for Instrumentation.write_chrome_trace.
+        :return: The Instrumentation collecting the results.
+        """
+        self.disable_instrumentation()
+        self.instrumentation = Instrumentation(trace=trace)
+        self.instrumentation.install(self)
+        return self.instrumentation
+
+    def disable_instrumentation(self):
+        """
+        Removes the instrumentation wrappers.
+        :return: The Instrumentation that was installed, holding the results, or None.
+        """
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.uninstall()
+            self.instrumentation = None
+        return instrumentation
 
+    def plan_orderings(self, goals, state, max_orderings=64, workers=None, strategy="best",
+                       max_linearisations=24, seed=None):
+        """
+        Plans with many linearisations of the unordered and partially ordered methods, evaluated concurrently on
+        a process pool, and returns the plan with the smallest summed duration ("best") or the first valid one
+        ("first"). See order_search.explore_orderings for the parameters.
+        """
+        return explore_orderings(self, goals, state, max_orderings=max_orderings, workers=workers,
+                                 strategy=strategy, max_linearisations=max_linearisations, seed=seed)
+
+    def plan_best_first(self, goals, state, heuristic=None, max_expansions=None, deadline=None, copy_state=None,
+                        until_satisfied=True):
+        """
+        Searches the decompositions best-first on summed action duration plus a lower-bound heuristic, stopping
+        at an expansion budget or a time.monotonic() deadline with the best plan found so far, and returns a
+        SearchResult. The caller's state is not modified. See best_first.best_first_search for the parameters.
+        """
+        options = {'copy_state': copy_state} if copy_state is not None else {}
+        return best_first_search(self, goals, state, heuristic=heuristic, max_expansions=max_expansions,
+                                 deadline=deadline, until_satisfied=until_satisfied, **options)
+
+    def plan_many(self, problems, workers=None, ordered=False, chunk_size=16):
+        """
+        Plans many independent (goals, state) problems on a process pool, shipping the domain to each worker once,
+        and yields a PlanResult per problem as results come back. See batch_planning.plan_many.
+        """
+        return plan_many(self, problems, workers=workers, ordered=ordered, chunk_size=chunk_size)
+
+    def repair_plan(self, goals, plan, tree, executed, state, delta, copy_state=None):
+        """
+        Mends a plan whose execution diverged from the expected states by decomposing again the lowest task of the
+        DecompositionTree that makes the remaining actions executable, and returns a RepairResult. See
+        plan_repair.repair_plan for the parameters.
+        """
+        options = {'copy_state': copy_state} if copy_state is not None else {}
+        return repair_plan(self, goals, plan, tree, executed, state, delta, **options)
+
+    def prune_domain(self, state, goals=None):
+        """
+        Removes the methods and tasks that static reachability analysis proves can never succeed from the given
+        initial state, and with goals the tasks they cannot reach. See reachability.analyze_domain.
+        :param state: The initial state.
+        :param goals: Optional goals the domain is pruned for; the pruned domain may then miss tasks other goals need.
+        :return: The PruningReport listing what was removed.
+        """
+        self.methods, report = analyze_domain(self.methods, self.actions, state, goals)
+        if self.decomposition_cache is not None:
+            # The relevant keys of the cached tasks were computed from the methods removed.
+            self.decomposition_cache.clear()
+        if self.method_index is not None:
+            self.method_index = MethodIndex(self.methods)
+        return report
+
+    def decomposition_cache_key(self, goal, state):
+        # Only compound tasks are cached, and not while exploring orderings, which picks decompositions itself.
+        if self.decomposition_cache is None or self.ordering_choices is not None or goal in self.actions:
+            return None
+        return self.decomposition_cache.key_for(goal, state, self.methods, self.actions)
+
+    def compile_goals(self, goals, state):
+        # Goals are compiled once per planning call when a goal compiler is supplied; otherwise the
+        # user's is_goal_satisfied callable is used on every check.
+        if self.goal_compiler is None:
+            return None
+
+        compiled_goals = CompiledGoals.compile(goals, self.goal_compiler)
+        compiled_goals.reset(state)
+        return compiled_goals
+
+    def goals_satisfied(self, goals, state, compiled_goals=None):
+        if compiled_goals is not None:
+            return compiled_goals.is_satisfied()
+        return self.is_goal_satisfied(goals, state)
+
+    def decompose_goal(self, goal_node, state, tree=None, applicability_cache=None):
+        # Per-run state is passed in rather than kept on the planner, so interleaved iter_plan generators on the
+        # same planner stay independent: `tree` is the DecompositionTree of the run, if it records one, and
+        # `applicability_cache` the ApplicabilityCache of the run with indexed methods.
+        goal = goal_node.goal
+        if goal in self.actions:
+            action = self.actions[goal]
+            subgoals = [PlanNode.action_node(action)]
+            if tree is not None:
+                tree.record(goal_node, None, subgoals)
+            return subgoals
+
+        method = self.select_method(goal, state, applicability_cache)
+        if method is None:
+            return []
+
+        if self.ordering_choices is not None:
+            subgoals = self.as_plan_nodes(self.ordering_choices.decompose(method, goal, state))
+        else:
+            subgoals = self.as_plan_nodes(method.decompose(goal, state))
+        if tree is not None:
+            tree.record(goal_node, method, subgoals)
         return subgoals
 
+    def select_method(self, goal, state, applicability_cache=None):
+        # The first applicable method of a task, which the planner commits to.
+        if applicability_cache is not None:
+            return applicability_cache.select(goal, state)
+        for method in self.candidate_methods(goal, state):
+            if method.is_applicable(state):
+                return method
+        return None
+
+    def candidate_methods(self, goal, state):
+        # The methods of a task that may be applicable in the state, in order; their conditions still have to be
+        # checked. With indexed methods, the decision index leaves out those requiring another value of its key.
+        if self.method_index is None:
+            return self.methods.get(goal, [])
+        dispatch = self.method_index.dispatch(goal)
+        return [dispatch.methods[position] for position in dispatch.candidates(state)]
+
+    @staticmethod
+    def as_plan_nodes(nodes):
+        # Methods may still return dictionary nodes; they are converted to PlanNodes here.
+        return [node if type(node) is PlanNode else PlanNode.from_node(node) for node in nodes]
+
     def execute_action(self, action_node, state):
-        action = action_node.get('action')
+        action = action_node.action if type(action_node) is PlanNode else action_node.get('action')
         if action is None:
             raise ValueError("No action found in the node. Cannot execute None.")
+        if self.compiled_domain is not None:
+            return self.compiled_domain.apply(action, state)
         return action.apply(state)
 
+    def is_action_applicable(self, action, state):
+        if self.compiled_domain is not None:
+            return self.compiled_domain.is_applicable(action, state)
+        return action.is_applicable(state)
+
+    def record_undo(self, action, state):
+        if self.compiled_domain is not None:
+            return self.compiled_domain.record_undo(action, state)
+        return action.record_undo(state)
+
+    def undo_action(self, action, state, record):
+        if self.compiled_domain is not None:
+            return self.compiled_domain.undo(action, state, record)
+        return action.undo(state, record)
+
+    def applicable_actions(self, state):
+        # Both modes test the registered actions and the actions used as method subtasks, in the same order. In
+        # compiled mode every action is tested in one vectorised comparison against the precondition matrix.
+        if self.compiled_domain is not None:
+            return self.compiled_domain.applicable_actions(state)
+        return [action for action in domain_actions(self.methods, self.actions) if action.is_applicable(state)]
+
+    def prepare_state(self, state):
+        # In compiled mode the planner works on a vector copy of the state, see finish_state.
+        if self.compiled_domain is not None:
+            return self.compiled_domain.compile_state(state)
+        return state
+
+    def finish_state(self, state, initial_state):
+        # Actions modify the caller's state in place; in compiled mode the final vector is copied back into it.
+        if self.compiled_domain is not None:
+            self.compiled_domain.write_back(state, initial_state)
+        return initial_state
+
     def handle_split(self, node, state):
         split_goals = node['subgoals']
-        return [{'type': NodeType.GOAL, 'goal': subgoal} for subgoal in split_goals]
+        return [PlanNode.goal_node(subgoal) for subgoal in split_goals]
 
     def handle_join(self, node, plan):
         return plan
 
     def apply_critics(self, plan):
+        # Incremental critics only see the nodes inserted into and removed from the agenda since the last pass.
+        # Other critics analyze the whole agenda, which is replaced by the plan they return.
+        if not self.critics:
+            return plan
+
+        inserted, removed = plan.take_changes()
+        for critic in self.critics:
+            if getattr(critic, 'incremental', False):
+                critic.nodes_removed(removed)
+
         for critic in self.critics:
-            plan = critic.analyze(plan)
+            if not getattr(critic, 'incremental', False):
+                plan.replace(critic.analyze(list(plan)))
+                continue
+
+            discarded = critic.nodes_inserted(inserted, plan)
+            if discarded:
+                for node in discarded:
+                    plan.discard(node)
+                for other in self.critics:
+                    if other is not critic and getattr(other, 'incremental', False):
+                        other.nodes_removed(discarded)
+
+                discarded_ids = {id(node) for node in discarded}
+                inserted = [node for node in inserted if id(node) not in discarded_ids]
+
         return plan
 
     def create_goal_node(self, goal):
-        return {'type': NodeType.GOAL, 'goal': goal}
+        return PlanNode.goal_node(goal)
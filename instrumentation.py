@@ -0,0 +1,142 @@
+# This file defines the instrumentation of the HTN planner: counters of the nodes taken off the agenda per
+# NodeType, timers of the hot planner calls and of every critic, the maximum agenda length, and optionally a
+# trace of every timed call. Instrumentation is installed by wrapping the planner's and critics' methods on the
+# instances (see HTNPlanner.enable_instrumentation), so when it is disabled the planner runs its plain methods
+# and only pays for a None check per node. Results export as a dictionary, as JSON, or as a Chrome trace-event
+# file that chrome://tracing and Perfetto display as a flame view.
+import json
+import os
+import threading
+from time import perf_counter
+
+from lifted import parse_task
+from plan_node import NodeType
+
+NODE_TYPE_NAMES = {value: name for name, value in vars(NodeType).items() if not name.startswith('_')}
+
+# Planner methods timed when instrumentation is enabled.
+PLANNER_TIMERS = ('decompose_goal', 'expand_choice', 'execute_action', 'apply_critics', 'goals_satisfied')
+
+# Critic methods timed when instrumentation is enabled, under 'critic:<class name>.<method>'.
+CRITIC_TIMERS = ('analyze', 'nodes_inserted', 'nodes_removed')
+
+
+def _task_head(args):
+    # decompose_goal(goal_node, ...) and expand_choice(goal_node, ...), the backtracking planner's decomposition:
+    # timings are also grouped by task head, e.g. 'ON' for 'ON(A, B)'.
+    parsed = parse_task(args[0].goal)
+    return parsed[0] if parsed is not None else str(args[0].goal)
+
+
+class Instrumentation:
+    def __init__(self, trace=False, max_events=1000000):
+        """
+        Collects the counters and timers of planning runs.
+        :param trace: Whether to keep a trace event for every timed call, for `write_chrome_trace`.
+        :param max_events: Maximum number of trace events kept; later calls are still timed but not traced.
+        """
+        self.trace = trace
+        self.max_events = max_events
+        self._installed = []
+        self.reset()
+
+    def reset(self):
+        self.node_counts = {name: 0 for name in NODE_TYPE_NAMES.values()}
+        self.timers = {}
+        self.max_agenda_length = 0
+        self.events = []
+        self._origin = perf_counter()
+
+    def node_popped(self, node, agenda_length=None):
+        """
+        Counts a node taken off the agenda; `agenda_length` is the number of nodes left, when known.
+        """
+        self.node_counts[NODE_TYPE_NAMES.get(node.kind, str(node.kind))] += 1
+        if agenda_length is not None and agenda_length > self.max_agenda_length:
+            self.max_agenda_length = agenda_length
+
+    def record(self, name, start, end):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0.0]
+        timer[0] += 1
+        timer[1] += end - start
+
+        if self.trace and len(self.events) < self.max_events:
+            self.events.append({'name': name, 'ph': 'X', 'ts': (start - self._origin) * 1e6,
+                                'dur': (end - start) * 1e6, 'pid': os.getpid(), 'tid': threading.get_ident()})
+
+    def wrap(self, name, function, group=None):
+        """
+        Times every call of `function` under `name`.
+        :param group: Optional callable mapping the call's positional arguments to a sub-name; the call is then
+                      also accounted under 'name:sub-name'.
+        :return: The timed function.
+        """
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                self.record(name, start, end)
+                if group is not None:
+                    self.record(f"{name}:{group(args)}", start, end)
+        return timed
+
+    def install(self, planner):
+        """
+        Wraps the planner's hot methods and its critics' methods on the instances.
+        """
+        for attribute in PLANNER_TIMERS:
+            group = _task_head if attribute in ('decompose_goal', 'expand_choice') else None
+            self._set(planner, attribute, self.wrap(attribute, getattr(planner, attribute), group))
+
+        for critic in planner.critics:
+            for attribute in CRITIC_TIMERS:
+                if hasattr(critic, attribute):
+                    name = f"critic:{type(critic).__name__}.{attribute}"
+                    self._set(critic, attribute, self.wrap(name, getattr(critic, attribute)))
+
+    def uninstall(self):
+        """
+        Removes the wrappers installed by `install`, restoring the plain methods.
+        """
+        for obj, attribute in reversed(self._installed):
+            obj.__dict__.pop(attribute, None)
+        self._installed = []
+
+    def _set(self, obj, attribute, wrapper):
+        setattr(obj, attribute, wrapper)
+        self._installed.append((obj, attribute))
+
+    def to_dict(self):
+        return {
+            'node_counts': dict(self.node_counts),
+            'nodes_expanded': sum(self.node_counts.values()),
+            'max_agenda_length': self.max_agenda_length,
+            'timers': {name: {'calls': calls, 'total_seconds': total, 'mean_seconds': total / calls if calls else 0.0}
+                       for name, (calls, total) in sorted(self.timers.items())},
+        }
+
+    def to_json(self, path=None, indent=2):
+        """
+        :param path: Optional file to write the JSON to.
+        :return: The JSON text.
+        """
+        text = json.dumps(self.to_dict(), indent=indent)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def write_chrome_trace(self, path):
+        """
+        Writes the traced calls in the Chrome trace-event format. Requires `trace=True`.
+        """
+        if not self.trace:
+            raise ValueError("Tracing is disabled; enable instrumentation with trace=True.")
+
+        counters = {'name': 'nodes', 'ph': 'C', 'ts': 0, 'pid': os.getpid(), 'args': dict(self.node_counts)}
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': self.events + [counters], 'displayTimeUnit': 'ms'}, file)
@@ -0,0 +1,172 @@
+# This file defines lifted (parameterised) tasks and operators. Instead of grounding a method or an action for
+# every combination of objects up front, a domain registers one schema per pattern such as 'ON(?x, ?y)'.
+# Task names like 'ON(A, B)' are unified with the patterns the first time the planner looks them up, and the
+# ground instances built from the bindings are cached, so only the tasks a problem actually reaches are ever
+# materialised. MethodLibrary and OperatorLibrary are read-only mappings and stand in for the planner's
+# `methods` and `actions` dictionaries.
+from collections.abc import Mapping
+
+_NO_MATCH = object()
+
+
+def parse_task(task):
+    """
+    Splits a task name written as 'HEAD(arg1, arg2, ...)' into its head and arguments.
+    :param task: The task name.
+    :return: A (head, args) pair, or None if the name is not of this form. A bare 'HEAD' has no arguments.
+    """
+    if not isinstance(task, str):
+        return None
+    if not task.endswith(')'):
+        return (task, ()) if '(' not in task else None
+
+    head, _, rest = task[:-1].partition('(')
+    if not head:
+        return None
+    args = tuple(arg.strip() for arg in rest.split(',')) if rest.strip() else ()
+    return head, args
+
+
+class TaskPattern:
+    def __init__(self, pattern):
+        """
+        A task pattern such as 'ON(?x, ?y)'. Arguments starting with '?' are variables; the others are
+        constants that must match literally. A variable used twice must be bound to the same object.
+        :param pattern: The pattern string.
+        """
+        parsed = parse_task(pattern)
+        if parsed is None:
+            raise ValueError(f"Malformed task pattern: {pattern}")
+
+        self.pattern = pattern
+        self.head, self.args = parsed
+        self.variables = tuple(dict.fromkeys(arg for arg in self.args if arg.startswith('?')))
+
+    def match(self, head, args):
+        """
+        Unifies the pattern with a parsed ground task.
+        :return: The objects bound to the variables, in the order of `self.variables`, or None if they do not unify.
+        """
+        if head != self.head or len(args) != len(self.args):
+            return None
+
+        bindings = {}
+        for pattern_arg, arg in zip(self.args, args):
+            if pattern_arg.startswith('?'):
+                if bindings.setdefault(pattern_arg, arg) != arg:
+                    return None
+            elif pattern_arg != arg:
+                return None
+        return tuple(bindings[variable] for variable in self.variables)
+
+    def __repr__(self):
+        return f"TaskPattern({self.pattern!r})"
+
+
+class _LiftedLibrary(Mapping):
+    def __init__(self, ground=None):
+        """
+        :param ground: Optional dictionary of ground entries, looked up before the schemas.
+        """
+        self._ground = dict(ground) if ground is not None else {}
+        self._schemas = {}
+        self._instances = {}
+
+    def add(self, pattern, factory):
+        """
+        Registers a schema.
+        :param pattern: A task pattern such as 'ON(?x, ?y)'.
+        :param factory: A callable building the ground instance from the objects bound to the pattern's
+                        variables, passed positionally in the order they first appear (e.g. PutOnMethod).
+                        It may return None when the bindings do not form a valid instance (e.g. 'ON(A, A)').
+                        Use module-level callables so the library can be pickled for worker processes.
+        :return: The library, so that schemas can be chained.
+        """
+        task_pattern = TaskPattern(pattern)
+        self._schemas.setdefault((task_pattern.head, len(task_pattern.args)), []).append((task_pattern, factory))
+        return self
+
+    def _instantiate(self, task):
+        parsed = parse_task(task)
+        if parsed is None:
+            return _NO_MATCH
+
+        head, args = parsed
+        matches = []
+        for task_pattern, factory in self._schemas.get((head, len(args)), ()):
+            bindings = task_pattern.match(head, args)
+            if bindings is not None:
+                matches.append((factory, bindings))
+        return self._build(matches)
+
+    def _build(self, matches):
+        raise NotImplementedError
+
+    def __getitem__(self, task):
+        if task in self._ground:
+            return self._ground[task]
+
+        if task not in self._instances:
+            # Names that match no schema are remembered too, so repeated misses do not parse them again.
+            self._instances[task] = self._instantiate(task)
+        instance = self._instances[task]
+        if instance is _NO_MATCH:
+            raise KeyError(task)
+        return instance
+
+    def __contains__(self, task):
+        try:
+            self[task]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        """
+        Iterates over the ground entries and the instances created so far; tasks that were never looked up
+        are not enumerated.
+        """
+        yield from self._ground
+        for task, instance in self._instances.items():
+            if instance is not _NO_MATCH and task not in self._ground:
+                yield task
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __getstate__(self):
+        # The miss marker is a module-level sentinel that does not survive pickling, so misses are not shipped.
+        state = self.__dict__.copy()
+        state['_instances'] = {task: instance for task, instance in self._instances.items()
+                               if instance is not _NO_MATCH}
+        return state
+
+    def clear_instances(self):
+        """
+        Drops the cached ground instances; they are rebuilt on the next lookup.
+        """
+        self._instances.clear()
+
+
+class MethodLibrary(_LiftedLibrary):
+    """
+    Maps each task name to the list of its methods. Every schema whose pattern unifies with the task contributes
+    one method, in registration order, which is the order the planner tries them in.
+    """
+
+    def _build(self, matches):
+        methods = [method for method in (factory(*bindings) for factory, bindings in matches) if method is not None]
+        return methods if methods else _NO_MATCH
+
+
+class OperatorLibrary(_LiftedLibrary):
+    """
+    Maps each primitive task name to its action, built by the first schema whose pattern unifies with the task.
+    """
+
+    def _build(self, matches):
+        for factory, bindings in matches:
+            action = factory(*bindings)
+            if action is not None:
+                return action
+        return _NO_MATCH
@@ -1,54 +1,138 @@
 import argparse
+from functools import partial
 
-from htn_planner import HTNPlanner, NodeType
+from htn_planner import HTNPlanner
 from critics import ResolveConflictsCritic, EliminateRedundantPreconditionsCritic, UseExistingObjectsCritic
 from method import Method
 from action import Action
+from goals import GoalPredicate
+from lifted import MethodLibrary
 from ordering_type import OrderingType
+from persistent import PersistentMap, PersistentSet
+from plan_node import PlanNode
 from utils import print_executed_actions
 
 
+# The block-world state is a dictionary holding two persistent structures: 'ON', a PersistentMap from each
+# block to the block it sits on, and 'CLEAR', a PersistentSet of the clear blocks. Effects replace these
+# structures with updated versions instead of mutating them, so a successor state (see block_successor)
+# only costs the few trie nodes that changed and shares everything else with its parent.
+def make_block_state(clear, on):
+    """
+    Builds a block-world state.
+    :param clear: The clear blocks.
+    :param on: A dictionary mapping each block to the block it sits on.
+    :return: The state.
+    """
+    return {'CLEAR': PersistentSet(clear), 'ON': PersistentMap(on)}
+
+
+def block_successor(state, action):
+    """
+    Applies an action to a shallow copy of the state; the parent state is left untouched.
+    :return: The successor state.
+    """
+    return action.apply(dict(state))
+
+
+# Preconditions and effects are module-level functions bound with functools.partial rather than lambdas,
+# so that actions and methods can be pickled and shipped to worker processes.
+def is_clear(obj, state):
+    return obj in state['CLEAR']
+
+
+def is_on(obj, obj_under, state):
+    return state['ON'].get(obj) == obj_under
+
+
+def _persistent_on(state):
+    # States built by hand may hold a plain dictionary; it is converted on the first write, as effects replace the
+    # structure with an updated persistent version instead of mutating it.
+    on = state['ON']
+    if isinstance(on, PersistentMap):
+        return on
+    if not isinstance(on, dict):
+        raise TypeError(f"state['ON'] must be a PersistentMap or a dictionary, not {type(on).__name__}")
+    return PersistentMap(on)
+
+
+def _persistent_clear(state):
+    # As _persistent_on, for a plain list or set of clear blocks.
+    clear = state['CLEAR']
+    if isinstance(clear, PersistentSet):
+        return clear
+    if not isinstance(clear, (list, tuple, set, frozenset)):
+        raise TypeError(f"state['CLEAR'] must be a PersistentSet or a collection of blocks, "
+                        f"not {type(clear).__name__}")
+    return PersistentSet(clear)
+
+
+def set_on(obj, obj_under, state):
+    state['ON'] = _persistent_on(state).set(obj, obj_under)
+
+
+def remove_on(obj, state):
+    state['ON'] = _persistent_on(state).delete(obj)
+
+
+def add_clear(obj, state):
+    state['CLEAR'] = _persistent_clear(state).add(obj)
+
+
+def remove_clear(obj, state):
+    state['CLEAR'] = _persistent_clear(state).remove(obj)
+
+
 class PutOnMethod(Method):
     def __init__(self, obj1, obj2):
         task_name = f'ON({obj1}, {obj2})'
         self.obj1 = obj1
         self.obj2 = obj2
 
-        condition = lambda state: self.is_applicable(state)
+        condition = self.is_applicable
 
         super().__init__(task_name, [], condition, ordering=OrderingType.ORDERED)
 
     def is_applicable(self, state):
         return self.obj2 in state['CLEAR']
 
+    def read_keys(self):
+        return [('CLEAR', self.obj1), ('CLEAR', self.obj2), ('ON', self.obj1)]
+
     def decompose(self, goal, state):
         subtasks = []
         if self.obj1 not in state['CLEAR']:
-            subtasks.append({'type': NodeType.ACTION, 'action': ClearAction(self.obj1, state['ON'][self.obj1])})
+            subtasks.append(PlanNode.action_node(ClearAction(self.obj1, state['ON'][self.obj1])))
 
-        subtasks.append({'type': NodeType.ACTION, 'action': PutOnAction(self.obj1, self.obj2)})
+        subtasks.append(PlanNode.action_node(PutOnAction(self.obj1, self.obj2)))
 
         return subtasks
 
 
 class ClearMethod(Method):
-    def __init__(self, obj, obj_under):
+    def __init__(self, obj):
         task_name = f'CLEAR({obj})'
         self.obj = obj
-        self.obj_under = obj_under
 
-        condition = lambda state: self.is_applicable(state)
+        condition = self.is_applicable
 
-        subtasks = [{'type': NodeType.ACTION, 'action': ClearAction(self.obj, self.obj_under)}]
-        super().__init__(task_name, subtasks, condition, ordering=OrderingType.ORDERED)
+        super().__init__(task_name, [], condition, ordering=OrderingType.ORDERED)
 
     def is_applicable(self, state):
-        return state['ON'].get(self.obj) == self.obj_under
+        return self.obj in state['ON']
+
+    def read_keys(self):
+        return [('ON', self.obj), ('CLEAR', self.obj)]
+
+    def decompose(self, goal, state):
+        return [PlanNode.action_node(ClearAction(self.obj, state['ON'][self.obj]))]
 
 
 class PutOnAction(Action):
     def __init__(self, obj1, obj2):
         name = f'PUTON({obj1}, {obj2})'
+        self.obj1 = obj1
+        self.obj2 = obj2
         preconditions = self.define_preconditions(obj1, obj2)
         effects = self.define_effects(obj1, obj2)
 
@@ -56,26 +140,42 @@ class PutOnAction(Action):
 
     def define_preconditions(self, obj1, obj2):
         return [
-            lambda state: obj1 in state['CLEAR'],
-            lambda state: obj2 in state['CLEAR']
+            partial(is_clear, obj1),
+            partial(is_clear, obj2)
         ]
 
     def define_effects(self, obj1, obj2):
         return [
-            lambda state: state['ON'].update({obj1: obj2}),
-            lambda state: state['CLEAR'].remove(obj1)
+            partial(set_on, obj1, obj2),
+            partial(remove_clear, obj1)
         ]
 
+    def read_keys(self):
+        return [('CLEAR', self.obj1), ('CLEAR', self.obj2), ('ON', self.obj1)]
+
+    def written_keys(self):
+        return [('ON', self.obj1), ('CLEAR', self.obj1)]
+
+    def is_applicable(self, state):
+        return all(precondition(state) for precondition in self.preconditions)
+
     def apply(self, state):
-        for precondition in self.preconditions:
-            if not precondition(state):
-                raise ValueError(f"Cannot put {self.obj1} on {self.obj2}: preconditions not met.")
+        if not self.is_applicable(state):
+            raise ValueError(f"Cannot put {self.obj1} on {self.obj2}: preconditions not met.")
 
         for effect in self.effects:
             effect(state)
 
         return state
 
+    def record_undo(self, state):
+        return state['ON'], state['CLEAR']
+
+    def undo(self, state, record):
+        state['ON'], state['CLEAR'] = record
+
+        return state
+
 
 class ClearAction(Action):
     def __init__(self, obj, obj_under):
@@ -88,25 +188,72 @@ class ClearAction(Action):
 
     def define_preconditions(self):
         return [
-            lambda state: state['ON'].get(self.obj) == self.obj_under
+            partial(is_on, self.obj, self.obj_under)
         ]
 
     def define_effects(self):
         return [
-            lambda state: state['CLEAR'].append(self.obj),
-            lambda state: state['ON'].pop(self.obj)
+            partial(add_clear, self.obj),
+            partial(remove_on, self.obj)
         ]
 
+    def read_keys(self):
+        return [('ON', self.obj), ('CLEAR', self.obj)]
+
+    def written_keys(self):
+        return [('ON', self.obj), ('CLEAR', self.obj)]
+
+    def is_applicable(self, state):
+        return all(precondition(state) for precondition in self.preconditions)
+
     def apply(self, state):
-        for precondition in self.preconditions:
-            if not precondition(state):
-                raise ValueError(f"Cannot clear {self.obj} from {self.obj_under}: preconditions not met.")
+        if not self.is_applicable(state):
+            raise ValueError(f"Cannot clear {self.obj} from {self.obj_under}: preconditions not met.")
 
         for effect in self.effects:
             effect(state)
 
         return state
 
+    def record_undo(self, state):
+        return state['ON'], state['CLEAR']
+
+    def undo(self, state, record):
+        state['ON'], state['CLEAR'] = record
+
+        return state
+
+
+class OnGoal(GoalPredicate):
+    def __init__(self, obj1, obj2):
+        super().__init__([('ON', obj1)])
+        self.obj1 = obj1
+        self.obj2 = obj2
+
+    def holds(self, state):
+        return state['ON'].get(self.obj1) == self.obj2
+
+
+def compile_block_goal(goal):
+    if goal.startswith('ON('):
+        obj1, obj2 = goal[3:-1].split(', ')
+        return OnGoal(obj1, obj2)
+
+    return None
+
+
+def put_on_method(obj1, obj2):
+    return PutOnMethod(obj1, obj2) if obj1 != obj2 else None
+
+
+def block_methods():
+    """
+    Builds the lifted blocks methods; ground methods are only created for the ON and CLEAR tasks the planner
+    reaches, instead of one per ordered pair of blocks.
+    :return: A MethodLibrary to pass to the planner as its methods.
+    """
+    return MethodLibrary().add('ON(?x, ?y)', put_on_method).add('CLEAR(?x)', ClearMethod)
+
 
 def block_stacking_is_goal_satisfied(goals, state):
     for goal in goals:
@@ -118,32 +265,39 @@ def block_stacking_is_goal_satisfied(goals, state):
     return True
 
 
-def main():
-    blocks = ['A', 'B', 'C']
-
-    methods = {}
-    for i in range(len(blocks)):
-        for j in range(len(blocks)):
-            if i != j:
-                methods[f'ON({blocks[i]}, {blocks[j]})'] = [PutOnMethod(blocks[i], blocks[j])]
-                methods[f'CLEAR({blocks[i]})'] = [ClearAction(blocks[i], blocks[j])]
-
+def main(backtracking=False, stats=False, trace=None):
+    methods = block_methods()
     actions = {}
     critics = [ResolveConflictsCritic(), EliminateRedundantPreconditionsCritic(), UseExistingObjectsCritic()]
-    planner = HTNPlanner(methods, actions, critics, block_stacking_is_goal_satisfied)
+    planner = HTNPlanner(methods, actions, critics, block_stacking_is_goal_satisfied, goal_compiler=compile_block_goal)
 
-    initial_state = {
-        'CLEAR': ['B', 'C'],
-        'ON': {'A': 'C'}  # C is on A
-    }
+    initial_state = make_block_state(
+        clear=['B', 'C'],
+        on={'A': 'C'}  # C is on A
+    )
     goals = ['ON(A, B)', 'ON(B, C)']
+    instrumentation = planner.enable_instrumentation(trace=trace is not None) if stats or trace else None
 
-    plan = planner.plan(goals, initial_state)
+    if backtracking:
+        plan = planner.plan_backtracking(goals, initial_state)
+        print(f"Nodes expanded: {planner.nodes_expanded}, backtracks: {planner.backtracks}")
+    else:
+        plan = planner.plan(goals, initial_state)
     print_executed_actions(plan)
 
+    if instrumentation is not None:
+        planner.disable_instrumentation()
+        if stats:
+            print(instrumentation.to_json())
+        if trace:
+            instrumentation.write_chrome_trace(trace)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Blocks Experiment")
+    parser.add_argument("--backtracking", action="store_true", help="Use the depth-first backtracking planner")
+    parser.add_argument("--stats", action="store_true", help="Print the planner's counters and timers as JSON")
+    parser.add_argument("--trace", default=None, help="Write a Chrome trace-event file of the planner's calls")
     args = parser.parse_args()
 
-    main()
+    main(backtracking=args.backtracking, stats=args.stats, trace=args.trace)
@@ -4,11 +4,17 @@
 # or partially ordered, depending on the nature of the task.
 
 import argparse
+from functools import partial
 
 from action import Action
+from decomposition_tree import DecompositionTree
+from domain_format import load_domain
+from goals import FluentAtLeast
 from htn_planner import HTNPlanner
 from method import Method
 from ordering_type import OrderingType
+from scheduling import schedule_plan
+from utils import print_schedule
 
 pack_tent = Action("Pack Tent", {}, {"packed_tent": 1}, duration=1)
 pack_sleeping_bag = Action("Pack Sleeping Bag", {}, {"packed_sleeping_bag": 1}, duration=1)
@@ -23,24 +29,36 @@ prepare_ingredients = Action("Prepare Ingredients", {}, {"prepared_ingredients":
 cook_on_fire = Action("Cook on Fire", {"fire": 1, "prepared_ingredients": 1}, {"cooked_food": 1}, duration=2)
 serve_food = Action("Serve Food", {"cooked_food": 1}, {"served_food": 1}, duration=1)
 
+
+def fluent_is_zero(fluent, state):
+    """
+    Method condition checking that a fluent has not been achieved yet.
+    Bound to a fluent with functools.partial, which unlike a lambda keeps the methods picklable.
+    """
+    return state.get(fluent, 0) == 0
+
+
 packing_items_method = Method(
     task_name="Pack Items",
     subtasks=[pack_tent, pack_sleeping_bag, pack_food],
-    condition=lambda state: state.get("packed_tent", 0) == 0,
+    condition=partial(fluent_is_zero, "packed_tent"),
+    reads=["packed_tent"],
     ordering=OrderingType.ORDERED
 )
 
 setting_up_campsite_method = Method(
     task_name="Set Up Campsite",
     subtasks=[pitch_tent, inflate_sleeping_bag, lay_out_ground_mat],
-    condition=lambda state: state.get("pitched_tent", 0) == 0,
+    condition=partial(fluent_is_zero, "pitched_tent"),
+    reads=["pitched_tent"],
     ordering=OrderingType.UNORDERED
 )
 
 starting_campfire_method = Method(
     task_name="Start Campfire",
     subtasks=[gather_firewood, build_firepit, light_fire],  # Subtasks as individual tasks or actions
-    condition=lambda state: state.get("fire", 0) == 0,
+    condition=partial(fluent_is_zero, "fire"),
+    reads=["fire"],
     ordering=OrderingType.PARTIALLY_ORDERED,  # Specify that the tasks are partially ordered
     dependencies=[('Gather Firewood', 'Build Firepit'), ('Build Firepit', 'Light Fire')]  # Define dependencies
 )
@@ -48,14 +66,16 @@ starting_campfire_method = Method(
 cooking_food_method = Method(
     task_name="Cook Food",
     subtasks=[prepare_ingredients, cook_on_fire, serve_food],
-    condition=lambda state: state.get("served_food", 0) == 0,
+    condition=partial(fluent_is_zero, "served_food"),
+    reads=["served_food"],
     ordering=OrderingType.ORDERED
 )
 
 prepare_for_camping_method = Method(
     task_name="Prepare for Camping",
     subtasks=["Pack Items", "Set Up Campsite", "Start Campfire", "Cook Food"],
-    condition=lambda state: state.get("served_food", 0) == 0,
+    condition=partial(fluent_is_zero, "served_food"),
+    reads=["served_food"],
     ordering=OrderingType.ORDERED
 )
 
@@ -72,10 +92,33 @@ def camping_is_goal_satisfied(goal, state):
     return False
 
 
-def main():
+# The fluent marking the completion of each camping task that can be given as a goal.
+goal_fluents = {
+    "Prepare for Camping": "served_food",
+    "Cook Food": "served_food",
+    "Start Campfire": "fire",
+}
+
+
+def compile_camping_goal(goal):
+    """
+    Goal compiler for camping: a task goal becomes a FluentAtLeast predicate on the fluent marking its completion,
+    so the planner only re-checks it after an action writes that fluent.
+    :raises ValueError: For a goal no fluent marks, which would otherwise count as satisfied from the start.
+    """
+    fluent = goal_fluents.get(goal)
+    if fluent is None:
+        raise ValueError(f"No fluent marks the completion of the goal {goal}.")
+    return FluentAtLeast(fluent)
+
+
+def main(backtracking=False, compiled=False, orderings=0, seed=None, best_first=False, max_expansions=None,
+         schedule=False, workers=None, domain=None, indexed_methods=False):
     """
     Main function to run the camping HTN planning example.
     Initializes the HTN planner, adds actions and methods, and generates a plan to achieve the state of 'served_food': 1.
+    :param domain: Optional domain file (see domain_format.py) replacing the actions and methods defined here.
+    :param indexed_methods: Whether the planner selects methods through the decision index of method_index.py.
     """
     actions = {
         "Pack Tent": pack_tent,
@@ -100,11 +143,17 @@ def main():
         "Prepare for Camping": [prepare_for_camping_method]
     }
 
+    if domain is not None:
+        actions, methods = load_domain(domain)
+
     htn_planner = HTNPlanner(
         methods=methods,
         actions=actions,
         critics=[],
-        is_goal_satisfied=camping_is_goal_satisfied
+        is_goal_satisfied=camping_is_goal_satisfied,
+        goal_compiler=compile_camping_goal,
+        compiled=compiled,
+        indexed_methods=indexed_methods
     )
 
     initial_state = {
@@ -123,16 +172,50 @@ def main():
     }
 
     goals = ["Prepare for Camping"]
-
-    plan = htn_planner.plan(goals, initial_state)
+    # The decomposition tree keeps the dependencies of the partially ordered methods for the scheduler.
+    tree = DecompositionTree() if schedule else None
+
+    if best_first:
+        result = htn_planner.plan_best_first(goals, initial_state, max_expansions=max_expansions)
+        plan = result.plan
+        print(f"Duration: {result.cost}, complete: {result.complete}, optimal: {result.optimal}, "
+              f"expansions: {result.expansions}")
+    elif orderings:
+        plan = htn_planner.plan_orderings(goals, initial_state, max_orderings=orderings, seed=seed)
+    elif backtracking:
+        plan = htn_planner.plan_backtracking(goals, initial_state)
+        print(f"Nodes expanded: {htn_planner.nodes_expanded}, backtracks: {htn_planner.backtracks}")
+    else:
+        plan = htn_planner.plan(goals, initial_state, tree=tree)
 
     print("Generated Plan:")
     for step in plan:
         print(step['action'].name)
 
+    if schedule:
+        print_schedule(schedule_plan(plan, workers=workers, tree=tree))
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Camping Experiment")
+    parser.add_argument("--backtracking", action="store_true", help="Use the depth-first backtracking planner")
+    parser.add_argument("--compiled", action="store_true", help="Plan on compiled integer state vectors")
+    parser.add_argument("--orderings", type=int, default=0,
+                        help="Explore up to this many subtask orderings in parallel and keep the shortest plan")
+    parser.add_argument("--seed", type=int, default=None, help="Seed used to sample subtask orderings")
+    parser.add_argument("--best-first", action="store_true",
+                        help="Search the decompositions best-first on summed action duration")
+    parser.add_argument("--max-expansions", type=int, default=None, help="Expansion budget of the best-first search")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Schedule the plan's independent actions in parallel and print the schedule")
+    parser.add_argument("--workers", type=int, default=None, help="Number of actions that may run at once")
+    parser.add_argument("--domain", default=None, help="Load the actions and methods from a domain file, "
+                                                       "e.g. domains/camping.json")
+    parser.add_argument("--indexed-methods", action="store_true",
+                        help="Select methods through a decision index over their fluent conditions")
     args = parser.parse_args()
 
-    main()
+    main(backtracking=args.backtracking, compiled=args.compiled, orderings=args.orderings, seed=args.seed,
+         best_first=args.best_first, max_expansions=args.max_expansions,
+         schedule=args.schedule, workers=args.workers, domain=args.domain,
+         indexed_methods=args.indexed_methods)
@@ -1,15 +1,18 @@
 # This file defines the Method class, which represents a way to decompose a high-level task
 # into subtasks. Each method includes a task name, a list of subtasks, a condition for when
 # the method is applicable, and an ordering type (ordered, unordered, or partially ordered).
+# Methods are compiled once at construction: the dependency graph is validated, the subtask order is
+# resolved and the subgoal nodes are prebuilt, so decomposing only copies the cached nodes.
 import random
 
 from action import Action
-from htn_planner import NodeType
+from conditions import FluentCondition
+from plan_node import PlanNode
 from ordering_type import OrderingType
 
 
 class Method:
-    def __init__(self, task_name, subtasks, condition, ordering, dependencies=None):
+    def __init__(self, task_name, subtasks, condition, ordering, dependencies=None, reads=None):
         """
         Initializes a method for decomposing a high-level task into subtasks.
         :param task_name: The name of the task this method applies to.
@@ -17,12 +20,27 @@ class Method:
         :param condition: A function that checks whether this method can be applied given the current state.
         :param ordering: Defines the order in which the subtasks should be executed (ordered, unordered, etc.).
         :param dependencies: For partially ordered tasks, defines dependencies (e.g., [('A', 'B')] means A before B).
+        :param reads: Optional list of the state keys the condition reads, which makes the task cacheable. Defaults
+                      to the fluents of a FluentCondition.
         """
         self.task_name = task_name
-        self.subtasks = subtasks
+        self.subtasks = tuple(subtasks)
         self.condition = condition
         self.ordering = ordering
-        self.dependencies = dependencies if dependencies is not None else []
+        self.dependencies = tuple(dependencies) if dependencies is not None else ()
+        if reads is None and isinstance(condition, FluentCondition):
+            reads = condition.fluents()
+        self.reads = tuple(reads) if reads is not None else None
+
+        if self.ordering == OrderingType.PARTIALLY_ORDERED:
+            self.ordered_subtasks = tuple(self._resolve_partial_order(self.subtasks, self.dependencies))
+        elif self.ordering in (OrderingType.ORDERED, OrderingType.UNORDERED):
+            self.ordered_subtasks = self.subtasks
+        else:
+            raise ValueError("Unknown ordering type")
+
+        self._subgoal_nodes = [self._create_node(subtask) for subtask in self.ordered_subtasks]
+        self._linearisations = {}
 
     def is_applicable(self, state):
         """
@@ -33,6 +51,13 @@ class Method:
         """
         return self.condition(state)
 
+    def read_keys(self):
+        """
+        Lists the state keys the condition and the decomposition read, not counting the subtasks themselves.
+        :return: The declared keys, or None if unknown.
+        """
+        return self.reads
+
     def decompose(self, goal, state):
         """
         Generic implementation for decomposing a task into subtasks.
@@ -40,24 +65,114 @@ class Method:
         :param state: The current state of the world.
         :return: A list of subgoals or actions to achieve the given goal.
         """
-        subgoals = []
+        if self.ordering == OrderingType.UNORDERED:
+            subgoal_nodes = random.sample(self._subgoal_nodes, len(self._subgoal_nodes))
+        else:
+            subgoal_nodes = self._subgoal_nodes
+
+        # The agenda and the critics track nodes by identity, so every decomposition gets its own copies.
+        return [node.copy() for node in subgoal_nodes]
+
+    def linearisations(self, limit=None, seed=None):
+        """
+        Enumerates the valid orders of the subtasks: all permutations for unordered methods and all topological
+        sorts of the dependencies for partially ordered ones. Results are cached per (limit, seed).
+        :param limit: Optional maximum number of orders to return.
+        :param seed: Optional seed; when given, the enumeration explores the orders in a shuffled but reproducible
+                     way, which samples the space when `limit` cuts it short.
+        :return: A list of orders, each a tuple of indices into `self.subtasks`. The first order is the one
+                 `decompose` uses for ordered and partially ordered methods.
+        """
+        key = (limit, seed)
+        if key not in self._linearisations:
+            self._linearisations[key] = self._enumerate_linearisations(limit, seed)
+        return self._linearisations[key]
 
+    def decompose_in_order(self, order):
+        """
+        Decomposes the task with the subtasks in the given order.
+        :param order: An order returned by `linearisations`.
+        :return: A list of subgoals or actions to achieve the task.
+        """
+        return [self._create_node(self.subtasks[index]) for index in order]
+
+    def _enumerate_linearisations(self, limit, seed):
+        count = len(self.subtasks)
         if self.ordering == OrderingType.ORDERED:
-            ordered_subtasks = self.subtasks
-        elif self.ordering == OrderingType.UNORDERED:
-            ordered_subtasks = random.sample(self.subtasks, len(self.subtasks))
-        elif self.ordering == OrderingType.PARTIALLY_ORDERED:
-            ordered_subtasks = self._resolve_partial_order(self.subtasks, self.dependencies)
+            return [tuple(range(count))]
+
+        predecessors = [[] for _ in range(count)]
+        if self.ordering == OrderingType.PARTIALLY_ORDERED:
+            index_by_name = {self._subtask_name(subtask): index for index, subtask in enumerate(self.subtasks)}
+            for before, after in self.dependencies:
+                predecessors[index_by_name[after]].append(index_by_name[before])
+            default_order = tuple(index_by_name[self._subtask_name(subtask)] for subtask in self.ordered_subtasks)
         else:
-            raise ValueError("Unknown ordering type")
+            default_order = tuple(range(count))
 
-        for subtask in ordered_subtasks:
-            if isinstance(subtask, Action):
-                subgoals.append({'type': NodeType.ACTION, 'action': subtask})
+        orders = [default_order]
+        rng = random.Random(seed) if seed is not None else None
+        for order in self._topological_orders(predecessors, rng):
+            if limit is not None and len(orders) >= limit:
+                break
+            if order != default_order:
+                orders.append(order)
+
+        return orders
+
+    @staticmethod
+    def _topological_orders(predecessors, rng=None):
+        """
+        Lazily generates every topological order of a graph given as predecessor lists, by iterative backtracking.
+        :param predecessors: For each node index, the indices of the nodes that must come before it.
+        :param rng: Optional random generator used to shuffle the ready nodes at each step.
+        :return: A generator of orders, each a tuple of node indices.
+        """
+        count = len(predecessors)
+        successors = [[] for _ in range(count)]
+        for index, before in enumerate(predecessors):
+            for predecessor in before:
+                successors[predecessor].append(index)
+
+        remaining = [len(before) for before in predecessors]
+        placed = [False] * count
+        order = []
+
+        def ready():
+            nodes = [index for index in range(count) if not placed[index] and remaining[index] == 0]
+            if rng is not None:
+                rng.shuffle(nodes)
+            return iter(nodes)
+
+        stack = [ready()]
+        while stack:
+            if len(order) == count:
+                yield tuple(order)
+
+            for index in stack[-1]:
+                placed[index] = True
+                order.append(index)
+                for successor in successors[index]:
+                    remaining[successor] -= 1
+                stack.append(ready())
+                break
             else:
-                subgoals.append({'type': NodeType.GOAL, 'goal': subtask})
+                stack.pop()
+                if order:
+                    index = order.pop()
+                    placed[index] = False
+                    for successor in successors[index]:
+                        remaining[successor] += 1
 
-        return subgoals
+    @staticmethod
+    def _create_node(subtask):
+        if isinstance(subtask, Action):
+            return PlanNode.action_node(subtask)
+        return PlanNode.goal_node(subtask)
+
+    @staticmethod
+    def _subtask_name(subtask):
+        return subtask.name if isinstance(subtask, Action) else subtask
 
     def _resolve_partial_order(self, subtasks, dependencies):
         """
@@ -66,10 +181,12 @@ class Method:
         :param dependencies: A list of tuples where each tuple represents a dependency (e.g., ('A', 'B') means A must happen before B).
         :return: A list of subtasks in an order that satisfies the partial ordering constraints.
         """
-        subtask_names = {subtask.name: subtask for subtask in subtasks}
+        subtask_names = {self._subtask_name(subtask): subtask for subtask in subtasks}
         dependency_graph = {task_name: [] for task_name in subtask_names.keys()}
 
         for before, after in dependencies:
+            if before not in dependency_graph or after not in dependency_graph:
+                raise ValueError(f"Dependency ({before}, {after}) of {self.task_name} refers to an unknown subtask")
             dependency_graph[after].append(before)
 
         ordered_task_names = self._topological_sort(dependency_graph)
@@ -88,18 +205,26 @@ class Method:
         temp_mark = set()
         result = []
 
-        def visit(task_name):
-            if task_name in temp_mark:
-                raise ValueError("Circular dependency detected")
-            if task_name not in visited:
-                temp_mark.add(task_name)
-                for dependency in dependency_graph[task_name]:
-                    visit(dependency)
-                temp_mark.remove(task_name)
-                visited.add(task_name)
-                result.append(task_name)
-
-        for task_name in dependency_graph:
-            visit(task_name)
+        # Iterative depth-first search, so methods with thousands of subtasks do not hit the recursion limit.
+        for root in dependency_graph:
+            if root in visited:
+                continue
+
+            temp_mark.add(root)
+            stack = [(root, iter(dependency_graph[root]))]
+            while stack:
+                task_name, dependencies = stack[-1]
+                for dependency in dependencies:
+                    if dependency in temp_mark:
+                        raise ValueError("Circular dependency detected")
+                    if dependency not in visited:
+                        temp_mark.add(dependency)
+                        stack.append((dependency, iter(dependency_graph[dependency])))
+                        break
+                else:
+                    stack.pop()
+                    temp_mark.remove(task_name)
+                    visited.add(task_name)
+                    result.append(task_name)
 
         return result
@@ -0,0 +1,141 @@
+# This file defines the indexed dispatch of methods. For each task, the MethodIndex looks at the methods whose
+# condition is a FluentCondition and picks the fluent most of them compare for equality, such as
+# [("mode", "==", 3)]; the methods are then bucketed by the value they require, so selecting a method reads that
+# fluent once and only tries the methods of the matching bucket, along with those the key does not constrain
+# (opaque callables and conditions not testing the key for equality), in their original order.
+#
+# The ApplicabilityCache remembers, during one planning run, which method of a task was the first applicable one.
+# Like CompiledGoals, it is indexed by the state keys the methods read, so an entry is only dropped when an action
+# or an external update writes one of them. Tasks with a method whose read keys are unknown are never cached.
+from collections import Counter
+
+from conditions import FluentCondition
+from method import Method
+
+_MISSING = object()
+
+
+def _declarative(method):
+    # The condition of a method overriding is_applicable is not the one it was given.
+    return isinstance(method.condition, FluentCondition) and type(method).is_applicable is Method.is_applicable
+
+
+class TaskDispatch:
+    def __init__(self, methods):
+        """
+        Builds the decision index of one task.
+        :param methods: The methods of the task, in the order the planner tries them.
+        """
+        self.methods = list(methods)
+
+        equalities = [{fluent: value for fluent, op, value in reversed(method.condition.comparisons) if op == '=='}
+                      if _declarative(method) else {} for method in self.methods]
+        counts = Counter(fluent for required in equalities for fluent in required)
+        self.key = counts.most_common(1)[0][0] if counts else None
+
+        buckets = {}
+        self._unkeyed = []
+        for position, required in enumerate(equalities):
+            value = required.get(self.key, _MISSING)
+            if value is _MISSING:
+                self._unkeyed.append(position)
+            else:
+                buckets.setdefault(value, []).append(position)
+        self._candidates = {value: sorted(positions + self._unkeyed) for value, positions in buckets.items()}
+
+        reads = []
+        for method in self.methods:
+            keys = method.read_keys()
+            if keys is None:
+                reads = None
+                break
+            reads.extend(keys)
+        self.reads = tuple(dict.fromkeys(reads)) if reads is not None else None
+
+    def candidates(self, state):
+        """
+        :return: The positions of the methods that may be applicable in the state, in order. Their conditions
+                 still have to be checked.
+        """
+        if self.key is None:
+            return self._unkeyed
+        return self._candidates.get(state.get(self.key, 0), self._unkeyed)
+
+    def first_applicable(self, state):
+        """
+        :return: The position of the first applicable method, or None.
+        """
+        methods = self.methods
+        for position in self.candidates(state):
+            if methods[position].is_applicable(state):
+                return position
+        return None
+
+
+class MethodIndex:
+    def __init__(self, methods):
+        """
+        :param methods: The methods by task, a dictionary or a lifted MethodLibrary. Tasks are indexed on first use,
+                        so the index must be rebuilt when the methods change.
+        """
+        self.methods = methods
+        self._tasks = {}
+
+    def dispatch(self, task):
+        """
+        :return: The TaskDispatch of a task, built on first use.
+        """
+        dispatch = self._tasks.get(task)
+        if dispatch is None:
+            dispatch = self._tasks[task] = TaskDispatch(self.methods.get(task, []))
+        return dispatch
+
+
+class ApplicabilityCache:
+    def __init__(self, index):
+        """
+        An empty cache for one planning run.
+        :param index: The MethodIndex selecting the methods.
+        """
+        self.index = index
+        self._selected = {}
+        self._readers = {}
+        self.hits = 0
+        self.misses = 0
+
+    def select(self, task, state):
+        """
+        Finds the first applicable method of a task, reusing the last result while none of the keys read by the
+        task's methods has been written.
+        :return: The method, or None if no method is applicable.
+        """
+        selected = self._selected.get(task, _MISSING)
+        if selected is not _MISSING:
+            self.hits += 1
+            return selected
+
+        self.misses += 1
+        dispatch = self.index.dispatch(task)
+        position = dispatch.first_applicable(state)
+        selected = dispatch.methods[position] if position is not None else None
+        if dispatch.reads is not None:
+            self._selected[task] = selected
+            for key in dispatch.reads:
+                self._readers.setdefault(key, set()).add(task)
+        return selected
+
+    def invalidate(self, keys):
+        """
+        Drops the results of the tasks reading one of the given keys.
+        :param keys: The state keys that were written, or None if unknown (every result is dropped).
+        """
+        if keys is None:
+            self._selected.clear()
+            self._readers.clear()
+            return
+
+        for key in keys:
+            tasks = self._readers.pop(key, None)
+            if tasks:
+                for task in tasks:
+                    self._selected.pop(task, None)
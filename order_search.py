@@ -0,0 +1,167 @@
+# This file defines the multi-order exploration mode of the HTN planner. Unordered and partially ordered
+# methods admit many linearisations of their subtasks; instead of committing to a single one, the planner
+# enumerates the combinations of linearisations chosen at each decomposition, plans each combination on a
+# process pool, and keeps the plan with the smallest summed action duration (or the first valid one).
+#
+# A combination is identified by its choice list: the i-th non-ordered decomposition of a run uses the
+# linearisation at index choices[i] (0 when the list is shorter). Each run reports how many linearisations
+# were available at every choice point, which is enough to generate the runs that deviate from it, so the
+# whole choice tree is enumerated without duplicates, up to a cap.
+import copy
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+class OrderingChoices:
+    def __init__(self, choices, max_linearisations=None, seed=None):
+        """
+        Replays a choice list during one planning run.
+        :param choices: The linearisation index to use at each choice point.
+        :param max_linearisations: Maximum number of linearisations considered per method.
+        :param seed: Seed used to sample the linearisations of methods having more than `max_linearisations`.
+        """
+        self.choices = choices
+        self.max_linearisations = max_linearisations
+        self.seed = seed
+        self.counts = []
+
+    def decompose(self, method, goal, state):
+        """
+        Decomposes a goal with the method, using the linearisation selected by the choice list.
+        """
+        if not hasattr(method, 'linearisations'):
+            return method.decompose(goal, state)
+
+        orders = method.linearisations(self.max_linearisations, self.seed)
+        if len(orders) == 1:
+            return method.decompose(goal, state)
+
+        position = len(self.counts)
+        index = self.choices[position] if position < len(self.choices) else 0
+        self.counts.append(len(orders))
+        return method.decompose_in_order(orders[index])
+
+
+def plan_duration(plan):
+    """
+    Scores a plan by the summed duration of its actions; actions without a duration count as 0.
+    :param plan: A list of action nodes.
+    :return: The total duration.
+    """
+    return sum(node.action.duration or 0 for node in plan)
+
+
+def evaluate_choices(planner, goals, state, choices, max_linearisations, seed):
+    """
+    Plans once with the given choice list on a copy of the state and checks every action's preconditions.
+    :return: A tuple (choices, counts, duration), duration being None when the run failed.
+    """
+    replay = OrderingChoices(choices, max_linearisations, seed)
+    planner.ordering_choices = replay
+    try:
+        plan = planner.plan(goals, copy.deepcopy(state))
+    except ValueError:
+        return choices, replay.counts, None
+    finally:
+        planner.ordering_choices = None
+
+    replay_state = copy.deepcopy(state)
+    for node in plan:
+        action = node.action
+        if not action.is_applicable(replay_state):
+            return choices, replay.counts, None
+        action.apply(replay_state)
+
+    return choices, replay.counts, plan_duration(plan)
+
+
+def deviations(choices, counts):
+    """
+    Lists the choice lists that deviate from a run at exactly one choice point past the end of its choice list.
+    """
+    children = []
+    for position in range(len(choices), len(counts)):
+        prefix = list(choices) + [0] * (position - len(choices))
+        for index in range(1, counts[position]):
+            children.append(tuple(prefix + [index]))
+    return children
+
+
+_worker_planner = None
+
+
+def _init_worker(planner):
+    global _worker_planner
+    _worker_planner = planner
+
+
+def _evaluate_in_worker(goals, state, choices, max_linearisations, seed):
+    return evaluate_choices(_worker_planner, goals, state, choices, max_linearisations, seed)
+
+
+def explore_orderings(planner, goals, state, max_orderings=64, workers=None, strategy="best",
+                      max_linearisations=24, seed=None):
+    """
+    Explores up to `max_orderings` combinations of linearisations and plans with the selected one.
+    :param planner: The HTNPlanner; it is shipped once to each worker process.
+    :param goals: The goals to plan for.
+    :param state: The initial state, updated in place with the selected plan like `HTNPlanner.plan` does.
+    :param max_orderings: Maximum number of combinations evaluated.
+    :param workers: Number of worker processes; 0 or 1 evaluates the combinations in this process.
+    :param strategy: "best" for the smallest summed duration (ties go to the earliest enumerated combination),
+                     "first" for the first valid plan to finish.
+    :param max_linearisations: Maximum number of linearisations considered per method.
+    :param seed: Seed for sampling linearisations of methods having more than `max_linearisations`.
+    :return: The selected plan.
+    """
+    if strategy not in ("best", "first"):
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    workers = os.cpu_count() if workers is None else workers
+    best = None
+    submitted = 0
+
+    def consider(result, order):
+        nonlocal best
+        choices, counts, duration = result
+        if duration is not None and (best is None or (duration, order) < best[:2]):
+            best = (duration, order, choices)
+        pending.extend(deviations(choices, counts))
+
+    pending = deque([()])
+    if workers <= 1:
+        while pending and submitted < max_orderings:
+            choices = pending.popleft()
+            consider(evaluate_choices(planner, goals, state, choices, max_linearisations, seed), submitted)
+            submitted += 1
+            if strategy == "first" and best is not None:
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(planner,)) as executor:
+            running = {}
+            while (pending or running) and not (strategy == "first" and best is not None):
+                while pending and submitted < max_orderings and len(running) < 2 * workers:
+                    future = executor.submit(_evaluate_in_worker, goals, state, pending.popleft(),
+                                             max_linearisations, seed)
+                    running[future] = submitted
+                    submitted += 1
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    consider(future.result(), running.pop(future))
+
+            for future in running:
+                future.cancel()
+
+    if best is None:
+        raise ValueError("No valid plan found for any explored ordering.")
+
+    # Replay the selected combination in this process to return real nodes and update the caller's state.
+    planner.ordering_choices = OrderingChoices(best[2], max_linearisations, seed)
+    try:
+        return planner.plan(goals, state)
+    finally:
+        planner.ordering_choices = None
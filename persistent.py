@@ -0,0 +1,293 @@
+# This file defines persistent (immutable) map and set structures with structural sharing. They are hash
+# array mapped tries: updates copy only the path from the root to the changed entry, O(log32 n) small
+# nodes, and share every other node with the previous version. Keeping many versions alive, e.g. the
+# alternative states of a search, therefore costs memory proportional to what changed between them.
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_MASK = (1 << 64) - 1
+_MISSING = object()
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    # int.bit_count is new in Python 3.10; older versions count the bits of the binary representation.
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+class _Leaf:
+    __slots__ = ('hash', 'key', 'value')
+
+    def __init__(self, key_hash, key, value):
+        self.hash = key_hash
+        self.key = key
+        self.value = value
+
+
+class _Collision:
+    __slots__ = ('hash', 'leaves')
+
+    def __init__(self, key_hash, leaves):
+        self.hash = key_hash
+        self.leaves = leaves
+
+
+class _Node:
+    __slots__ = ('bitmap', 'children')
+
+    def __init__(self, bitmap, children):
+        self.bitmap = bitmap
+        self.children = children
+
+
+_EMPTY_NODE = _Node(0, ())
+
+
+def _lookup(node, key_hash, key):
+    shift = 0
+    while True:
+        bit = 1 << ((key_hash >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return _MISSING
+        child = node.children[_popcount(node.bitmap & (bit - 1))]
+        if type(child) is _Node:
+            node = child
+            shift += _BITS
+        elif type(child) is _Leaf:
+            return child.value if child.key == key else _MISSING
+        else:
+            for leaf in child.leaves:
+                if leaf.key == key:
+                    return leaf.value
+            return _MISSING
+
+
+def _merge(first, second, shift):
+    # Builds the smallest subtree holding two entries whose hashes differ.
+    first_index = (first.hash >> shift) & _MASK
+    second_index = (second.hash >> shift) & _MASK
+    if first_index == second_index:
+        return _Node(1 << first_index, (_merge(first, second, shift + _BITS),))
+    children = (first, second) if first_index < second_index else (second, first)
+    return _Node((1 << first_index) | (1 << second_index), children)
+
+
+def _insert(node, shift, leaf):
+    """
+    :return: A tuple (new node, whether the key was added), or (node, False) unchanged if the value is already set.
+    """
+    bit = 1 << ((leaf.hash >> shift) & _MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    children = node.children
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, children[:index] + (leaf,) + children[index:]), True
+
+    child = children[index]
+    if type(child) is _Node:
+        new_child, added = _insert(child, shift + _BITS, leaf)
+    elif type(child) is _Leaf:
+        if child.key == leaf.key:
+            if child.value is leaf.value:
+                return node, False
+            new_child, added = leaf, False
+        elif child.hash == leaf.hash:
+            new_child, added = _Collision(leaf.hash, (child, leaf)), True
+        else:
+            new_child, added = _merge(child, leaf, shift + _BITS), True
+    elif child.hash == leaf.hash:
+        leaves = tuple(existing for existing in child.leaves if existing.key != leaf.key)
+        new_child, added = _Collision(leaf.hash, leaves + (leaf,)), len(leaves) == len(child.leaves)
+    else:
+        new_child, added = _merge(child, leaf, shift + _BITS), True
+
+    if new_child is child:
+        return node, added
+    return _Node(node.bitmap, children[:index] + (new_child,) + children[index + 1:]), added
+
+
+def _remove(node, shift, key_hash, key):
+    """
+    :return: The new node, or _MISSING if the key is not present. Emptied subtrees are dropped.
+    """
+    bit = 1 << ((key_hash >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return _MISSING
+
+    index = _popcount(node.bitmap & (bit - 1))
+    child = node.children[index]
+    if type(child) is _Node:
+        new_child = _remove(child, shift + _BITS, key_hash, key)
+        if new_child is _MISSING:
+            return _MISSING
+        if not new_child.bitmap:
+            new_child = None
+    elif type(child) is _Leaf:
+        if child.key != key:
+            return _MISSING
+        new_child = None
+    else:
+        leaves = tuple(leaf for leaf in child.leaves if leaf.key != key)
+        if len(leaves) == len(child.leaves):
+            return _MISSING
+        new_child = leaves[0] if len(leaves) == 1 else _Collision(key_hash, leaves)
+
+    if new_child is None:
+        return _Node(node.bitmap & ~bit, node.children[:index] + node.children[index + 1:])
+    return _Node(node.bitmap, node.children[:index] + (new_child,) + node.children[index + 1:])
+
+
+def _leaves(node):
+    stack = [node]
+    while stack:
+        for child in stack.pop().children:
+            if type(child) is _Node:
+                stack.append(child)
+            elif type(child) is _Leaf:
+                yield child
+            else:
+                yield from child.leaves
+
+
+class PersistentMap:
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, items=None):
+        """
+        Builds a map from an optional mapping or iterable of (key, value) pairs.
+        """
+        self._root = _EMPTY_NODE
+        self._size = 0
+        if items is not None:
+            for key, value in (items.items() if hasattr(items, 'items') else items):
+                self._root, added = _insert(self._root, 0, _Leaf(hash(key) & _HASH_MASK, key, value))
+                self._size += added
+
+    @classmethod
+    def _from_root(cls, root, size):
+        new_map = cls.__new__(cls)
+        new_map._root = root
+        new_map._size = size
+        return new_map
+
+    def set(self, key, value):
+        """
+        :return: A new map where `key` is mapped to `value`; this map is unchanged.
+        """
+        root, added = _insert(self._root, 0, _Leaf(hash(key) & _HASH_MASK, key, value))
+        if root is self._root:
+            return self
+        return self._from_root(root, self._size + added)
+
+    def delete(self, key):
+        """
+        :return: A new map without `key`; this map is unchanged.
+        :raises KeyError: If the key is not present.
+        """
+        root = _remove(self._root, 0, hash(key) & _HASH_MASK, key)
+        if root is _MISSING:
+            raise KeyError(key)
+        return self._from_root(root, self._size - 1)
+
+    def get(self, key, default=None):
+        value = _lookup(self._root, hash(key) & _HASH_MASK, key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = _lookup(self._root, hash(key) & _HASH_MASK, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return _lookup(self._root, hash(key) & _HASH_MASK, key) is not _MISSING
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (leaf.key for leaf in _leaves(self._root))
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return (leaf.value for leaf in _leaves(self._root))
+
+    def items(self):
+        return ((leaf.key, leaf.value) for leaf in _leaves(self._root))
+
+    def __eq__(self, other):
+        if isinstance(other, PersistentMap):
+            return self._root is other._root or (len(self) == len(other) and dict(self.items()) == dict(other.items()))
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return PersistentMap, (list(self.items()),)
+
+    def __repr__(self):
+        return f"PersistentMap({dict(self.items())})"
+
+
+class PersistentSet:
+    __slots__ = ('_map',)
+
+    def __init__(self, items=None):
+        """
+        Builds a set from an optional iterable.
+        """
+        self._map = PersistentMap((item, True) for item in items) if items is not None else PersistentMap()
+
+    def add(self, item):
+        """
+        :return: A new set containing `item`; this set is unchanged.
+        """
+        new_map = self._map.set(item, True)
+        if new_map is self._map:
+            return self
+        new_set = PersistentSet.__new__(PersistentSet)
+        new_set._map = new_map
+        return new_set
+
+    def remove(self, item):
+        """
+        :return: A new set without `item`; this set is unchanged.
+        :raises KeyError: If the item is not present.
+        """
+        new_set = PersistentSet.__new__(PersistentSet)
+        new_set._map = self._map.delete(item)
+        return new_set
+
+    def discard(self, item):
+        """
+        :return: A new set without `item`, or this set if the item is not present.
+        """
+        return self.remove(item) if item in self._map else self
+
+    def __contains__(self, item):
+        return item in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __eq__(self, other):
+        if isinstance(other, PersistentSet):
+            return self._map == other._map
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return PersistentSet, (list(self),)
+
+    def __repr__(self):
+        return f"PersistentSet({set(self)})"
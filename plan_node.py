@@ -0,0 +1,83 @@
+# This file defines the node types of an HTN plan and the compact PlanNode class used for agenda entries.
+# Node kinds are small integers and nodes are __slots__ objects rather than dictionaries, which keeps
+# memory and dispatch costs low when millions of nodes are created. PlanNode also implements the
+# read side of the dictionary interface (node['type'], node['action'], node.get(...)), so code written
+# against the former dictionary nodes keeps working.
+
+
+class NodeType:
+    SPLIT = 0
+    JOIN = 1
+    GOAL = 2
+    ACTION = 3
+    PHANTOM = 4
+
+
+class PlanNode:
+    __slots__ = ('kind', 'goal', 'action', 'data')
+
+    def __init__(self, kind, goal=None, action=None, data=None):
+        """
+        Initializes a plan node.
+        :param kind: The NodeType of the node.
+        :param goal: The goal (task name) of GOAL nodes.
+        :param action: The action of ACTION nodes.
+        :param data: Optional dictionary of extra fields (e.g., the bookkeeping of JOIN nodes).
+        """
+        self.kind = kind
+        self.goal = goal
+        self.action = action
+        self.data = data
+
+    @classmethod
+    def goal_node(cls, goal):
+        return cls(NodeType.GOAL, goal=goal)
+
+    @classmethod
+    def action_node(cls, action):
+        return cls(NodeType.ACTION, action=action)
+
+    @classmethod
+    def from_node(cls, node):
+        """
+        Converts a dictionary node ({'type': ..., 'goal'/'action': ..., ...}) into a PlanNode; PlanNodes are returned as is.
+        """
+        if isinstance(node, cls):
+            return node
+
+        data = {key: value for key, value in node.items() if key not in ('type', 'goal', 'action')}
+        return cls(node['type'], node.get('goal'), node.get('action'), data or None)
+
+    def __reduce__(self):
+        # Positional reconstruction pickles smaller and loads faster than the default __slots__ state.
+        return PlanNode, (self.kind, self.goal, self.action, self.data)
+
+    def copy(self):
+        return PlanNode(self.kind, self.goal, self.action, dict(self.data) if self.data is not None else None)
+
+    def __getitem__(self, key):
+        if key == 'type':
+            return self.kind
+        if key == 'goal' and self.goal is not None:
+            return self.goal
+        if key == 'action' and self.action is not None:
+            return self.action
+        if self.data is not None and key in self.data:
+            return self.data[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __repr__(self):
+        if self.kind == NodeType.ACTION:
+            return f"PlanNode(ACTION, {self.action.name})"
+        if self.kind == NodeType.GOAL:
+            return f"PlanNode(GOAL, {self.goal})"
+        return f"PlanNode({self.kind}, {self.data})"
@@ -0,0 +1,116 @@
+# This file defines plan repair: when the observed outcome of executed actions differs from their effects, the
+# rest of the plan is mended instead of planned again from the root goals. The remaining actions are replayed
+# from the observed state; if one of them is no longer applicable, the subtasks of the task that produced it that
+# have not started executing are planned again from the state at the point their actions start, and the new
+# actions replace theirs. Subtasks with executed actions are kept, so nothing already done is planned twice. When
+# the repaired plan still fails, the next task up the DecompositionTree is tried, and only when the root is
+# reached is the whole plan replaced by planning the root goals again. Every other action of the plan is reused.
+import copy
+from collections import namedtuple
+
+from decomposition_tree import DecompositionTree
+from plan_node import NodeType, PlanNode
+
+# The outcome of a repair: the executed actions followed by the repaired remainder, the goal node decomposed
+# again (None when the plan was kept or fully replanned), the number of actions newly planned, and whether the
+# root goals had to be planned again.
+RepairResult = namedtuple('RepairResult', ['plan', 'task', 'replanned', 'full_replan'])
+
+
+def first_failure(actions, state):
+    """
+    Replays action nodes on a state, which is modified.
+    :return: The index of the first action that is not applicable, or None when all of them are.
+    """
+    for index, node in enumerate(actions):
+        if not node.action.is_applicable(state):
+            return index
+        state = node.action.apply(state)
+    return None
+
+
+def repair_plan(planner, goals, plan, tree, executed, state, delta, copy_state=copy.deepcopy):
+    """
+    Repairs a plan after a change of the world state during its execution.
+    :param planner: The HTNPlanner that produced the plan.
+    :param goals: The root goals of the plan.
+    :param plan: The plan, a list of action nodes returned by `planner.plan(goals, ..., tree=tree)`.
+    :param tree: The DecompositionTree recorded with the plan; it is updated to describe the repaired plan.
+    :param executed: The number of actions of the plan executed so far.
+    :param state: The state expected after the executed actions. The delta is written into it, and it is
+                  otherwise left unchanged.
+    :param delta: A dictionary mapping the state keys (fluents or (structure, item) pairs) whose observed value
+                  differs from the expected one to the observed value.
+    :param copy_state: Copies a state before actions are replayed or planned on it; domains with persistent state
+                       structures can pass copy.copy.
+    :return: A RepairResult whose plan keeps the executed actions as its prefix. Raises ValueError, like
+             HTNPlanner.plan, when the root goals have to be planned again and cannot be.
+    """
+    state = planner.apply_state_updates(state, delta)
+    done, remaining = list(plan[:executed]), list(plan[executed:])
+
+    failure = first_failure(remaining, copy_state(state))
+    if failure is None:
+        return RepairResult(done + remaining, None, 0, False)
+
+    # The lowest task whose new decomposition makes the remainder executable is the one repaired.
+    executed_ids = {id(action_node) for action_node in done}
+    node = tree.parent(remaining[failure])
+    while node is not None:
+        repaired = _decompose_again(planner, tree, node, remaining, executed_ids, state, copy_state)
+        if repaired is not None:
+            remaining, replanned = repaired
+            return RepairResult(done + remaining, node, replanned, False)
+        node = tree.parent(node)
+
+    tree.clear()
+    remaining = planner.plan(goals, copy_state(state), tree=tree)
+    return RepairResult(done + remaining, None, len(remaining), True)
+
+
+def _decompose_again(planner, tree, node, remaining, executed_ids, state, copy_state):
+    # Plans the node's subtasks after its last one with executed actions again, from the state where the first of
+    # them starts. Returns the repaired remainder and the number of new actions, or None if there is no such
+    # subtask, one cannot be decomposed or the result fails.
+    children = tree.children(node)
+    first = 0
+    for index, child in enumerate(children):
+        if any(id(action_node) in executed_ids for action_node in tree.actions_under(child)):
+            first = index + 1
+    if first == len(children):
+        return None
+
+    under = {id(action_node) for child in children[first:] for action_node in tree.actions_under(child)}
+    start = next((index for index, action_node in enumerate(remaining) if id(action_node) in under), None)
+    if start is None:
+        return None
+
+    # The actions before `start`, such as the rest of a subtask already started, must still replay.
+    start_state = copy_state(state)
+    if first_failure(remaining[:start], start_state) is not None:
+        return None
+
+    # Primitive subtasks are kept as new action nodes; compound ones are planned in order on one state.
+    subtree = DecompositionTree()
+    planning_state = copy_state(start_state)
+    new_actions = []
+    try:
+        for child in children[first:]:
+            if child.kind == NodeType.ACTION:
+                action_node = PlanNode.action_node(child.action)
+                subtree.add_roots([action_node])
+                planning_state = child.action.apply(planning_state)
+                new_actions.append(action_node)
+            else:
+                new_actions.extend(planner.iter_plan([child.goal], planning_state, tree=subtree,
+                                                     until_satisfied=False))
+    except ValueError:
+        return None
+
+    # The planner does not check preconditions, so the new actions are replayed along with the rest of the plan.
+    repaired = new_actions + [action_node for action_node in remaining[start:] if id(action_node) not in under]
+    if first_failure(repaired, start_state) is not None:
+        return None
+
+    tree.graft(node, subtree, first)
+    return remaining[:start] + repaired, len(new_actions)
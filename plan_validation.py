@@ -0,0 +1,320 @@
+# This file defines the plan validator run before plans are dispatched. Each plan is replayed from its initial
+# state: every step's preconditions are checked, the first failing step is reported with the preconditions it
+# misses, and the final state and total duration are computed. Plans over numeric dictionary domains are
+# validated in batches with NumPy: the states of a batch form one matrix, and each step checks and applies the
+# actions of every plan at once, against the preconditions and effects the CompiledDomain interned as indices. Other
+# plans, such as blocks-world plans whose actions hold callables, are replayed one step at a time.
+#
+# Run as a script, the validator reads a JSON-lines file of {"plan": [action names], "state": {...}} records and
+# writes one JSON result per plan:
+#
+#   python plan_validation.py --domain domains/camping.json --plans plans.jsonl --output results.jsonl
+import argparse
+import copy
+import json
+import sys
+import time
+from collections import namedtuple
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from action import Action
+from compiled_domain import CompiledDomain
+from plan_node import PlanNode
+
+# The outcome of validating one plan: its position in the input, whether every step was applicable, the index of
+# the first failing step, the preconditions it misses, an error for steps naming unknown actions, the state
+# reached (before the failing step for invalid plans) and the summed duration of the steps applied.
+ValidationResult = namedtuple('ValidationResult', ['index', 'valid', 'failed_step', 'missing', 'error',
+                                                   'final_state', 'duration'])
+
+
+def describe_precondition(precondition):
+    # Callable preconditions, such as the partials of the blocks domain, are described as calls.
+    function = getattr(precondition, 'func', precondition)
+    arguments = ", ".join(repr(argument) for argument in getattr(precondition, 'args', ()))
+    return f"{getattr(function, '__name__', repr(function))}({arguments})"
+
+
+def missing_preconditions(action, state):
+    """
+    Lists the preconditions of an action that do not hold in a state.
+    :return: For dictionary preconditions, a dictionary mapping each unmet fluent to (required, actual) values;
+             for callable preconditions, the descriptions of the unmet ones.
+    """
+    if isinstance(action.preconditions, dict):
+        return {fluent: (value, state.get(fluent, 0)) for fluent, value in action.preconditions.items()
+                if state.get(fluent, 0) < value}
+    return [describe_precondition(precondition) for precondition in action.preconditions
+            if not precondition(state)]
+
+
+def _is_numeric(action):
+    return (isinstance(action, Action) and isinstance(action.preconditions, dict)
+            and isinstance(action.effects, dict)
+            and all(type(value) is int for value in action.preconditions.values())
+            and all(type(value) is int for value in action.effects.values()))
+
+
+class PlanValidator:
+    def __init__(self, actions=None, vectorise=True, chunk_size=4096, copy_state=copy.deepcopy):
+        """
+        :param actions: Optional dictionary of actions by name, to resolve plan steps given as names.
+        :param vectorise: Whether numeric plans are validated in NumPy batches, when NumPy is installed.
+        :param chunk_size: Number of plans per batch.
+        :param copy_state: Copies an initial state before a plan is replayed step by step; domains with persistent
+                           state structures can pass copy.copy.
+        """
+        self.actions = actions if actions is not None else {}
+        self.vectorise = vectorise and np is not None
+        self.chunk_size = chunk_size
+        self.copy_state = copy_state
+        self._rows = {}
+        self._batch_actions = []
+        self._domain = None
+        self._preconditions = None
+        self._effects = None
+        self._durations = None
+
+    def resolve(self, step):
+        """
+        :return: The action of a plan step given as an action node, an Action or an action name, or None.
+        """
+        if type(step) is PlanNode:
+            return step.action
+        if isinstance(step, Action):
+            return step
+        return self.actions.get(step)
+
+    def validate(self, plan, state, index=0):
+        """
+        Replays a plan step by step on a copy of a state.
+        :param plan: A list of action nodes, Actions or action names.
+        :param state: The initial state, which is not modified.
+        :param index: The index reported in the result.
+        :return: A ValidationResult.
+        """
+        state = self.copy_state(state)
+        duration = 0
+        for step_index, step in enumerate(plan):
+            action = self.resolve(step)
+            if action is None:
+                return ValidationResult(index, False, step_index, None, f"Unknown action: {step}", state, duration)
+            if not action.is_applicable(state):
+                return ValidationResult(index, False, step_index, missing_preconditions(action, state), None, state,
+                                        duration)
+            state = action.apply(state)
+            duration += action.duration or 0
+        return ValidationResult(index, True, None, None, None, state, duration)
+
+    def validate_many(self, problems, final_states=True):
+        """
+        Validates many plans, in batches where possible.
+        :param problems: An iterable of (plan, initial state) pairs; it is consumed lazily.
+        :param final_states: Whether to build the final state of every plan. Without them results hold None,
+                             which saves converting batch states back into dictionaries.
+        :return: A generator of ValidationResult, in input order.
+        """
+        problems = enumerate(problems)
+        while True:
+            chunk = list(islice(problems, self.chunk_size))
+            if not chunk:
+                return
+
+            batch = []
+            results = {}
+            get_row = self._rows.get
+            for index, (plan, state) in chunk:
+                if self.vectorise:
+                    rows = [get_row(step) for step in plan]
+                    if None in rows:
+                        rows = [self._row(step) if row is None else row for row, step in zip(rows, plan)]
+                    if (not rows or min(rows) >= 0) and all(type(value) is int for value in state.values()):
+                        batch.append((index, rows, state))
+                        continue
+                result = self.validate(plan, state, index)
+                results[index] = result if final_states else result._replace(final_state=None)
+            if batch:
+                for result in self._validate_batch(batch, final_states):
+                    results[result.index] = result
+            for index, _ in chunk:
+                yield results[index]
+
+    def _row(self, step):
+        # The batch row of a plan step, -1 when the step cannot be batched. Rows are remembered by action and by
+        # action name; action nodes are only looked up through their action, as every plan has new ones.
+        action = self.resolve(step)
+        row = -1
+        if action is not None and _is_numeric(action):
+            row = self._rows.get(action)
+            if row is None:
+                row = self._rows[action] = len(self._batch_actions)
+                self._batch_actions.append(action)
+        if type(step) is not PlanNode:
+            self._rows[step] = row
+        return row
+
+    def _compiled(self):
+        # The compiled domain is rebuilt when plans used actions it has not seen. Actions have few preconditions
+        # and effects, so they are packed as padded (actions x most preconditions or effects) index/value
+        # matrices rather than dense rows over every fluent; padding points at an extra state column kept at 0.
+        if self._domain is None or len(self._domain.actions) != len(self._batch_actions):
+            domain = CompiledDomain(self._batch_actions)
+            compiled = [domain.compiled_actions[id(action)] for action in self._batch_actions]
+            padding = len(domain.fluents)
+            self._preconditions = _packed([(c.precondition_indices, c.precondition_values) for c in compiled],
+                                          padding, np.iinfo(np.int64).min)
+            self._effects = _packed([(c.effect_indices, c.effect_values) for c in compiled], padding, 0)
+            self._durations = np.array([action.duration or 0 for action in self._batch_actions], dtype=np.int64)
+            self._domain = domain
+        return self._domain
+
+    def _validate_batch(self, batch, final_states):
+        domain = self._compiled()
+        precondition_indices, precondition_values = self._preconditions
+        effect_indices, effect_values = self._effects
+        fluent_index = domain.fluent_index
+
+        count = len(batch)
+        length = max(len(rows) for _, rows, _ in batch)
+        steps = np.array([rows + [-1] * (length - len(rows)) for _, rows, _ in batch],
+                         dtype=np.int64).reshape(count, length)
+        states = np.zeros((count, len(domain.fluents) + 1), dtype=np.int64)
+        for position, (_, _, state) in enumerate(batch):
+            for fluent, value in state.items():
+                column = fluent_index.get(fluent)
+                if column is not None:
+                    states[position, column] = value
+
+        # Each step checks and applies one action of every plan still running; a plan stops at its first failure.
+        alive = np.ones(count, dtype=bool)
+        failed_steps = np.full(count, -1, dtype=np.int64)
+        durations = np.zeros(count, dtype=np.int64)
+        touched = np.zeros(states.shape, dtype=bool)
+        for step in range(length):
+            running = np.nonzero(alive & (steps[:, step] >= 0))[0]
+            if not len(running):
+                break
+            actions = steps[running, step]
+            applicable = (states[running[:, None], precondition_indices[actions]]
+                          >= precondition_values[actions]).all(axis=1)
+
+            failing = running[~applicable]
+            alive[failing] = False
+            failed_steps[failing] = step
+
+            # The effect indices of an action are distinct, so a fancy-indexed add applies each effect once; the
+            # padding all lands on the extra column, adding 0.
+            running, actions = running[applicable], actions[applicable]
+            states[running[:, None], effect_indices[actions]] += effect_values[actions]
+            touched[running[:, None], effect_indices[actions]] = True
+            durations[running] += self._durations[actions]
+
+        results = []
+        for position, ((index, rows, state), step, duration) in enumerate(zip(batch, failed_steps.tolist(),
+                                                                               durations.tolist())):
+            if step < 0:
+                final_state = self._to_dict(states[position], touched[position], state) if final_states else None
+                results.append(ValidationResult(index, True, None, None, None, final_state, duration))
+                continue
+            final_state = self._to_dict(states[position], touched[position], state)
+            missing = missing_preconditions(self._batch_actions[rows[step]], final_state)
+            results.append(ValidationResult(index, False, step, missing, None, final_state if final_states else None,
+                                            duration))
+        return results
+
+    def _to_dict(self, vector, touched, initial_state):
+        # The keys of the final state are those Action.apply would leave: the initial ones and every fluent an
+        # applied action has an effect on.
+        state = dict(initial_state)
+        values = vector.tolist()
+        fluents = self._domain.fluents
+        fluent_index = self._domain.fluent_index
+        for fluent in initial_state:
+            column = fluent_index.get(fluent)
+            if column is not None:
+                state[fluent] = values[column]
+        for column in np.flatnonzero(touched[:-1]).tolist():
+            state[fluents[column]] = values[column]
+        return state
+
+
+def _packed(pairs, padding, padding_value):
+    # Packs (indices, values) pairs into two padded matrices with one row per pair.
+    width = max([len(indices) for indices, _ in pairs] + [1])
+    indices = np.full((len(pairs), width), padding, dtype=np.int64)
+    values = np.full((len(pairs), width), padding_value, dtype=np.int64)
+    for row, (row_indices, row_values) in enumerate(pairs):
+        indices[row, :len(row_indices)] = row_indices
+        values[row, :len(row_values)] = row_values
+    return indices, values
+
+
+def _result_record(result):
+    record = {'index': result.index, 'valid': result.valid, 'failed_step': result.failed_step,
+              'duration': result.duration}
+    if result.missing is not None:
+        record['missing'] = result.missing
+    if result.error is not None:
+        record['error'] = result.error
+    if result.final_state is not None:
+        record['final_state'] = result.final_state
+    return record
+
+
+def read_problems(lines, default_state=None):
+    """
+    Parses JSON-lines plan records: {"plan": [action names], "state": {...}}, the state defaulting to
+    `default_state` (or an empty state).
+    :return: A generator of (plan, state) pairs.
+    """
+    for line in lines:
+        if line.strip():
+            record = json.loads(line)
+            yield record['plan'], record.get('state', default_state if default_state is not None else {})
+
+
+def main(domain, plans, output=None, state=None, final_states=False, vectorise=True):
+    # The domain loader is imported here so the validator itself does not depend on the domain format.
+    from domain_format import load_domain
+
+    actions = load_domain(domain).actions
+    default_state = None
+    if state is not None:
+        with open(state) as state_file:
+            default_state = json.load(state_file)
+
+    validator = PlanValidator(actions, vectorise=vectorise)
+    output_file = open(output, 'w') if output is not None else sys.stdout
+    start = time.perf_counter()
+    total = valid = 0
+    try:
+        with open(plans) as plans_file:
+            for result in validator.validate_many(read_problems(plans_file, default_state), final_states):
+                output_file.write(json.dumps(_result_record(result)) + "\n")
+                total += 1
+                valid += result.valid
+    finally:
+        if output is not None:
+            output_file.close()
+    elapsed = time.perf_counter() - start
+    print(f"{valid}/{total} plans valid, validated in {elapsed:.3f} s "
+          f"({total / elapsed if elapsed else 0:.0f} plans/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan Validator")
+    parser.add_argument("--domain", required=True, help="Domain file defining the actions (see domain_format.py)")
+    parser.add_argument("--plans", required=True, help="JSON-lines file of {\"plan\": [...], \"state\": {...}} records")
+    parser.add_argument("--output", default=None, help="JSON-lines file for the results (default stdout)")
+    parser.add_argument("--state", default=None, help="JSON file of the initial state of plans without one")
+    parser.add_argument("--final-states", action="store_true", help="Include the final state of every plan")
+    parser.add_argument("--no-vectorise", action="store_true", help="Replay every plan step by step")
+    args = parser.parse_args()
+
+    main(args.domain, args.plans, output=args.output, state=args.state, final_states=args.final_states,
+         vectorise=not args.no_vectorise)
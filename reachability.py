@@ -0,0 +1,208 @@
+# This file defines the static analysis of a domain run before planning. Over a relaxation of the problem, where
+# action effects only ever widen the range of values a fluent may take and subtasks may run in any order, it
+# computes from the initial state which actions can ever become applicable, which methods can ever succeed and
+# which compound tasks can be decomposed into primitive actions at all. Methods and tasks that provably cannot
+# succeed, and with goals the tasks the goals can never reach, are pruned from the domain, so the planner no
+# longer tries them and fails deep in the tree.
+#
+# The analysis is sound for numeric dictionary domains: whatever it prunes could never appear in a plan.
+# Actions with non-dictionary preconditions, methods whose conditions are opaque callables and methods that
+# decompose dynamically (Method subclasses overriding `decompose`) are assumed to possibly succeed; a dynamic
+# method may produce any action, so when one is reachable every fluent is assumed to take any value.
+import math
+from collections import namedtuple
+
+from action import Action
+from conditions import FluentCondition
+from method import Method
+
+# What the analysis found and removed: the methods pruned as (task, method, reason) triples, the tasks left
+# without methods, the tasks unreachable from the goals, the actions that can never be applied, and the range
+# (minimum, maximum) of every fluent over all reachable states.
+PruningReport = namedtuple('PruningReport', ['removed_methods', 'removed_tasks', 'unreachable_tasks',
+                                             'inapplicable_actions', 'fluent_bounds'])
+
+_UNBOUNDED = (-math.inf, math.inf)
+
+
+def _is_dynamic(method):
+    return type(method).decompose is not Method.decompose
+
+
+def _condition_possible(condition, bounds):
+    # Whether a FluentCondition can hold in some state whose fluents lie within their bounds.
+    for fluent, op, value in condition.comparisons:
+        low, high = bounds.get(fluent, (0, 0))
+        if op == '==' and not low <= value <= high:
+            return False
+        if op == '!=' and low == high == value:
+            return False
+        if op == '<' and not low < value:
+            return False
+        if op == '<=' and not low <= value:
+            return False
+        if op == '>' and not high > value:
+            return False
+        if op == '>=' and not high >= value:
+            return False
+    return True
+
+
+class _Analysis:
+    def __init__(self, methods, actions, state, goals):
+        self.methods = methods
+        self.actions = actions
+        self.state = state
+        self.goals = goals
+        self.bounds = {}
+        self.applicable = set()
+        self.viable_methods = set()
+        self.viable_tasks = set()
+        self.reachable = set()
+        self.any_value = False
+
+    def action_of(self, subtask):
+        if isinstance(subtask, Action):
+            return subtask
+        return self.actions.get(subtask)
+
+    def bound(self, fluent):
+        if self.any_value:
+            return _UNBOUNDED
+        return self.bounds.get(fluent, (self.state.get(fluent, 0),) * 2)
+
+    def action_possible(self, action):
+        if not isinstance(action.preconditions, dict):
+            return True
+        return all(self.bound(fluent)[1] >= value for fluent, value in action.preconditions.items())
+
+    def method_possible(self, method):
+        if isinstance(method.condition, FluentCondition):
+            bounds = {fluent: self.bound(fluent) for fluent in method.condition.fluents()}
+            if not _condition_possible(method.condition, bounds):
+                return False
+        for subtask in method.subtasks:
+            action = self.action_of(subtask)
+            if action is not None:
+                if id(action) not in self.applicable:
+                    return False
+            elif subtask not in self.viable_tasks:
+                return False
+        return True
+
+    def run(self):
+        # Least fixpoint: everything starts impossible, and the sets grow until nothing changes. The bounds of the
+        # fluents grow from every reachable action that may become applicable, whether or not the methods using
+        # it turn out to be viable: those depend on the bounds in turn.
+        reached_actions = self.reach()
+        changed = True
+        while changed:
+            changed = False
+            for action in reached_actions:
+                if id(action) not in self.applicable and self.action_possible(action):
+                    self.applicable.add(id(action))
+                    changed = True
+                    self.widen(action)
+
+            for task in self.reachable:
+                for method in self.methods.get(task, ()):
+                    if id(method) not in self.viable_methods and self.method_possible(method):
+                        self.viable_methods.add(id(method))
+                        self.viable_tasks.add(task)
+                        changed = True
+        return self
+
+    def widen(self, action):
+        if not isinstance(action.effects, dict):
+            self.any_value = True
+            return
+        for fluent, value in action.effects.items():
+            low, high = self.bound(fluent)
+            self.bounds[fluent] = (-math.inf if value < 0 else low, math.inf if value > 0 else high)
+
+    def roots(self):
+        return self.goals if self.goals is not None else list(self.methods) + list(self.actions)
+
+    def reach(self):
+        # The tasks and actions reachable from the roots through any method.
+        reached_actions = {}
+        stack = list(self.roots())
+        while stack:
+            task = stack.pop()
+            action = self.action_of(task)
+            if action is not None:
+                reached_actions[id(action)] = action
+                continue
+            if task in self.reachable:
+                continue
+            self.reachable.add(task)
+            for method in self.methods.get(task, ()):
+                if _is_dynamic(method):
+                    self.any_value = True
+                stack.extend(method.subtasks)
+        return list(reached_actions.values())
+
+
+def analyze_domain(methods, actions, state, goals=None):
+    """
+    Computes the pruning of a domain without modifying it.
+    :param methods: The methods by task, a dictionary; lifted libraries, which ground tasks lazily, are not supported.
+    :param actions: The actions by name.
+    :param state: The initial state, a dictionary of numeric fluents.
+    :param goals: Optional root goals; tasks they cannot reach are reported as unreachable.
+    :return: A (pruned methods, PruningReport) pair; the pruned methods keep the order of the original ones.
+    """
+    if not isinstance(methods, dict):
+        raise ValueError("Only domains whose methods are a dictionary can be analysed.")
+
+    analysis = _Analysis(methods, actions, state, goals).run()
+    pruned = {}
+    removed_methods = []
+    removed_tasks = []
+    for task, task_methods in methods.items():
+        if goals is not None and task not in analysis.reachable:
+            continue
+
+        kept = []
+        for method in task_methods:
+            if id(method) in analysis.viable_methods:
+                kept.append(method)
+            else:
+                removed_methods.append((task, method, _reason(analysis, method)))
+        if kept:
+            pruned[task] = kept
+        else:
+            removed_tasks.append(task)
+
+    unreachable = [task for task in methods if goals is not None and task not in analysis.reachable]
+    inapplicable = [name for name, action in actions.items() if id(action) not in analysis.applicable]
+    bounds = {fluent: analysis.bound(fluent) for fluent in sorted(set(analysis.bounds) | set(state))}
+    return pruned, PruningReport(removed_methods, removed_tasks, unreachable, inapplicable, bounds)
+
+
+def _reason(analysis, method):
+    if isinstance(method.condition, FluentCondition):
+        bounds = {fluent: analysis.bound(fluent) for fluent in method.condition.fluents()}
+        if not _condition_possible(method.condition, bounds):
+            return f"condition {list(method.condition.comparisons)} can never hold"
+    for subtask in method.subtasks:
+        action = analysis.action_of(subtask)
+        if action is not None and id(action) not in analysis.applicable:
+            return f"action {action.name} can never be applied"
+        if action is None and subtask not in analysis.viable_tasks:
+            return f"task {subtask} can never be decomposed"
+    return "unreachable"
+
+
+def format_report(report):
+    """
+    :return: A human-readable summary of a PruningReport.
+    """
+    lines = [f"Removed {len(report.removed_methods)} methods, {len(report.removed_tasks)} tasks without methods "
+             f"and {len(report.unreachable_tasks)} unreachable tasks; "
+             f"{len(report.inapplicable_actions)} actions can never be applied."]
+    for task, _, reason in report.removed_methods:
+        lines.append(f"  method of {task}: {reason}")
+    for task in report.removed_tasks:
+        lines.append(f"  task {task}: no method can succeed")
+    return "\n".join(lines)
@@ -0,0 +1,200 @@
+# This file defines the temporal scheduling stage run after planning. The planner returns a sequential plan, but
+# most of its actions do not depend on each other: an action only has to wait for the earlier actions that write
+# a state key it reads or writes, and for the earlier actions that read a key it writes. Keeping only these
+# constraints (deordering the plan) gives a partial-order graph every linearisation of which is as valid as the
+# plan itself. When the DecompositionTree of the plan is available, the dependencies declared by its partially
+# ordered methods are added to the graph (and optionally the sequence of its ordered methods). From this graph
+# the stage computes earliest start times, the critical path and a parallel schedule: with unlimited workers
+# every action starts as early as possible, which is the minimum makespan; with K workers actions are
+# list-scheduled, the longest remaining path first.
+import heapq
+from collections import namedtuple
+
+# One scheduled plan node: its position in the plan, start and finish times and the worker running it.
+ScheduledAction = namedtuple('ScheduledAction', ['index', 'node', 'start', 'finish', 'worker'])
+
+# A schedule: the scheduled actions in plan order, the makespan and the plan indices on the critical path.
+Schedule = namedtuple('Schedule', ['entries', 'makespan', 'critical_path'])
+
+
+def _duration(node):
+    return node.action.duration or 0
+
+
+def precedence_graph(plan, tree=None, strict_order=False):
+    """
+    Builds the partial order of a sequential plan from the state keys its actions read and write.
+    An action without declared read keys is ordered after every earlier action, and every later action is
+    ordered after it.
+    :param plan: A list of action nodes.
+    :param tree: Optional DecompositionTree recorded while planning, whose method orderings are added.
+    :param strict_order: With a tree, also keep the subtask sequence of ordered methods.
+    :return: A list holding, for each action, the sorted indices of the earlier actions it must follow.
+    """
+    last_writer = {}
+    readers_since_write = {}
+    barrier = None
+    predecessors = []
+
+    for index, node in enumerate(plan):
+        action = node.action
+        reads = action.read_keys()
+        if reads is None:
+            predecessors.append(list(range(index)))
+            barrier = index
+            last_writer.clear()
+            readers_since_write.clear()
+            continue
+
+        writes = list(action.written_keys())
+        before = set()
+        if barrier is not None:
+            before.add(barrier)
+        for key in reads:
+            if key in last_writer:
+                before.add(last_writer[key])
+        for key in writes:
+            if key in last_writer:
+                before.add(last_writer[key])
+            before.update(readers_since_write.get(key, ()))
+        before.discard(index)
+
+        for key in reads:
+            readers_since_write.setdefault(key, []).append(index)
+        for key in writes:
+            last_writer[key] = index
+            readers_since_write[key] = []
+        predecessors.append(sorted(before))
+
+    if tree is not None:
+        _add_method_orderings(plan, predecessors, tree, strict_order)
+    return predecessors
+
+
+def _add_method_orderings(plan, predecessors, tree, strict_order):
+    index_by_node = {id(node): index for index, node in enumerate(plan)}
+    added = [set(before) for before in predecessors]
+    for before_nodes, after_nodes in tree.ordering_constraints(strict_order):
+        before_indices = [index_by_node[id(node)] for node in before_nodes if id(node) in index_by_node]
+        for node in after_nodes:
+            after = index_by_node.get(id(node))
+            if after is not None:
+                # Only orderings consistent with the plan are kept, so the graph stays acyclic.
+                added[after].update(index for index in before_indices if index < after)
+    predecessors[:] = [sorted(before) for before in added]
+
+
+def earliest_start_times(plan, predecessors):
+    """
+    :return: The earliest start time of every action when any number of actions may run at once.
+    """
+    starts = []
+    for index, node in enumerate(plan):
+        starts.append(max((starts[before] + _duration(plan[before]) for before in predecessors[index]), default=0))
+    return starts
+
+
+def critical_path(plan, predecessors, starts):
+    """
+    Follows the longest chain of dependent actions back from the action finishing last.
+    :return: The plan indices on the critical path, in execution order.
+    """
+    if not plan:
+        return []
+
+    finishes = [start + _duration(node) for start, node in zip(starts, plan)]
+    index = max(range(len(plan)), key=lambda position: (finishes[position], position))
+    path = [index]
+    while predecessors[index]:
+        index = max(predecessors[index], key=lambda position: (finishes[position], position))
+        path.append(index)
+    path.reverse()
+    return path
+
+
+def _remaining_lengths(plan, predecessors):
+    # Length of the longest chain starting at each action, its own duration included.
+    lengths = [_duration(node) for node in plan]
+    for index in range(len(plan) - 1, -1, -1):
+        for before in predecessors[index]:
+            lengths[before] = max(lengths[before], _duration(plan[before]) + lengths[index])
+    return lengths
+
+
+def _list_schedule(plan, predecessors, workers):
+    successors = [[] for _ in plan]
+    waiting = [len(before) for before in predecessors]
+    for index, before in enumerate(predecessors):
+        for position in before:
+            successors[position].append(index)
+    priorities = _remaining_lengths(plan, predecessors)
+
+    ready = [(-priorities[index], index) for index in range(len(plan)) if waiting[index] == 0]
+    heapq.heapify(ready)
+    free_workers = list(range(workers))
+    heapq.heapify(free_workers)
+    running = []
+    starts = [0] * len(plan)
+    assigned = [0] * len(plan)
+    time = 0
+
+    while ready or running:
+        while ready and free_workers:
+            _, index = heapq.heappop(ready)
+            worker = heapq.heappop(free_workers)
+            starts[index], assigned[index] = time, worker
+            heapq.heappush(running, (time + _duration(plan[index]), index, worker))
+
+        time = running[0][0]
+        while running and running[0][0] == time:
+            _, index, worker = heapq.heappop(running)
+            heapq.heappush(free_workers, worker)
+            for successor in successors[index]:
+                waiting[successor] -= 1
+                if waiting[successor] == 0:
+                    heapq.heappush(ready, (-priorities[successor], successor))
+
+    return starts, assigned
+
+
+def _assign_workers(plan, starts):
+    # With unlimited workers, actions are packed onto as few workers as their start times allow.
+    order = sorted(range(len(plan)), key=lambda index: (starts[index], index))
+    busy = []
+    free = []
+    assigned = [0] * len(plan)
+    for index in order:
+        while busy and busy[0][0] <= starts[index]:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        worker = heapq.heappop(free) if free else len(busy)
+        assigned[index] = worker
+        heapq.heappush(busy, (starts[index] + _duration(plan[index]), worker))
+    return assigned
+
+
+def schedule_plan(plan, workers=None, tree=None, strict_order=False):
+    """
+    Schedules the actions of a sequential plan in parallel, respecting its partial order.
+    :param plan: A list of action nodes, as returned by the planner.
+    :param tree: Optional DecompositionTree of the plan (see HTNPlanner.plan), whose method orderings are kept.
+    :param strict_order: With a tree, also keep the subtask sequence of ordered methods.
+    :param workers: Optional number of actions that may run at once. Without a limit every action starts at its
+                    earliest start time, which gives the minimum makespan; with a limit the schedule is built by
+                    critical-path list scheduling, a heuristic since the limited problem is NP-hard.
+    :return: A Schedule.
+    """
+    if workers is not None and workers < 1:
+        raise ValueError("At least one worker is needed to schedule a plan.")
+
+    predecessors = precedence_graph(plan, tree, strict_order)
+    earliest_starts = earliest_start_times(plan, predecessors)
+    if workers is None:
+        starts = earliest_starts
+        assigned = _assign_workers(plan, starts)
+    else:
+        starts, assigned = _list_schedule(plan, predecessors, workers)
+
+    entries = [ScheduledAction(index, node, starts[index], starts[index] + _duration(node), assigned[index])
+               for index, node in enumerate(plan)]
+    makespan = max((entry.finish for entry in entries), default=0)
+    return Schedule(entries, makespan, critical_path(plan, predecessors, earliest_starts))
@@ -7,3 +7,11 @@ def print_executed_actions(plan):
         if node['type'] == NodeType.ACTION:
             action = node['action']
             print(f"Action: {action.name}")  # Assuming each action has a 'name' attribute
+
+
+def print_schedule(schedule):
+    print(f"Schedule (makespan {schedule.makespan}, * marks the critical path):")
+    on_critical_path = set(schedule.critical_path)
+    for entry in sorted(schedule.entries, key=lambda entry: (entry.start, entry.worker)):
+        marker = '*' if entry.index in on_critical_path else ' '
+        print(f"{marker} [{entry.start:>3} - {entry.finish:>3}] worker {entry.worker}: {entry.node.action.name}")